@@ -8,9 +8,13 @@ import logging
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import config
-from app.models import create_tables
+from app.models import create_tables, init_db, dispose_engine
 from app.services.redis_service import redis_service
 from app.services.queue_service import queue_service, handle_email_notification, handle_activity_log
+from app.services.message_pipeline import message_pipeline
+from app.services.message_journal import message_journal
+from app.services.compaction_service import compaction_service
+from app.services.receipt_service import receipt_service
 
 # Simple logging setup
 logging.basicConfig(
@@ -19,8 +23,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def create_app(config_name=None):
-    """Application factory pattern for creating Flask app."""
+def start_background_workers():
+    """Start the journal persister, receipt flusher, compaction job and RabbitMQ consumer threads in this process."""
+    # This process's message ID node lease (renewed in the background)
+    from app.services.id_service import id_service
+    id_service.start()
+    
+    # Write-behind persister and receipt flusher (only need Redis and the database)
+    message_journal.start()
+    receipt_service.start()
+    compaction_service.start()
+    
+    if queue_service.is_available():
+        queue_service.start_email_worker(handle_email_notification)
+        queue_service.start_activity_logger(handle_activity_log)
+        message_pipeline.start()
+        logger.info("Background workers started")
+    else:
+        logger.warning("RabbitMQ unavailable - skipping workers")
+
+def init_worker():
+    """
+    Prepare a freshly forked server worker (Gunicorn post_fork hook).
+    Drops connections inherited from the parent without closing them (the
+    parent still owns those sockets) and starts this worker's consumers.
+    """
+    dispose_engine(close=False)
+    redis_service.reset_connections()
+    start_background_workers()
+
+def close_services():
+    """Release connections held by this process (worker shutdown)."""
+    from app.services.id_service import id_service
+    from app.services.notification_service import notification_service
+    from app.services.tracing_service import tracing_service
+    message_journal.stop()
+    receipt_service.stop()
+    compaction_service.stop()
+    notification_service.close()
+    queue_service.close()
+    id_service.stop()
+    redis_service.close()
+    dispose_engine()
+    tracing_service.close()
+
+def create_app(config_name=None, start_workers=True):
+    """
+    Application factory pattern for creating Flask app.
+    Pass start_workers=False when a server starts them per worker process
+    (see init_worker).
+    """
     
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'development')
@@ -33,6 +85,10 @@ def create_app(config_name=None):
     
     logger.info(f"Starting ConnectHub in {config_name} mode")
     
+    # Fast JSON encoding for API responses (orjson when installed)
+    from app.services.json_service import json_provider
+    json_provider.init_app(app)
+    
     # Enable CORS for React frontend
     # This allows React (localhost:3000) to make requests to Flask (localhost:5000)
     CORS(app, 
@@ -41,6 +97,20 @@ def create_app(config_name=None):
          allow_headers=['Content-Type', 'Authorization'],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
     
+    # Point services at this app's configuration. Redis and RabbitMQ are
+    # contacted on first use, so an unreachable broker doesn't slow startup.
+    init_db(app.config['DATABASE_URL'])
+    redis_service.init_app(app)
+    queue_service.init_app(app)
+    message_pipeline.init_app(app)
+    message_journal.init_app(app)
+    compaction_service.init_app(app)
+    receipt_service.init_app(app)
+    
+    # Message IDs (the node lease is taken with the background workers)
+    from app.services.id_service import id_service
+    id_service.init_app(app)
+    
     # Initialize database
     with app.app_context():
         try:
@@ -51,24 +121,37 @@ def create_app(config_name=None):
             raise
     
     # Start background workers if available
-    if queue_service.is_available():
-        queue_service.start_email_worker(handle_email_notification)
-        queue_service.start_activity_logger(handle_activity_log)
-        logger.info("Background workers started")
-    else:
-        logger.warning("RabbitMQ unavailable - skipping workers")
+    if start_workers:
+        start_background_workers()
+    
+    # Tracing first, so the request span covers the other middleware
+    from app.services.tracing_service import tracing_service
+    tracing_service.register_middleware(app)
     
     # Initialize monitoring (BEFORE blueprints to track all requests)
     from app.services.monitoring_service import monitoring_service
     monitoring_service.register_middleware(app)
     logger.info("Monitoring enabled - metrics at /metrics")
     
+    # Per-route rate limits, checked before any view (and database) work
+    from app.services.rate_limit_service import rate_limit_service
+    rate_limit_service.register_middleware(app)
+    
+    # Sampled request profiling (off unless configured) - profiles at /admin/profiles
+    from app.services.profiling_service import profiling_service
+    profiling_service.register_middleware(app)
+    
+    # Compress large JSON responses (gzip, or brotli when installed)
+    from app.services.compression_service import compression_service
+    compression_service.register_middleware(app)
+    
     # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
     from app.routes.chat import chat_bp
     from app.routes.user import user_bp
     from app.routes.monitoring import monitoring_bp
+    from app.routes.admin import admin_bp
     
     # API routes (for React frontend)
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -78,6 +161,9 @@ def create_app(config_name=None):
     # Monitoring routes (Prometheus scrapes this)
     app.register_blueprint(monitoring_bp)
     
+    # Admin routes (request profiles)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    
     # Main routes (API status and health check)
     app.register_blueprint(main_bp)
     
@@ -0,0 +1 @@
+# Async service layer package
\ No newline at end of file
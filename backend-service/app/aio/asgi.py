@@ -0,0 +1,431 @@
+"""
+ASGI application for the high-traffic chat endpoints.
+
+Serves the same URLs and JSON as the Flask routes, on the async service
+layer, so one event loop can hold many thousands of idle connections
+(polls, long-polls, streams) instead of pinning a thread per request:
+
+    GET  /api/chat/messages     (ETag / 304 like the Flask route)
+    GET  /api/chat/poll         (long-poll for message changes and read receipts)
+    POST /api/chat/send
+    GET  /api/chat/typing
+    POST /api/chat/typing
+    GET  /api/users/online
+
+Everything else stays on the Flask app. Authentication reuses the Flask
+session cookie, so both apps must share SECRET_KEY.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.http import parse_cookie, parse_etags, quote_etag
+from app.aio.database import async_db_service
+from app.aio.redis_service import async_redis_service
+from app.aio.queue_service import async_queue_service
+from app.aio.notifications import async_notification_service
+from app.services.compaction_service import compaction_service
+from app.services.etag_service import content_etag
+from app.services.id_service import id_service
+from app.services.json_service import JSONProvider
+from app.services.message_journal import message_journal, journal_fields
+from app.services.rate_limit_service import rate_limit_service, client_ip
+from app.services.tracing_service import tracing_service, TRACEPARENT_HEADER
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted (bytes)
+MAX_BODY_SIZE = 64 * 1024
+
+
+class SessionReader:
+    """Reads the signed Flask session cookie outside of Flask."""
+
+    def __init__(self, settings):
+        flask_app = Flask(__name__)
+        flask_app.config.from_object(settings)
+        self.cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+        self.max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        self.serializer = SecureCookieSessionInterface().get_signing_serializer(flask_app)
+
+    def load(self, cookie_header: Optional[str]) -> Dict:
+        """Return the session dict, or {} if the cookie is missing or invalid."""
+        if not cookie_header or self.serializer is None:
+            return {}
+        value = parse_cookie(cookie_header).get(self.cookie_name)
+        if not value:
+            return {}
+        try:
+            return self.serializer.loads(value, max_age=self.max_age)
+        except Exception:
+            return {}
+
+
+class Request:
+    """The parts of an ASGI HTTP request the endpoints need."""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1'): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        self.args = {key: values[-1] for key, values in
+                     parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.session = {}
+        self._json = None
+        self._body_read = False
+
+    async def json(self) -> Optional[Dict]:
+        """Read and decode a JSON body (None if empty, too large or invalid)."""
+        if self._body_read:
+            return self._json
+        self._body_read = True
+        body = b''
+        more = True
+        while more:
+            message = await self.receive()
+            body += message.get('body', b'')
+            more = message.get('more_body', False)
+            if len(body) > MAX_BODY_SIZE:
+                return None
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return None
+        self._json = data if isinstance(data, dict) else None
+        return self._json
+
+
+class ChatASGIApp:
+    """Minimal ASGI app routing the hot chat endpoints to async handlers."""
+
+    def __init__(self, config_name: str = 'default'):
+        self.settings = config[config_name]
+        self.sessions = SessionReader(self.settings)
+        self.json = JSONProvider(getattr(self.settings, 'JSON_BACKEND', 'auto'))
+        self.routes = {
+            ('GET', '/api/chat/messages'): self.get_messages,
+            ('GET', '/api/chat/poll'): self.poll_messages,
+            ('POST', '/api/chat/send'): self.send_message,
+            ('GET', '/api/chat/typing'): self.get_typing,
+            ('POST', '/api/chat/typing'): self.set_typing,
+            ('GET', '/api/users/online'): self.online_users,
+        }
+        # Flask endpoint names, for the per-route RATE_LIMITS
+        self.endpoints = {
+            ('GET', '/api/chat/messages'): 'chat.get_messages',
+            ('GET', '/api/chat/poll'): 'chat.poll_messages',
+            ('POST', '/api/chat/send'): 'chat.send_message',
+            ('GET', '/api/chat/typing'): 'chat.get_typing',
+            ('POST', '/api/chat/typing'): 'chat.set_typing',
+            ('GET', '/api/users/online'): 'user.online_users',
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        request = Request(scope, receive)
+        route = (request.method, request.path.rstrip('/') or '/')
+        handler = self.routes.get(route)
+        if handler is None:
+            status, body, headers = 404, {'error': 'Endpoint not found'}, {}
+        else:
+            with tracing_service.span(
+                f"{request.method} {request.path}", kind='server',
+                attributes={'http.method': request.method, 'http.target': request.path},
+                traceparent=request.headers.get(TRACEPARENT_HEADER)
+            ) as span:
+                try:
+                    request.session = await self.load_session(request)
+                    rejection = await self.check_rate_limits(request, self.endpoints[route])
+                    if rejection is not None:
+                        status, body, headers = rejection
+                    else:
+                        status, body, headers = await handler(request)
+                except Exception as e:
+                    logger.error(f"Server error: {e}")
+                    status, body, headers = 500, {'error': 'Internal server error'}, {}
+                if span is not None:
+                    span.set_attribute('http.status_code', status)
+                    headers = {**headers, TRACEPARENT_HEADER: span.traceparent}
+        await self.respond(send, status, body, headers)
+
+    async def lifespan(self, receive, send):
+        """Configure services on startup and close them on shutdown."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                settings = {key: getattr(self.settings, key) for key in dir(self.settings) if key.isupper()}
+                async_db_service.init_app(settings)
+                async_redis_service.init_app(settings)
+                async_queue_service.init_app(settings)
+                tracing_service.configure(settings)
+                rate_limit_service.configure(settings)
+                message_journal.configure(settings)
+                id_service.configure(settings)
+                compaction_service.configure(settings)
+                # Lease the message ID node (renewed by a thread, so next_id never waits on Redis)
+                await asyncio.get_running_loop().run_in_executor(None, id_service.start)
+                logger.info("ASGI chat endpoints ready")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_notification_service.close()
+                await async_queue_service.close()
+                await asyncio.get_running_loop().run_in_executor(None, id_service.stop)
+                await async_redis_service.close()
+                await async_db_service.close()
+                tracing_service.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def respond(self, send, status: int, body, headers: Dict):
+        """Send a JSON response (or an empty one for 304)."""
+        payload = b'' if status == 304 else self.json.dumps(body)
+        raw_headers = [(b'content-length', str(len(payload)).encode())]
+        if status != 304:
+            raw_headers.append((b'content-type', b'application/json'))
+        raw_headers += [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers.items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def load_session(self, request: Request) -> Dict:
+        """
+        Decode the Flask session cookie. Like the Flask app, a cookie whose
+        Redis session expired or was revoked counts as logged out.
+        """
+        data = self.sessions.load(request.headers.get('cookie'))
+        session_id = data.get('session_id')
+        if session_id and await async_redis_service.is_available():
+            if await async_redis_service.get_session(session_id) is None:
+                return {}
+        return data
+
+    async def check_rate_limits(self, request: Request, endpoint: str):
+        """Apply RATE_LIMITS like the Flask app; a response tuple if rejected, else None."""
+        content = None
+        if rate_limit_service.wants_content(endpoint):
+            data = await request.json()
+            content = data.get('content') if data else None
+        client = request.scope.get('client')
+        ip = client_ip(client[0] if client else None, request.headers.get('x-forwarded-for'),
+                       rate_limit_service.trusted_proxies)
+        prepared = rate_limit_service.prepare(endpoint, request.session.get('username'), ip, content)
+        if prepared is None:
+            return None
+
+        keys, args, checked = prepared
+        rejection = rate_limit_service.evaluate(
+            endpoint, checked, await async_redis_service.check_rate_limits(keys, args)
+        )
+        if rejection is None:
+            return None
+        return rejection['status'], {
+            'error': rejection['error'],
+            'retry_after': rejection['retry_after']
+        }, {'Retry-After': str(rejection['retry_after'])}
+
+    @staticmethod
+    def not_modified(request: Request, etag: str):
+        """True if the client's If-None-Match already names etag."""
+        return parse_etags(request.headers.get('if-none-match')).contains_weak(etag)
+
+    @staticmethod
+    def etag_headers(etag: str) -> Dict:
+        return {'ETag': quote_etag(etag, weak=True), 'Cache-Control': 'no-cache'}
+
+    # Chat
+    async def get_messages(self, request: Request):
+        """Get all chat messages; unchanged polls get 304 via the ETag."""
+        if 'username' not in request.session:
+            return 401, {'error': 'Not authenticated'}, {}
+
+        version = await async_redis_service.get_data_version('messages')
+        etag = f"messages-{version}" if version else None
+        if etag and self.not_modified(request, etag):
+            return 304, None, self.etag_headers(etag)
+
+        messages = await async_db_service.get_all_messages()
+        messages_list = [{
+            'id': str(msg.id),
+            'user_id': None,
+            'username': msg.username,
+            'content': msg.message,
+            'created_at': msg.timestamp
+        } for msg in messages]
+
+        body = {'success': True, 'messages': messages_list, 'count': len(messages_list)}
+        return 200, body, self.etag_headers(etag) if etag else {}
+
+    @staticmethod
+    async def fetch_changes(after_revision: int, limit: int):
+        """Messages (with saved reaction counts) and read markers changed after after_revision."""
+        messages = await async_db_service.get_changes_after(after_revision, limit)
+        until_revision = messages[-1].revision if len(messages) == limit else None
+        read_markers = await async_db_service.get_read_markers_after(after_revision, until_revision)
+        reactions = await async_db_service.get_reaction_counts([msg.id for msg in messages if not msg.deleted_at])
+        return messages, reactions, read_markers
+
+    async def poll_messages(self, request: Request):
+        """
+        Long-poll for message changes and read receipts (see the Flask route of the same name).
+        Waiting requests hold no thread, only an entry on the shared event.
+        """
+        if 'username' not in request.session:
+            return 401, {'error': 'Not authenticated'}, {}
+
+        try:
+            after = request.args.get('after')
+            after = int(after) if after is not None else None
+            timeout = float(request.args.get('timeout', self.settings.POLL_TIMEOUT))
+        except ValueError:
+            return 400, {'error': 'Invalid after or timeout'}, {}
+        timeout = max(0.0, min(timeout, self.settings.POLL_MAX_TIMEOUT))
+        limit = self.settings.POLL_MAX_MESSAGES
+
+        latest = None
+        if await async_notification_service.start(async_db_service.get_latest_revision):
+            if after is None:
+                after = async_notification_service.latest_id
+            latest = await async_notification_service.wait_for_message(after, timeout)
+
+        if latest is None:
+            # Redis unavailable: wait a little, then check the database once
+            if after is None:
+                after = await async_db_service.get_latest_revision() or 0
+            await asyncio.sleep(min(timeout, self.settings.POLL_FALLBACK_INTERVAL))
+            messages, reactions, read_markers = await self.fetch_changes(after, limit)
+        elif latest > after:
+            messages, reactions, read_markers = await async_notification_service.messages_after(
+                after, latest, lambda after_revision: self.fetch_changes(after_revision, limit)
+            )
+        else:
+            messages, reactions, read_markers = [], {}, []
+
+        messages_list = [{
+            'id': str(msg.id),
+            'deleted': True,
+            'deleted_at': msg.deleted_at
+        } if msg.deleted_at else {
+            'id': str(msg.id),
+            'username': msg.username,
+            'content': msg.message,
+            'created_at': msg.timestamp,
+            'reactions': reactions.get(msg.id, {})
+        } for msg in messages]
+
+        latest_change = max([after] + [changes[-1].revision for changes in (messages, read_markers) if changes])
+        body = {
+            'success': True,
+            'messages': messages_list,
+            'count': len(messages_list),
+            'read_markers': {marker.username: str(marker.last_read_id) for marker in read_markers},
+            'after': str(latest_change)
+        }
+        if compaction_service.needs_resync(after):
+            body['resync'] = True
+        return 200, body, {}
+
+    async def send_message(self, request: Request):
+        """Send a new chat message."""
+        if 'username' not in request.session:
+            return 401, {'error': 'Not authenticated'}, {}
+
+        username = request.session['username']
+        data = await request.json()
+        if not data:
+            return 400, {'error': 'Invalid request format'}, {}
+
+        message = data.get('content')
+        if not isinstance(message, str) or not message.strip():
+            return 400, {'error': 'Message cannot be empty'}, {}
+
+        message_id = id_service.next_id()
+        if message_journal.enabled:
+            # Saved by the persisters of the Flask workers; direct write if the journal is full
+            entry_id = await async_redis_service.append_to_journal(
+                message_journal.stream,
+                journal_fields(message_id, username, message, request.session.get('user_id')),
+                message_journal.max_length
+            )
+            message_journal.count_append(entry_id)
+            if entry_id:
+                return 202, {
+                    'success': True,
+                    'message': 'Message accepted',
+                    'data': {'id': str(message_id), 'username': username, 'content': message,
+                             'journal_id': entry_id}
+                }, {}
+
+        saved = await async_db_service.create_chat_message(username, message, message_id)
+        if not saved:
+            return 500, {'error': 'Failed to send message'}, {}
+        message_key, revision = saved
+
+        if await async_redis_service.is_available():
+            await async_redis_service.increment_message_count(username)
+            await async_redis_service.bump_data_version('messages', max_key=message_key)
+            await async_redis_service.publish_new_message(revision)
+
+        await async_queue_service.queue_message_processing({
+            'id': message_key,
+            'username': username,
+            'message': message,
+            'user_id': request.session.get('user_id')
+        })
+
+        return 201, {
+            'success': True,
+            'message': 'Message sent successfully',
+            'data': {'id': str(message_id), 'username': username, 'content': message}
+        }, {}
+
+    async def set_typing(self, request: Request):
+        """Set typing indicator for current user."""
+        if 'username' not in request.session:
+            return 401, {'error': 'Not logged in'}, {}
+
+        if await async_redis_service.set_typing_indicator(request.session['username']):
+            return 200, {'success': True}, {}
+        return 503, {'error': 'Redis not available'}, {}
+
+    async def get_typing(self, request: Request):
+        """Get users currently typing (except the caller)."""
+        typing_users = await async_redis_service.get_typing_users()
+        current_user = request.session.get('username')
+        return 200, {'typing_users': [user for user in typing_users if user != current_user]}, {}
+
+    # Users
+    async def online_users(self, request: Request):
+        """Get online users."""
+        if not await async_redis_service.is_available():
+            return 200, {
+                'success': True,
+                'online_users': [],
+                'count': 0,
+                'message': 'Redis not available'
+            }, {}
+
+        users = await async_redis_service.get_online_users()
+        etag = content_etag('online', users)
+        if self.not_modified(request, etag):
+            return 304, None, self.etag_headers(etag)
+        return 200, {'success': True, 'online_users': users, 'count': len(users)}, self.etag_headers(etag)
+
+
+def create_asgi_app(config_name: Optional[str] = None) -> ChatASGIApp:
+    """Create the ASGI app for the given config (default: FLASK_ENV)."""
+    if config_name is None:
+        config_name = os.environ.get('FLASK_ENV', 'development')
+    return ChatASGIApp(config_name)
@@ -0,0 +1,183 @@
+"""
+Async database service layer for Chat Application.
+Mirrors app.services.database for the ASGI endpoints, using SQLAlchemy's
+asyncio extension (asyncpg for PostgreSQL, aiosqlite for SQLite).
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from app.models import User, ChatMessage, FeedSequence, MessageReaction, ReadMarker, FEED_SEQUENCE
+from app.services.database import take_revisions
+from app.services.id_service import id_service
+from app.services.monitoring_service import timed, record_error
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Async driver for each sync dialect used in DATABASE_URL
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(database_url: str) -> str:
+    """Translate a sync DATABASE_URL to its async driver equivalent."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}'")
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    return url.render_as_string(hide_password=False)
+
+
+class AsyncDatabaseService:
+    """Async counterpart of DatabaseService (hot read/write paths only)."""
+
+    def __init__(self):
+        """Set up the service. The engine is created on first use."""
+        self.database_url = Config.DATABASE_URL
+        self.pool_size = Config.ASYNC_DB_POOL_SIZE
+        self.max_overflow = Config.ASYNC_DB_MAX_OVERFLOW
+        self.engine = None
+        self.session_factory = None
+
+    def init_app(self, settings) -> None:
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        self.database_url = settings.get('DATABASE_URL', self.database_url)
+        self.pool_size = settings.get('ASYNC_DB_POOL_SIZE', self.pool_size)
+        self.max_overflow = settings.get('ASYNC_DB_MAX_OVERFLOW', self.max_overflow)
+
+    def _session(self) -> AsyncSession:
+        """Open a session, creating the engine on first use."""
+        if self.engine is None:
+            url = async_database_url(self.database_url)
+            options = {}
+            if not url.startswith('sqlite'):
+                options = {'pool_size': self.pool_size, 'max_overflow': self.max_overflow}
+            self.engine = create_async_engine(url, **options)
+            self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        return self.session_factory()
+
+    async def close(self) -> None:
+        """Dispose of the connection pool."""
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+            self.session_factory = None
+
+    @timed('database')
+    async def get_user_by_username(self, username: str) -> Optional[User]:
+        """Get user by username."""
+        try:
+            async with self._session() as db:
+                result = await db.execute(select(User).where(User.username == username))
+                return result.scalars().first()
+        except Exception as e:
+            record_error(e)
+            logger.error(f"Error getting user: {e}")
+            return None
+
+    @timed('database')
+    async def create_chat_message(self, username: str, message: str,
+                                  message_id: int = None) -> Optional[Tuple[int, int]]:
+        """
+        Create a new chat message with the given public ID (a new one if None).
+        Returns the new message's (key, revision), or None if it could not be saved.
+        """
+        if message_id is None:
+            message_id = id_service.next_id()
+        try:
+            async with self._session() as db:
+                revision = (await db.execute(take_revisions())).scalar_one()
+                new_message = ChatMessage(id=message_id, revision=revision, username=username, message=message)
+                db.add(new_message)
+                await db.flush()
+                message_key = new_message.key
+                await db.commit()
+                return message_key, revision
+        except Exception as e:
+            record_error(e)
+            logger.error(f"Error creating message: {e}")
+            return None
+
+    @timed('database')
+    async def get_all_messages(self) -> List[ChatMessage]:
+        """Get all chat messages (not deleted ones), oldest first (by message ID)."""
+        try:
+            async with self._session() as db:
+                result = await db.execute(
+                    select(ChatMessage).where(ChatMessage.deleted_at.is_(None)).order_by(ChatMessage.id.asc())
+                )
+                return list(result.scalars().all())
+        except Exception as e:
+            record_error(e)
+            logger.error(f"Error getting messages: {e}")
+            return []
+
+    @timed('database')
+    async def get_changes_after(self, after_revision: int, limit: int = 500) -> List[ChatMessage]:
+        """Get up to `limit` new or deleted messages changed after after_revision, in revision order."""
+        try:
+            async with self._session() as db:
+                result = await db.execute(
+                    select(ChatMessage).where(ChatMessage.revision > after_revision)
+                    .order_by(ChatMessage.revision.asc()).limit(limit)
+                )
+                return list(result.scalars().all())
+        except Exception as e:
+            record_error(e)
+            logger.error(f"Error getting changes after {after_revision}: {e}")
+            return []
+
+    @timed('database')
+    async def get_latest_revision(self) -> Optional[int]:
+        """Get the revision of the latest committed change to messages or read markers (0 if none, None on error)."""
+        try:
+            async with self._session() as db:
+                result = await db.execute(select(FeedSequence.value).where(FeedSequence.name == FEED_SEQUENCE))
+                return result.scalar() or 0
+        except Exception as e:
+            record_error(e)
+            logger.error(f"Error getting latest revision: {e}")
+            return None
+
+    @timed('database')
+    async def get_reaction_counts(self, message_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """Get saved reaction counts ({emoji: count}) by message ID; messages without any are left out."""
+        if not message_ids:
+            return {}
+        try:
+            async with self._session() as db:
+                result = await db.execute(
+                    select(MessageReaction.message_id, MessageReaction.emoji, MessageReaction.count)
+                    .where(MessageReaction.message_id.in_(message_ids))
+                )
+                counts = {}
+                for message_id, emoji, count in result:
+                    counts.setdefault(message_id, {})[emoji] = count
+                return counts
+        except Exception as e:
+            record_error(e)
+            logger.error(f"Error getting reaction counts: {e}")
+            return {}
+
+    @timed('database')
+    async def get_read_markers_after(self, after_revision: int, until_revision: int = None) -> List[ReadMarker]:
+        """Get read markers changed after after_revision (and not after until_revision), in revision order."""
+        try:
+            async with self._session() as db:
+                query = select(ReadMarker).where(ReadMarker.revision > after_revision)
+                if until_revision is not None:
+                    query = query.where(ReadMarker.revision <= until_revision)
+                result = await db.execute(query.order_by(ReadMarker.revision.asc()))
+                return list(result.scalars().all())
+        except Exception as e:
+            record_error(e)
+            logger.error(f"Error getting read markers after {after_revision}: {e}")
+            return []
+
+# Create async database service instance
+async_db_service = AsyncDatabaseService()
@@ -0,0 +1,132 @@
+"""
+New-message notifications for the ASGI long-poll endpoint.
+Async counterpart of app.services.notification_service: one pub/sub
+subscriber task per process wakes every waiting request with a single
+event, and requests woken together share one database read.
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+from app.aio.redis_service import async_redis_service
+from app.services.redis_service import MESSAGE_CHANNEL
+
+
+class AsyncNotificationService:
+    """Per-process fan-out of "new message" events to long-poll waiters."""
+
+    def __init__(self):
+        self.latest_id = None
+        self._task = None
+        self._wakeup = None
+        self._start_lock = None
+        self._batches = {}
+
+    def _listening(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, latest_id_loader: Callable[[], Awaitable[Optional[int]]]) -> bool:
+        """Start the subscriber task if needed (see NotificationService.start)."""
+        if self._listening():
+            return True
+
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._listening():
+                return True
+            client = await async_redis_service.client()
+            if client is None:
+                return False
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(MESSAGE_CHANNEL)
+            except Exception as e:
+                print(f"Error subscribing to new messages: {e}")
+                return False
+
+            latest_id = await latest_id_loader()
+            if latest_id is None:
+                await pubsub.close()
+                return False
+
+            self.latest_id = latest_id
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._listen(pubsub))
+        return True
+
+    async def _listen(self, pubsub):
+        """Subscriber loop: record the newest ID and wake every waiter."""
+        try:
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                try:
+                    message_id = int(message['data'])
+                except (TypeError, ValueError):
+                    continue
+                if message_id > self.latest_id:
+                    self.latest_id = message_id
+                    self._wake()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"New message listener stopped: {e}")
+        finally:
+            self._task = None
+            # Wake waiters so they fall back instead of sleeping it out
+            self._wake()
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
+
+    def _wake(self):
+        """Release everyone waiting on the current event and arm a new one."""
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        if wakeup is not None:
+            wakeup.set()
+
+    async def wait_for_message(self, after_id: int, timeout: float) -> Optional[int]:
+        """Wait until a message newer than after_id exists (see NotificationService)."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._listening() and self.latest_id <= after_id:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return self.latest_id if self._listening() else None
+
+    async def messages_after(self, after_id: int, latest_id: int,
+                             fetch: Callable[[int], Awaitable[List]]) -> List:
+        """
+        Return await fetch(after_id), shared by requests with the same
+        cursor. If the shared read fails, each request reads for itself.
+        """
+        batch_key = (after_id, latest_id)
+        batch = self._batches.get(batch_key)
+        if batch is None:
+            self._batches = {key: value for key, value in self._batches.items()
+                             if key[1] >= latest_id}
+            batch = self._batches[batch_key] = asyncio.ensure_future(fetch(after_id))
+        try:
+            return await asyncio.shield(batch)
+        except Exception:
+            if self._batches.get(batch_key) is batch:
+                del self._batches[batch_key]
+            return await fetch(after_id)
+
+    async def close(self):
+        """Stop the subscriber task."""
+        if self._listening():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+# Create async notification service instance
+async_notification_service = AsyncNotificationService()
@@ -0,0 +1,133 @@
+"""
+Async queue service layer for Chat Application.
+Mirrors the publishing side of app.services.queue_service on aio-pika.
+Unlike the sync service, which opens a connection per message, this keeps
+one robust connection and channel per process and reuses them.
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Dict
+import aio_pika
+from app.services.queue_service import QUEUES, RECONNECT_INTERVAL, SETTINGS
+from app.services.monitoring_service import timed, record_error
+from app.services.tracing_service import tracing_service
+from app.services.memory_broker import memory_broker
+from config import Config
+
+
+class AsyncQueueService:
+    """Async counterpart of QueueService (publishers only)."""
+
+    def __init__(self):
+        """Set up the service. RabbitMQ is not contacted until first use."""
+        self.settings = {key: getattr(Config, key) for key in SETTINGS}
+        self._connection = None
+        self._channel = None
+        self._next_attempt = 0.0
+        self._lock = None
+
+    def init_app(self, settings) -> None:
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        self.settings = {key: settings.get(key, getattr(Config, key)) for key in SETTINGS}
+
+    async def _get_channel(self):
+        """Return the shared channel, connecting on first use."""
+        if self._channel is not None and not self._channel.is_closed:
+            return self._channel
+        if time.monotonic() < self._next_attempt:
+            return None
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._channel is not None and not self._channel.is_closed:
+                return self._channel
+            try:
+                self._connection = await aio_pika.connect_robust(
+                    host=self.settings['RABBITMQ_HOST'],
+                    port=self.settings['RABBITMQ_PORT'],
+                    login=self.settings['RABBITMQ_USER'],
+                    password=self.settings['RABBITMQ_PASSWORD'],
+                    timeout=self.settings['RABBITMQ_CONNECT_TIMEOUT']
+                )
+                channel = await self._connection.channel()
+                for queue in QUEUES:
+                    await channel.declare_queue(queue, durable=True)
+                self._channel = channel
+            except Exception as e:
+                print(f"Warning: RabbitMQ not available (async). Error: {e}")
+                self._next_attempt = time.monotonic() + RECONNECT_INTERVAL
+                if self._connection is not None:
+                    await self._connection.close()
+                self._connection = None
+                return None
+        return self._channel
+
+    async def is_available(self) -> bool:
+        """Check if RabbitMQ is available (connects on first call)."""
+        if self.settings['QUEUE_BACKEND'] == 'memory':
+            return True
+        return await self._get_channel() is not None
+
+    async def close(self) -> None:
+        """Close the shared connection."""
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = None
+        self._channel = None
+        self._next_attempt = 0.0
+
+    @timed('queue', 'publish')
+    async def _publish(self, routing_key: str, payload: Dict) -> bool:
+        """Publish a persistent JSON message to a queue."""
+        if self.settings['QUEUE_BACKEND'] == 'memory':
+            memory_broker.publish(routing_key, json.dumps(payload), headers=tracing_service.inject({}))
+            return True
+
+        channel = await self._get_channel()
+        if channel is None:
+            return False
+
+        try:
+            await channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=json.dumps(payload).encode('utf-8'),
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    headers=tracing_service.inject({})
+                ),
+                routing_key=routing_key
+            )
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error publishing to {routing_key}: {e}")
+            return False
+
+    # Message Processing
+    async def queue_message_processing(self, message_data: Dict) -> bool:
+        """Queue message for background processing (spam detection, etc.)."""
+        return await self._publish('message_processing', {
+            'type': 'message_processing',
+            'message_id': message_data.get('id'),
+            'username': message_data.get('username'),
+            'message': message_data.get('message'),
+            'timestamp': datetime.now().isoformat(),
+            'tasks': ['spam_check', 'sentiment_analysis', 'content_filter']
+        })
+
+    # User Activity Logging
+    async def log_user_activity(self, username: str, activity: str, details: Dict = None) -> bool:
+        """Log user activity for analytics."""
+        return await self._publish('user_activity', {
+            'type': 'user_activity',
+            'username': username,
+            'activity': activity,
+            'details': details or {},
+            'timestamp': datetime.now().isoformat(),
+            'session_id': details.get('session_id') if details else None
+        })
+
+# Create async queue service instance
+async_queue_service = AsyncQueueService()
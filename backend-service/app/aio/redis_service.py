@@ -0,0 +1,262 @@
+"""
+Async Redis service layer for Chat Application.
+Mirrors app.services.redis_service on redis.asyncio, with the same key
+layout and scripts, so both layers can serve the same users side by side.
+"""
+import os
+import time
+from typing import Dict, List, Optional
+import redis.asyncio as redis
+from app.services.redis_scripts import RedisScripts
+from app.services.redis_service import MESSAGE_CHANNEL, RECONNECT_INTERVAL, SETTINGS, fake_redis_server
+from app.services.session_store import SESSION_KEY, USER_SESSIONS_KEY, deserialize_session
+from app.services.monitoring_service import timed, record_error
+from config import Config
+
+
+class AsyncRedisService:
+    """Async counterpart of RedisService."""
+
+    def __init__(self):
+        """Set up the service. No connection is made until first use."""
+        self.settings = {key: getattr(Config, key) for key in SETTINGS}
+        self.scripts = None
+        self._client = None
+        self._next_attempt = 0.0
+
+    def init_app(self, settings) -> None:
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        self.settings = {key: settings.get(key, getattr(Config, key)) for key in SETTINGS}
+
+    async def _connect(self) -> None:
+        """Open and verify the connection, or back off for RECONNECT_INTERVAL."""
+        if self.settings['REDIS_BACKEND'] == 'fake':
+            from fakeredis import aioredis
+            client = aioredis.FakeRedis(server=fake_redis_server(), decode_responses=True)
+        else:
+            client = redis.Redis(
+                host=self.settings['REDIS_HOST'],
+                port=self.settings['REDIS_PORT'],
+                db=self.settings['REDIS_DB'],
+                socket_connect_timeout=self.settings['REDIS_CONNECT_TIMEOUT'],
+                decode_responses=True
+            )
+        try:
+            await client.ping()
+            scripts = RedisScripts(client)
+            await scripts.load()
+        except Exception as e:
+            print(f"Warning: Redis not available (async). Error: {e}")
+            self._next_attempt = time.monotonic() + RECONNECT_INTERVAL
+            await client.close()
+            return
+
+        self.scripts = scripts
+        self._client = client
+
+    async def client(self) -> Optional[redis.Redis]:
+        """Redis client, connected on first use (None while Redis is unreachable)."""
+        if self._client is None and time.monotonic() >= self._next_attempt:
+            await self._connect()
+        return self._client
+
+    async def is_available(self) -> bool:
+        """Check if Redis is available (connects on first call)."""
+        return await self.client() is not None
+
+    async def close(self) -> None:
+        """Close the connection pool; the next use reconnects."""
+        if self._client is not None:
+            await self._client.close()
+        self._client = None
+        self._next_attempt = 0.0
+
+    # Session Management
+    @timed('redis')
+    async def get_session(self, session_id: str) -> Optional[Dict]:
+        """Read a session, sliding its expiry like SessionStore.get."""
+        client = await self.client()
+        if client is None:
+            return None
+
+        try:
+            key = SESSION_KEY.format(session_id)
+            pipe = client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            raw, remaining = await pipe.execute()
+
+            data = deserialize_session(raw)
+            ttl = self.settings['SESSION_TTL']
+            if data is not None and 0 <= remaining < ttl - self.settings['SESSION_TOUCH_INTERVAL']:
+                pipe = client.pipeline(transaction=False)
+                pipe.expire(key, ttl)
+                if data.get('username'):
+                    pipe.expire(USER_SESSIONS_KEY.format(data['username']), ttl)
+                await pipe.execute()
+            return data
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting session: {e}")
+            return None
+
+    # Online Users
+    @timed('redis')
+    async def add_online_user(self, username: str) -> bool:
+        """Mark user as online."""
+        client = await self.client()
+        if client is None:
+            return False
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.sadd("online_users", username)
+            pipe.setex(f"user_online:{username}", 300, "true")  # 5 minutes
+            await pipe.execute()
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error adding online user: {e}")
+            return False
+
+    @timed('redis')
+    async def get_online_users(self) -> List[str]:
+        """Get list of all online users, dropping expired ones."""
+        if await self.client() is None:
+            return []
+
+        try:
+            return await self.scripts.run('get_online_users', keys=["online_users"], args=["user_online:"])
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting online users: {e}")
+            return []
+
+    # Typing Indicators
+    @timed('redis')
+    async def set_typing_indicator(self, username: str, room_id: str = "general") -> bool:
+        """Set typing indicator for a user in a room."""
+        client = await self.client()
+        if client is None:
+            return False
+
+        try:
+            await client.setex(f"typing:{room_id}:{username}", 5, "true")  # 5 seconds
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error setting typing indicator: {e}")
+            return False
+
+    @timed('redis')
+    async def get_typing_users(self, room_id: str = "general") -> List[str]:
+        """Get users currently typing in a room."""
+        client = await self.client()
+        if client is None:
+            return []
+
+        try:
+            return [key.split(':')[-1] async for key in client.scan_iter(match=f"typing:{room_id}:*")]
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting typing users: {e}")
+            return []
+
+    # Data Versions (ETags)
+    @timed('redis')
+    async def get_data_version(self, scope: str) -> Optional[str]:
+        """Get the version marker of a data set (see RedisService.get_data_version)."""
+        if await self.client() is None:
+            return None
+
+        try:
+            epoch = f"{int(time.time() * 1000):x}{os.urandom(2).hex()}"
+            values = await self.scripts.run('get_version', keys=[f"version:{scope}"], args=[epoch])
+            return '-'.join(str(value) for value in values)
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting data version: {e}")
+            return None
+
+    @timed('redis')
+    async def bump_data_version(self, scope: str, max_key: int = None) -> bool:
+        """Record a change to a data set (see RedisService.bump_data_version)."""
+        if await self.client() is None:
+            return False
+
+        try:
+            await self.scripts.run(
+                'bump_version',
+                keys=[f"version:{scope}"],
+                args=['' if max_key is None else max_key]
+            )
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error bumping data version: {e}")
+            return False
+
+    # Rate Limiting
+    @timed('redis')
+    async def check_rate_limits(self, keys: List[str], args: List) -> Optional[List[int]]:
+        """Run the rate-limit script (see RedisService.check_rate_limits)."""
+        if await self.client() is None:
+            return None
+
+        try:
+            return await self.scripts.run('rate_limit', keys=keys, args=args)
+        except Exception as e:
+            record_error(e)
+            print(f"Error checking rate limits: {e}")
+            return None
+
+    # New Message Notifications
+    @timed('redis')
+    async def publish_new_message(self, revision: int) -> bool:
+        """Tell every worker's long-poll waiters that a change with this revision was saved."""
+        client = await self.client()
+        if client is None:
+            return False
+
+        try:
+            await client.publish(MESSAGE_CHANNEL, revision)
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error publishing new message: {e}")
+            return False
+
+    # Statistics
+    @timed('redis')
+    async def increment_message_count(self, username: str) -> int:
+        """Increment and return user's message count."""
+        client = await self.client()
+        if client is None:
+            return 0
+
+        try:
+            return await client.incr(f"message_count:{username}")
+        except Exception as e:
+            record_error(e)
+            print(f"Error incrementing message count: {e}")
+            return 0
+
+    # Message Journal (write-behind)
+    @timed('redis')
+    async def append_to_journal(self, stream: str, fields: Dict, max_length: int = 0) -> Optional[str]:
+        """Append a message to the journal stream (see RedisService.append_to_journal)."""
+        if await self.client() is None:
+            return None
+
+        try:
+            args = [max_length]
+            for name, value in fields.items():
+                args += [name, value]
+            return await self.scripts.run('journal_append', keys=[stream], args=args)
+        except Exception as e:
+            record_error(e)
+            print(f"Error appending to journal: {e}")
+            return None
+
+# Create async Redis service instance
+async_redis_service = AsyncRedisService()
@@ -2,10 +2,15 @@
 Database models for the Chat Application.
 Defines the structure of database tables using SQLAlchemy.
 """
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, Column, BigInteger, Integer, String, DateTime, Float, Text
+from sqlalchemy import func, inspect, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from sqlalchemy_utils import database_exists, create_database
+import threading
 from datetime import datetime
 from config import Config
 
@@ -28,25 +33,119 @@ class User(Base):
         return f"<User(username='{self.username}', email='{self.email}')>"
 
 class ChatMessage(Base):
-    """Chat message model for storing chat messages."""
+    """
+    Chat message model for storing chat messages.
+    `key` is internal; `id` is the public, time-sortable message ID (see
+    id_service) that orders the history. `revision` is the feed revision
+    of the message's latest change (see FeedSequence) and orders the delta
+    feed. Deleted messages stay as tombstones (deleted_at set, content
+    cleared) until compaction removes them.
+    """
     __tablename__ = "chat_messages"
 
     key = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger, unique=True, index=True)
+    revision = Column(BigInteger, index=True)
     username = Column(String, nullable=False)
     message = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    deleted_at = Column(DateTime, index=True)
 
     def __repr__(self):
         return f"<ChatMessage(username='{self.username}', timestamp='{self.timestamp}')>"
 
+class MessageVerdict(Base):
+    """Result of the message-processing pipeline for one chat message."""
+    __tablename__ = "message_verdicts"
+
+    message_key = Column(Integer, primary_key=True)  # chat_messages.key
+    verdict = Column(String(10), nullable=False)  # ok, flagged or blocked
+    spam_score = Column(Float)
+    flags = Column(String)  # Comma-separated, e.g. "spam,duplicate"
+    processed_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MessageVerdict(message_key={self.message_key}, verdict='{self.verdict}')>"
+
+class JournalEntry(Base):
+    """
+    A message saved from the write-behind journal (Redis Stream entry).
+    Lets a replayed entry be recognised instead of saved twice.
+    """
+    __tablename__ = "message_journal"
+
+    entry_id = Column(String(41), primary_key=True)  # Stream entry ID, e.g. "1718000000000-0"
+    message_key = Column(Integer, nullable=False)  # chat_messages.key
+    journaled_at = Column(BigInteger, nullable=False, index=True)  # ms, from the entry ID
+
+    def __repr__(self):
+        return f"<JournalEntry(entry_id='{self.entry_id}', message_key={self.message_key})>"
+
+class MessageReaction(Base):
+    """
+    How many (and which) users reacted to a message with one emoji.
+    Reactions live in Redis and are copied here periodically (see
+    receipt_service).
+    """
+    __tablename__ = "message_reactions"
+
+    message_id = Column(BigInteger, primary_key=True)  # chat_messages.id
+    emoji = Column(String(16), primary_key=True)
+    count = Column(Integer, nullable=False)
+    users = Column(Text)  # JSON list of usernames (NULL in rows saved before they were kept)
+
+    def __repr__(self):
+        return f"<MessageReaction(message_id={self.message_id}, emoji='{self.emoji}', count={self.count})>"
+
+class ReadMarker(Base):
+    """
+    Read receipt watermark: the newest message a user has read. Messages
+    with a greater ID are unread. `revision` orders the delta feed, like
+    ChatMessage.revision.
+    """
+    __tablename__ = "read_markers"
+
+    username = Column(String(55), primary_key=True)
+    last_read_id = Column(BigInteger, nullable=False)  # chat_messages.id
+    revision = Column(BigInteger, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ReadMarker(username='{self.username}', last_read_id={self.last_read_id})>"
+
+# FeedSequence row the delta feed revisions come from
+FEED_SEQUENCE = 'feed'
+
+class FeedSequence(Base):
+    """
+    Counter handing out delta feed revisions (see database.take_revisions).
+    Taking revisions locks the row until the transaction ends, so they are
+    given out in commit order: once a revision can be read, every smaller
+    one is committed too, and a poll cursor never skips a slow commit.
+    """
+    __tablename__ = "feed_sequence"
+
+    name = Column(String(20), primary_key=True)
+    value = Column(BigInteger, nullable=False)  # Last revision handed out
+
+    def __repr__(self):
+        return f"<FeedSequence(name='{self.name}', value={self.value})>"
+
 # Database engine and session setup
 def create_database_engine(database_url=None):
     """Create and return database engine."""
     if not database_url:
         database_url = Config.DATABASE_URL
     
-    print(f"Using database: {database_url}")
-    engine = create_engine(database_url)
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite: one shared connection, or every thread would
+        # get its own empty database
+        engine = create_engine(database_url, poolclass=StaticPool,
+                               connect_args={'check_same_thread': False})
+    else:
+        engine = create_engine(database_url)
+    print(f"Using database: {engine.url.render_as_string(hide_password=True)}")
     
     # Create database if it doesn't exist (for PostgreSQL)
     if not database_exists(engine.url):
@@ -55,20 +154,86 @@ def create_database_engine(database_url=None):
     
     return engine
 
-# Create engine and session factory
-engine = create_database_engine()
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engine is created lazily (init_db / first use) so importing the models
+# never opens a connection; the session factory is bound when it exists.
+engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+_engine_lock = threading.Lock()
+
+def init_db(database_url=None):
+    """Create the engine for database_url (default: Config.DATABASE_URL)."""
+    global engine
+    with _engine_lock:
+        if engine is not None:
+            engine.dispose()
+        engine = create_database_engine(database_url)
+        SessionLocal.configure(bind=engine)
+    return engine
+
+def get_engine():
+    """Return the engine, creating it on first use."""
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                _init_default_engine()
+    return engine
+
+def _init_default_engine():
+    global engine
+    engine = create_database_engine()
+    SessionLocal.configure(bind=engine)
+
+def dispose_engine(close=True):
+    """
+    Drop pooled connections.
+    close=False is for forked workers: the parent still owns the sockets.
+    """
+    if engine is not None:
+        engine.dispose(close=close)
 
 def create_tables():
     """Create all tables in the database."""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+    check_tables()
+    init_feed_sequence()
     print("Database tables created successfully!")
 
+def check_tables():
+    """
+    Fail fast if a table created by an older release lacks columns this code
+    needs (create_all only creates missing tables). They are added, and
+    filled in for existing rows, by scripts/migrate_messages.py.
+    """
+    inspector = inspect(get_engine())
+    for table in (ChatMessage.__table__, MessageReaction.__table__):
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        missing = [column.name for column in table.columns if column.name not in columns]
+        if missing:
+            raise RuntimeError(f"{table.name} is missing columns {', '.join(missing)}: "
+                               f"run scripts/migrate_messages.py before starting the application")
+
+def init_feed_sequence():
+    """Create the feed revision counter (once), after every revision already saved."""
+    try:
+        with get_engine().begin() as conn:
+            exists = conn.execute(select(FeedSequence.value).where(FeedSequence.name == FEED_SEQUENCE)).first()
+            if exists is None:
+                latest_message, latest_marker = conn.execute(select(
+                    select(func.max(ChatMessage.revision)).scalar_subquery(),
+                    select(func.max(ReadMarker.revision)).scalar_subquery()
+                )).one()
+                conn.execute(insert(FeedSequence).values(
+                    name=FEED_SEQUENCE, value=max(latest_message or 0, latest_marker or 0)
+                ))
+    except IntegrityError:
+        pass  # Created by another process starting at the same time
+
 def get_db_session():
     """Get a database session."""
+    get_engine()
     db = SessionLocal()
     try:
         return db
     except Exception as e:
         db.close()
-        raise e
\ No newline at end of file
+        raise e
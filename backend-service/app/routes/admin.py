@@ -0,0 +1,76 @@
+"""
+Admin routes for the Chat Application.
+Serves request profiles captured by the profiling service and the
+message pipeline's per-stage throughput.
+Each Gunicorn worker keeps its own profiles and stats; repeat the request
+to see other workers'.
+Every route needs the `X-Profile: <PROFILING_TOKEN>` header; sessions
+grant no access (every registered account has classification 'A').
+"""
+from flask import Blueprint, Response, jsonify, request
+from app.services.message_pipeline import message_pipeline
+from app.services.profiling_service import profiling_service
+
+# Create blueprint for admin routes
+admin_bp = Blueprint('admin', __name__)
+
+
+def _is_admin() -> bool:
+    """The request carries the profiling token (no token configured: nobody is admin)."""
+    return profiling_service.is_authorized()
+
+
+@admin_bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    """
+    List the slowest recently captured profiles (slowest first).
+    Admin only.
+    """
+    if not _is_admin():
+        return jsonify({'error': 'Unauthorized - admin access required'}), 403
+
+    profiles = profiling_service.list_profiles()
+    return jsonify({
+        'success': True,
+        'enabled': profiling_service.enabled,
+        'engine': profiling_service.engine,
+        'profiles': profiles,
+        'count': len(profiles)
+    })
+
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    Get one profile as text, or as an HTML flamegraph view with
+    ?format=html (pyinstrument captures only).
+    Admin only.
+    """
+    if not _is_admin():
+        return jsonify({'error': 'Unauthorized - admin access required'}), 403
+
+    profile = profiling_service.get_profile(profile_id)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    if request.args.get('format') == 'html':
+        if not profile['html']:
+            return jsonify({'error': 'HTML output needs pyinstrument'}), 400
+        return Response(profile['html'], mimetype='text/html')
+    return Response(profile['text'], mimetype='text/plain')
+
+
+@admin_bp.route('/pipeline', methods=['GET'])
+def pipeline_stats():
+    """
+    Per-stage throughput of the message-processing pipeline in this worker.
+    Admin only.
+    """
+    if not _is_admin():
+        return jsonify({'error': 'Unauthorized - admin access required'}), 403
+
+    return jsonify({
+        'success': True,
+        'running': message_pipeline.stages is not None,
+        'stages': message_pipeline.stats()
+    })
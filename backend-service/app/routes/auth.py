@@ -8,11 +8,28 @@ from datetime import datetime
 from app.services.database import db_service
 from app.services.redis_service import redis_service
 from app.services.queue_service import queue_service
+from app.services.hashing_service import HashingUnavailableError
 import uuid
 
 # Create blueprint for auth routes
 auth_bp = Blueprint('auth', __name__)
 
+@auth_bp.before_app_request
+def refresh_session():
+    """
+    Keep the server-side session alive while the user is active.
+    Drops the cookie session if its Redis session expired or was revoked
+    (e.g. by "log out everywhere"). The expiry refresh is rate-limited in
+    the session store, so most requests only cost one Redis read.
+    """
+    session_id = session.get('session_id')
+    if not session_id or not redis_service.is_available():
+        return None
+    
+    if redis_service.get_session(session_id) is None:
+        session.clear()
+    return None
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """
@@ -32,7 +49,11 @@ def login():
         return jsonify({'error': 'Username and password are required'}), 400
     
     # Verify user credentials using database service
-    user = db_service.verify_user(username, password)
+    try:
+        user = db_service.verify_user(username, password)
+    except HashingUnavailableError:
+        return jsonify({'error': 'Server busy, please try again'}), 503, {'Retry-After': '1'}
+    
     if user:
         # Create session
         session_id = str(uuid.uuid4())
@@ -92,9 +113,10 @@ def logout():
     
     # Remove user from online list and clear session from Redis
     if username and redis_service.is_available():
-        redis_service.remove_online_user(username)
         if session_id:
-            redis_service.delete_session(session_id)
+            redis_service.end_session(session_id, username)
+        else:
+            redis_service.remove_online_user(username)
     
     # Log user activity
     if username and queue_service.is_available():
@@ -108,6 +130,31 @@ def logout():
         'message': 'Logged out successfully'
     }), 200
 
+@auth_bp.route('/logout-all', methods=['POST'])
+def logout_all():
+    """
+    Log the current user out of every session on every device.
+    JSON API only - for React frontend.
+    """
+    username = session.get('username')
+    if not username:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    revoked = 0
+    if redis_service.is_available():
+        revoked = redis_service.end_user_sessions(username)
+    
+    if queue_service.is_available():
+        queue_service.log_user_activity(username, 'logout_all', {'sessions': revoked})
+    
+    session.clear()
+    
+    return jsonify({
+        'success': True,
+        'message': 'Logged out of all sessions',
+        'sessions_revoked': revoked
+    }), 200
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """
@@ -147,7 +194,15 @@ def register():
             return jsonify({'error': 'Age must be a valid number'}), 400
     
     # Create user in database
-    if db_service.create_user(user_id, username, password, 'A', age_int, email):
+    try:
+        created = db_service.create_user(user_id, username, password, 'A', age_int, email)
+    except HashingUnavailableError:
+        return jsonify({'error': 'Server busy, please try again'}), 503, {'Retry-After': '1'}
+    
+    if created:
+        if redis_service.is_available():
+            redis_service.bump_data_version('users')
+        
         # Send welcome email via message queue
         if queue_service.is_available():
             queue_service.queue_email_notification(
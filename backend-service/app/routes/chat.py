@@ -3,19 +3,31 @@ Chat routes for the Chat Application.
 Handles chat functionality and real-time messaging.
 Pure JSON API for React frontend.
 """
-from flask import Blueprint, request, jsonify, session
+import math
+import time
+from flask import Blueprint, current_app, request, jsonify, session
 from app.services.database import db_service
 from app.services.redis_service import redis_service
 from app.services.queue_service import queue_service
+from app.services.json_service import json_array_response, json_response
+from app.services.etag_service import conditional_on
+from app.services.compaction_service import compaction_service
+from app.services.id_service import id_millis, id_service
+from app.services.message_journal import message_journal
+from app.services.notification_service import notification_service
+from app.services.receipt_service import receipt_service, valid_emoji
 
 # Create blueprint for chat routes
 chat_bp = Blueprint('chat', __name__)
 
 @chat_bp.route('/messages', methods=['GET'])
+@conditional_on('messages')
 def get_messages():
     """
     Get all chat messages as JSON.
     This is the PRIMARY endpoint React uses to fetch messages.
+    Unchanged polls get 304 Not Modified via the ETag.
+    Message IDs are strings (64-bit integers don't survive JavaScript numbers).
     """
     # Check authentication
     if 'username' not in session:
@@ -24,28 +36,116 @@ def get_messages():
     # Fetch all messages from database
     messages = db_service.get_all_messages()
     
-    # Convert to JSON format
+    # Convert to JSON format (datetimes are encoded by the JSON provider)
     messages_list = []
     for msg in messages:
         messages_list.append({
-            'id': msg.id if hasattr(msg, 'id') else None,
+            'id': str(msg.id),
             'user_id': msg.user_id if hasattr(msg, 'user_id') else None,
             'username': msg.username,
             'content': msg.message,  # Note: database field is 'message' but React expects 'content'
-            'created_at': msg.timestamp.isoformat() if hasattr(msg, 'timestamp') and msg.timestamp else None
+            'created_at': msg.timestamp
         })
     
-    return jsonify({
+    return json_array_response({'success': True}, 'messages', messages_list)
+
+def fetch_changes(after_revision, limit):
+    """Messages (with saved reaction counts) and read markers changed after after_revision."""
+    messages = db_service.get_changes_after(after_revision, limit)
+    # A full page ends at its last message; later markers come with the next page
+    until_revision = messages[-1].revision if len(messages) == limit else None
+    read_markers = db_service.get_read_markers_after(after_revision, until_revision)
+    reactions = db_service.get_reaction_counts([msg.id for msg in messages if not msg.deleted_at])
+    return messages, reactions, read_markers
+
+@chat_bp.route('/poll', methods=['GET'])
+def poll_messages():
+    """
+    Long-poll for new, deleted and reacted-to messages and read receipts.
+    Query: after=<cursor from the last poll>, timeout=<seconds, default 25>.
+    Returns as soon as anything changed after `after`, or an empty list when
+    the timeout expires. A worker holds at most POLL_MAX_WAITING polls
+    open; beyond that a poll is answered at once, with a Retry-After
+    header saying when to poll again. Pass the returned `after` to the next poll: it is
+    a feed revision, and revisions follow commit order on every pod, so
+    nothing committed later can land behind it.
+    A deleted message comes back as {'id', 'deleted': true, 'deleted_at'};
+    'resync': true means deletes may have been missed - reload /messages.
+    'read_markers' maps users to the newest message they have read.
+    """
+    # Check authentication
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    config = current_app.config
+    after = request.args.get('after', type=int)
+    timeout = request.args.get('timeout', config['POLL_TIMEOUT'], type=float)
+    timeout = max(0.0, min(timeout, config['POLL_MAX_TIMEOUT']))
+    limit = config['POLL_MAX_MESSAGES']
+    
+    # Every waiting poll holds a server thread: past the limit, answer at once
+    waiting = timeout > 0 and notification_service.reserve_waiter(config['POLL_MAX_WAITING'])
+    busy = timeout > 0 and not waiting
+    if busy:
+        timeout = 0.0
+    try:
+        if notification_service.start(db_service.get_latest_revision):
+            if after is None:
+                # No cursor yet: start from the newest message
+                after = notification_service.latest_id
+            latest = notification_service.wait_for_message(after, timeout)
+        else:
+            latest = None
+        
+        if latest is None:
+            # Redis unavailable: wait a little, then check the database once
+            if after is None:
+                after = db_service.get_latest_revision() or 0
+            time.sleep(min(timeout, config['POLL_FALLBACK_INTERVAL']))
+            messages, reactions, read_markers = fetch_changes(after, limit)
+        elif latest > after:
+            messages, reactions, read_markers = notification_service.messages_after(
+                after, latest, lambda after_revision: fetch_changes(after_revision, limit)
+            )
+        else:
+            messages, reactions, read_markers = [], {}, []
+    finally:
+        if waiting:
+            notification_service.release_waiter()
+    
+    messages_list = [{
+        'id': str(msg.id),
+        'deleted': True,
+        'deleted_at': msg.deleted_at
+    } if msg.deleted_at else {
+        'id': str(msg.id),
+        'username': msg.username,
+        'content': msg.message,
+        'created_at': msg.timestamp,
+        'reactions': reactions.get(msg.id, {})
+    } for msg in messages]
+    
+    # Both lists are in revision order; the cursor is the newest change returned
+    latest_change = max([after] + [changes[-1].revision for changes in (messages, read_markers) if changes])
+    body = {
         'success': True,
         'messages': messages_list,
-        'count': len(messages_list)
-    }), 200
+        'count': len(messages_list),
+        'read_markers': {marker.username: str(marker.last_read_id) for marker in read_markers},
+        'after': str(latest_change)
+    }
+    if compaction_service.needs_resync(after):
+        body['resync'] = True
+    headers = {'Retry-After': str(math.ceil(config['POLL_FALLBACK_INTERVAL']))} if busy else None
+    return json_response(body, headers=headers)
 
 @chat_bp.route('/send', methods=['POST'])
 def send_message():
     """
     Send a new chat message.
     JSON API only - for React frontend.
+    With write-behind on, the message is journaled and saved shortly after
+    (202 Accepted); otherwise it is saved before responding (201).
     """
     # Check authentication
     if 'username' not in session:
@@ -65,15 +165,37 @@ def send_message():
     if not message or not message.strip():
         return jsonify({'error': 'Message cannot be empty'}), 400
     
+    # The public ID is assigned now, so it is known even before the message is saved
+    message_id = id_service.next_id()
+    
+    # Journal the message for the persisters (falls through when unavailable or full)
+    entry_id = message_journal.append(message_id, username, message, user_id)
+    if entry_id:
+        return jsonify({
+            'success': True,
+            'message': 'Message accepted',
+            'data': {
+                'id': str(message_id),
+                'username': username,
+                'content': message,
+                'journal_id': entry_id
+            }
+        }), 202
+    
     # Save message to database
-    if db_service.create_chat_message(username, message):
-        # Update message count in Redis cache
+    saved = db_service.create_chat_message(username, message, message_id)
+    if saved:
+        message_key, revision = saved
+        # Update message count and history version in Redis
         if redis_service.is_available():
             redis_service.increment_message_count(username)
+            redis_service.bump_data_version('messages', max_key=message_key)
+            redis_service.publish_new_message(revision)
         
         # Queue message for processing (asynchronous)
         if queue_service.is_available():
             queue_service.queue_message_processing({
+                'id': message_key,
                 'username': username,
                 'message': message,
                 'user_id': user_id
@@ -84,6 +206,7 @@ def send_message():
             'success': True,
             'message': 'Message sent successfully',
             'data': {
+                'id': str(message_id),
                 'username': username,
                 'content': message
             }
@@ -96,7 +219,8 @@ def send_message():
 def delete_message(message_id):
     """
     Delete a specific chat message.
-    Only the message owner can delete their message.
+    Only the message owner can delete their message. The message becomes a
+    tombstone that pollers receive as a change (see poll_messages).
     """
     # Check authentication
     if 'username' not in session:
@@ -104,24 +228,118 @@ def delete_message(message_id):
     
     username = session['username']
     
-    # Get the message to verify ownership
-    message = db_service.get_message_by_id(message_id)
+    # Ownership is checked by the delete itself (one statement, no race)
+    revision = db_service.delete_message(message_id, username)
+    
+    if revision is None:
+        message = db_service.get_message_by_id(message_id)
+        if not message:
+            return jsonify({'error': 'Message not found'}), 404
+        if message.username != username:
+            return jsonify({'error': 'You can only delete your own messages'}), 403
+        return jsonify({'error': 'Failed to delete message'}), 500
+    
+    if redis_service.is_available():
+        redis_service.bump_data_version('messages')
+        redis_service.publish_new_message(revision)
+        redis_service.clear_reactions(message_id)
+    return jsonify({
+        'success': True,
+        'message': 'Message deleted successfully'
+    }), 200
+
+@chat_bp.route('/message/<int:message_id>/reactions', methods=['POST', 'DELETE'])
+def react_to_message(message_id):
+    """
+    Add (POST) or remove (DELETE) the current user's emoji reaction.
+    The emoji is given as {"emoji": ...} or ?emoji=. Reacting twice counts once.
+    """
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    emoji = request.args.get('emoji') or (request.get_json(silent=True) or {}).get('emoji')
+    if not valid_emoji(emoji):
+        return jsonify({'error': 'Invalid emoji'}), 400
     
-    if not message:
+    if not db_service.get_message_by_id(message_id):
         return jsonify({'error': 'Message not found'}), 404
     
-    # Check if user owns the message
-    if message.username != username:
-        return jsonify({'error': 'You can only delete your own messages'}), 403
+    counts = receipt_service.react(message_id, session['username'], emoji, add=request.method == 'POST')
+    if counts is None:
+        return jsonify({'error': 'Reactions not available'}), 503
+    return jsonify({'success': True, 'id': str(message_id), 'reactions': counts})
+
+@chat_bp.route('/reactions', methods=['GET'])
+def get_reactions():
+    """
+    Current reaction counts of some messages.
+    Query: ids=<comma-separated message IDs> (at most POLL_MAX_MESSAGES).
+    """
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        message_ids = [int(message_id) for message_id in request.args.get('ids', '').split(',') if message_id]
+    except ValueError:
+        return jsonify({'error': 'Invalid message IDs'}), 400
+    if len(message_ids) > current_app.config['POLL_MAX_MESSAGES']:
+        return jsonify({'error': 'Too many message IDs'}), 400
     
-    # Delete the message
-    if db_service.delete_message(message_id):
-        return jsonify({
-            'success': True,
-            'message': 'Message deleted successfully'
-        }), 200
-    else:
-        return jsonify({'error': 'Failed to delete message'}), 500
+    reactions = receipt_service.get_reactions(message_ids)
+    return json_response({
+        'success': True,
+        'reactions': {str(message_id): counts for message_id, counts in reactions.items()}
+    })
+
+@chat_bp.route('/read', methods=['POST'])
+def mark_read():
+    """
+    Mark messages as read up to (and including) {"id": <message ID>}.
+    The read marker only moves forward. IDs are checked against the time
+    they encode, not the database, so an ID can't be from the future but
+    may belong to a message that is still being saved.
+    """
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        message_id = int(data.get('id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid message ID'}), 400
+    
+    newest_millis = time.time() * 1000 + current_app.config['ID_CLOCK_SKEW_MS']
+    if not 0 < message_id < 1 << 63 or id_millis(message_id) > newest_millis:
+        return jsonify({'error': 'Invalid message ID'}), 400
+    
+    marker = receipt_service.mark_read(session['username'], message_id)
+    if marker is None:
+        return jsonify({'error': 'Failed to mark messages read'}), 500
+    return jsonify({'success': True, 'last_read': str(marker)})
+
+@chat_bp.route('/unread', methods=['GET'])
+def get_unread():
+    """Number of messages after the current user's read marker."""
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    marker = receipt_service.get_read_marker(session['username'])
+    unread = db_service.count_messages_after(marker)
+    if unread is None:
+        return jsonify({'error': 'Failed to count unread messages'}), 500
+    return jsonify({'success': True, 'last_read': str(marker), 'unread': unread})
+
+@chat_bp.route('/read-receipts', methods=['GET'])
+def get_read_receipts():
+    """Every user's read marker: a message is read by the users whose marker is at or after its ID."""
+    if 'username' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    markers = receipt_service.get_read_markers()
+    return json_response({
+        'success': True,
+        'read_markers': {username: str(marker) for username, marker in markers.items()}
+    })
 
 @chat_bp.route('/typing', methods=['POST'])
 def set_typing():
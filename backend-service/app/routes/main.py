@@ -28,10 +28,12 @@ def index():
                 'login': '/api/auth/login [POST]',
                 'register': '/api/auth/register [POST]',
                 'logout': '/api/auth/logout [POST]',
+                'logout_all': '/api/auth/logout-all [POST]',
                 'profile': '/api/auth/profile [GET]'
             },
             'chat': {
                 'messages': '/api/chat/messages [GET]',
+                'poll': '/api/chat/poll?after=<key>&timeout=<s> [GET]',
                 'send': '/api/chat/send [POST]',
                 'delete': '/api/chat/message/<id> [DELETE]'
             },
@@ -41,6 +43,10 @@ def index():
                 'update': '/api/users/<id> [PUT]',
                 'delete': '/api/users/<id> [DELETE]',
                 'online': '/api/users/online [GET]'
+            },
+            'admin': {
+                'profiles': '/admin/profiles [GET]',
+                'profile': '/admin/profiles/<id> [GET]'
             }
         }
     }), 200
@@ -6,11 +6,14 @@ Pure JSON API for React frontend.
 from flask import Blueprint, request, session, jsonify
 from app.services.database import db_service
 from app.services.redis_service import redis_service
+from app.services.json_service import json_array_response
+from app.services.etag_service import conditional_on, conditional_response, content_etag
 
 # Create blueprint for user routes
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/', methods=['GET'])
+@conditional_on('users')
 def get_all_users():
     """
     Get all users as JSON.
@@ -23,7 +26,7 @@ def get_all_users():
     # Fetch all users from database
     users = db_service.get_all_users()
     
-    # Convert to JSON format
+    # Convert to JSON format (datetimes are encoded by the JSON provider)
     users_list = []
     for user in users:
         users_list.append({
@@ -31,14 +34,10 @@ def get_all_users():
             'username': user.username,
             'email': user.email,
             'age': user.age,
-            'created_at': user.date.isoformat() if hasattr(user, 'date') and user.date else None
+            'created_at': getattr(user, 'date', None)
         })
     
-    return jsonify({
-        'success': True,
-        'users': users_list,
-        'count': len(users_list)
-    }), 200
+    return json_array_response({'success': True}, 'users', users_list)
 
 @user_bp.route('/<user_id>', methods=['GET'])
 def get_user(user_id):
@@ -120,6 +119,7 @@ def update_user(user_id):
     if db_service.update_user(user_id, **updates):
         # Clear cached user data in Redis
         if redis_service.is_available():
+            redis_service.bump_data_version('users')
             redis_service.redis_client.delete(f"user_cache:{target_user.username}")
             if updates.get('username'):
                 redis_service.redis_client.delete(f"user_cache:{data['username']}")
@@ -167,9 +167,8 @@ def delete_user(user_id):
     if db_service.delete_user(user_id):
         # Clean up Redis data
         if redis_service.is_available():
-            redis_service.remove_online_user(target_user.username)
-            redis_service.redis_client.delete(f"user_cache:{target_user.username}")
-            redis_service.redis_client.delete(f"message_count:{target_user.username}")
+            redis_service.bump_data_version('users')
+            redis_service.purge_user(target_user.username)
         
         return jsonify({
             'success': True,
@@ -186,11 +185,12 @@ def online_users():
     """
     if redis_service.is_available():
         users = redis_service.get_online_users()
-        return jsonify({
+        # The list comes from Redis anyway, so it is its own version marker
+        return conditional_response(content_etag('online', users), lambda: jsonify({
             'success': True,
             'online_users': users,
             'count': len(users)
-        }), 200
+        }))
     else:
         return jsonify({
             'success': True,
@@ -0,0 +1,125 @@
+"""
+Deleted Message Compaction
+Deleting a message only turns it into a tombstone: its content is cleared
+and it gets a new revision, so long-polling clients receive the delete in
+their delta feed like any other change. Tombstones older than
+TOMBSTONE_RETENTION are removed for good by this job.
+
+- Runs every COMPACTION_INTERVAL seconds in a background thread, in one
+  process of the deployment at a time: the run takes the Redis lock
+  lock:compaction and keeps it for the interval, so the other workers and
+  pods skip their turn. Without Redis every process compacts on its own,
+  which is safe, only redundant.
+- Removes COMPACTION_BATCH_SIZE rows per transaction and pauses between
+  batches, so a large backlog never holds long locks or starves requests.
+- A client whose poll cursor is older than the retention may have missed
+  tombstones that are gone now; the poll tells it to reload (resync).
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from config import Config
+from app.services.database import db_service
+from app.services.id_service import id_millis
+from app.services.monitoring_service import compacted_messages_total, compaction_duration_seconds
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+# Config keys this service reads
+SETTINGS = ('TOMBSTONE_RETENTION', 'COMPACTION_INTERVAL', 'COMPACTION_BATCH_SIZE', 'COMPACTION_BATCH_PAUSE')
+
+# Redis lock held by the process running compaction
+LOCK_NAME = 'compaction'
+
+# Seconds after startup before the first run, so a deploy doesn't compact
+# while workers are still warming up
+STARTUP_DELAY = 60
+
+
+class CompactionService:
+    """Service removing old tombstones of deleted messages."""
+
+    def __init__(self):
+        self.configure({})
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+
+    def configure(self, settings):
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        settings = {key: settings.get(key, getattr(Config, key)) for key in SETTINGS}
+        self.retention = settings['TOMBSTONE_RETENTION']
+        self.interval = settings['COMPACTION_INTERVAL']
+        self.batch_size = settings['COMPACTION_BATCH_SIZE']
+        self.batch_pause = settings['COMPACTION_BATCH_PAUSE']
+
+    def init_app(self, app):
+        """Configure from the Flask app. The job starts with the background workers."""
+        self.configure(app.config)
+
+    def needs_resync(self, after_revision: int) -> bool:
+        """Whether a poll cursor is so old that tombstones after it may have been compacted."""
+        return after_revision > 0 and id_millis(after_revision) < (time.time() - self.retention) * 1000
+
+    # Compacting
+    def start(self):
+        """Start the compaction thread in this process (if an interval is set)."""
+        if self.interval <= 0:
+            return None
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return self._thread
+        self._stopping.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='compaction')
+        self._thread.start()
+        logger.info("Compaction job started")
+        return self._thread
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the job after its current batch."""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        """Job loop: compact once per interval if no other process has this turn."""
+        self._stopping.wait(min(STARTUP_DELAY, self.interval))
+        while not self._stopping.is_set():
+            token = uuid.uuid4().hex
+            if redis_service.acquire_lock(LOCK_NAME, token, self.interval) is not False:
+                if self.run_once() is None:
+                    # Failed: let another process try before the interval is up
+                    redis_service.release_lock(LOCK_NAME, token)
+            self._stopping.wait(self.interval)
+
+    def run_once(self):
+        """
+        Remove tombstones older than the retention, batch by batch. Returns
+        the number removed, or None if a batch failed.
+        """
+        start = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        total = 0
+        while True:
+            removed = db_service.purge_deleted_messages(cutoff, self.batch_size)
+            if removed is None:
+                return None
+            total += removed
+            compacted_messages_total.inc(removed)
+            if removed < self.batch_size or self._stopping.is_set():
+                break
+            self._stopping.wait(self.batch_pause)
+
+        compaction_duration_seconds.observe(time.perf_counter() - start)
+        if total:
+            logger.info(f"Compaction removed {total} deleted messages")
+        return total
+
+
+# Singleton instance
+compaction_service = CompactionService()
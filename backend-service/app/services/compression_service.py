@@ -0,0 +1,189 @@
+"""
+Response Compression Service
+Negotiates brotli/gzip for JSON responses in an after_request hook.
+
+- Bodies smaller than COMPRESSION_MIN_SIZE are sent as-is
+- Streamed responses are compressed chunk by chunk
+- Responses carrying an ETag are cached compressed in a small LRU, so a
+  hot page (e.g. the message history between two sends) is compressed once
+  and then served to every polling client from memory
+
+Metrics exposed:
+- http_compression_bytes_saved_total: Bytes saved by compression (counter)
+- http_compression_duration_seconds: Time spent compressing (histogram)
+- http_compression_cache_total: Compressed-body cache hits/misses (counter)
+"""
+import gzip
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from flask import request
+from prometheus_client import Counter, Histogram
+import logging
+
+try:
+    import brotli
+except ImportError:  # Optional dependency - gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Define metrics
+compression_bytes_saved_total = Counter(
+    'http_compression_bytes_saved_total',
+    'Bytes saved by response compression',
+    ['encoding']
+)
+
+compression_duration_seconds = Histogram(
+    'http_compression_duration_seconds',
+    'Time spent compressing response bodies',
+    ['encoding'],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+compression_cache_total = Counter(
+    'http_compression_cache_total',
+    'Compressed response cache lookups',
+    ['result']
+)
+
+# Bodies larger than this are compressed but never cached
+MAX_CACHED_BODY = 4 * 1024 * 1024
+
+
+class CompressedBodyCache:
+    """Thread-safe LRU of compressed bodies keyed by (ETag, encoding)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CompressionService:
+    """Service for compressing HTTP responses."""
+
+    def __init__(self):
+        self.min_size = 1024
+        self.level = 6
+        self.brotli_quality = 4
+        self.mimetypes = {'application/json'}
+        self.cache = CompressedBodyCache(64)
+
+    def choose_encoding(self):
+        """Pick the best encoding the client accepts ('br', 'gzip' or None)."""
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        """Compress a whole body."""
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.level)
+
+    def compress_stream(self, chunks, encoding: str):
+        """Compress a streamed body chunk by chunk."""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            finish = compressor.finish
+            process = compressor.process
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31 = gzip container
+            finish = compressor.flush
+            process = compressor.compress
+
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            out = process(chunk)
+            if out:
+                yield out
+        yield finish()
+
+    def after_request(self, response):
+        """Compress the response if the client and the body qualify."""
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.mimetypes):
+            return response
+
+        encoding = self.choose_encoding()
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self.compress_stream(response.response, encoding)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag = response.headers.get('ETag')
+        cache_key = (etag, encoding) if etag else None
+        compressed = self.cache.get(cache_key) if cache_key else None
+
+        if compressed is not None:
+            compression_cache_total.labels(result='hit').inc()
+        else:
+            start = time.perf_counter()
+            compressed = self.compress(data, encoding)
+            compression_duration_seconds.labels(encoding=encoding).observe(time.perf_counter() - start)
+            if cache_key:
+                compression_cache_total.labels(result='miss').inc()
+                if len(compressed) <= MAX_CACHED_BODY:
+                    self.cache.put(cache_key, compressed)
+
+        if len(compressed) >= len(data):
+            return response
+
+        compression_bytes_saved_total.labels(encoding=encoding).inc(len(data) - len(compressed))
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def register_middleware(self, app):
+        """
+        Register compression with Flask app.
+        Call this in your app factory.
+        """
+        if not app.config.get('COMPRESSION_ENABLED', True):
+            logger.info("Response compression disabled")
+            return
+
+        self.min_size = app.config.get('COMPRESSION_MIN_SIZE', self.min_size)
+        self.level = app.config.get('COMPRESSION_LEVEL', self.level)
+        self.brotli_quality = app.config.get('COMPRESSION_BROTLI_QUALITY', self.brotli_quality)
+        self.cache = CompressedBodyCache(app.config.get('COMPRESSION_CACHE_SIZE', 64))
+        app.after_request(self.after_request)
+        logger.info(f"✅ Response compression registered (brotli {'on' if brotli else 'off'})")
+
+
+# Singleton instance
+compression_service = CompressionService()
@@ -2,27 +2,56 @@
 Database service layer for Chat Application.
 Handles all database operations with proper error handling and logging.
 """
+import json
 import logging
-from app.models import User, ChatMessage, SessionLocal, get_db_session
+import time
+from datetime import datetime
+from app.models import (User, ChatMessage, FeedSequence, JournalEntry, MessageReaction, MessageVerdict, ReadMarker,
+                        FEED_SEQUENCE, SessionLocal, get_db_session)
+from app.services.hashing_service import hashing_service, HashingUnavailableError
+from app.services.id_service import id_for_millis, id_service
+from app.services.monitoring_service import timed, record_error
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 # Simple logger
 logger = logging.getLogger(__name__)
 
+def take_revisions(count: int = 1):
+    """
+    Statement taking `count` delta feed revisions; it returns the last one.
+    Run it in the transaction saving the change, before the rows that get
+    the revisions: the counter row stays locked until commit, so revisions
+    are handed out in commit order (see FeedSequence).
+    """
+    table = FeedSequence.__table__
+    # Never below the ID clock: revisions stay comparable with message IDs
+    # (saved before the counter existed) and tell roughly when they were made
+    floor = id_for_millis(int(time.time() * 1000))
+    return (update(table).where(table.c.name == FEED_SEQUENCE)
+            .values(value=case((table.c.value < floor, floor - 1), else_=table.c.value) + count)
+            .returning(table.c.value))
+
 class DatabaseService:
     """Service class for database operations."""
     
     @staticmethod
+    @timed('database')
     def create_user(user_id: str, username: str, password: str, 
                    classification: str = 'A', age: int = None, email: str = None) -> bool:
-        """Create a new user in the database."""
+        """
+        Create a new user in the database.
+        The password is stored as a salted hash, never in plaintext.
+        Raises HashingUnavailableError if the hashing pool is overloaded.
+        """
+        password_hash = hashing_service.hash_password(password)
         db = get_db_session()
         try:
             new_user = User(
                 id=user_id,
                 username=username,
-                password=password,
+                password=password_hash,
                 classification=classification,
                 age=age,
                 email=email
@@ -36,6 +65,7 @@ class DatabaseService:
             logger.error(f"IntegrityError creating user {username}: {e}")
             return False
         except Exception as e:
+            record_error(e)
             db.rollback()
             logger.error(f"Unexpected error creating user {username}: {e}")
             return False
@@ -43,25 +73,61 @@ class DatabaseService:
             db.close()
     
     @staticmethod
+    @timed('database')
     def verify_user(username: str, password: str) -> Optional[User]:
         """
         Verify user credentials.
         Returns User object if valid, None otherwise.
+        
+        Looks the user up by the (unique, indexed) username only and checks
+        the password off-thread in the hashing pool. Hashes made with old
+        parameters, and legacy plaintext rows, are upgraded on success.
+        Raises HashingUnavailableError if the hashing pool is overloaded.
         """
         db = get_db_session()
         try:
-            user = db.query(User).filter(
-                User.username == username, 
-                User.password == password
-            ).first()
-            return user  # Returns User object or None
+            user = db.query(User).filter(User.username == username).first()
         except Exception as e:
+            record_error(e)
             logger.error(f"Error verifying user: {e}")
             return None
         finally:
             db.close()
+        
+        stored = user.password if user else None
+        if not hashing_service.verify_password(stored, password):
+            return None
+        
+        if hashing_service.needs_rehash(stored):
+            DatabaseService._upgrade_password_hash(user.key, stored, password)
+        return user
     
     @staticmethod
+    @timed('database', 'upgrade_password_hash')
+    def _upgrade_password_hash(user_key: int, old_value: str, password: str) -> None:
+        """Re-hash a password with current parameters (best effort)."""
+        try:
+            new_hash = hashing_service.hash_password(password)
+        except HashingUnavailableError:
+            return  # Try again on a quieter login
+        
+        db = get_db_session()
+        try:
+            # Compare-and-set so a concurrent password change is never overwritten
+            db.query(User).filter(
+                User.key == user_key,
+                User.password == old_value
+            ).update({User.password: new_hash}, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            record_error(e)
+            db.rollback()
+            logger.error(f"Error upgrading password hash: {e}")
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
     def get_user_by_username(username: str) -> Optional[User]:
         """Get user by username."""
         db = get_db_session()
@@ -69,12 +135,14 @@ class DatabaseService:
             user = db.query(User).filter(User.username == username).first()
             return user
         except Exception as e:
+            record_error(e)
             logger.error(f"Error getting user: {e}")
             return None
         finally:
             db.close()
     
     @staticmethod
+    @timed('database')
     def get_user_by_id(user_id: str) -> Optional[User]:
         """Get user by ID."""
         db = get_db_session()
@@ -82,12 +150,14 @@ class DatabaseService:
             user = db.query(User).filter(User.id == user_id).first()
             return user
         except Exception as e:
+            record_error(e)
             print(f"Error getting user by ID: {e}")
             return None
         finally:
             db.close()
     
     @staticmethod
+    @timed('database')
     def get_all_users() -> List[User]:
         """Get all users from the database."""
         db = get_db_session()
@@ -95,12 +165,14 @@ class DatabaseService:
             users = db.query(User).all()
             return users
         except Exception as e:
+            record_error(e)
             logger.error(f"Error getting users: {e}")
             return []
         finally:
             db.close()
     
     @staticmethod
+    @timed('database')
     def update_user(user_id: str, **kwargs) -> bool:
         """Update user information."""
         db = get_db_session()
@@ -116,6 +188,7 @@ class DatabaseService:
             db.commit()
             return True
         except Exception as e:
+            record_error(e)
             db.rollback()
             print(f"Error updating user: {e}")
             return False
@@ -123,6 +196,7 @@ class DatabaseService:
             db.close()
     
     @staticmethod
+    @timed('database')
     def delete_user(user_id: str) -> bool:
         """Delete user from database."""
         db = get_db_session()
@@ -134,6 +208,7 @@ class DatabaseService:
                 return True
             return False
         except Exception as e:
+            record_error(e)
             db.rollback()
             print(f"Error deleting user: {e}")
             return False
@@ -141,6 +216,7 @@ class DatabaseService:
             db.close()
     
     @staticmethod
+    @timed('database')
     def count_users() -> int:
         """Count total number of users."""
         db = get_db_session()
@@ -148,79 +224,449 @@ class DatabaseService:
             count = db.query(User).count()
             return count
         except Exception as e:
+            record_error(e)
             print(f"Error counting users: {e}")
             return 0
         finally:
             db.close()
     
     @staticmethod
-    def create_chat_message(username: str, message: str) -> bool:
-        """Create a new chat message."""
+    @timed('database')
+    def create_chat_message(username: str, message: str, message_id: int = None) -> Optional[Tuple[int, int]]:
+        """
+        Create a new chat message with the given public ID (a new one if None).
+        Returns the new message's (key, revision), or None if it could not be saved.
+        """
+        if message_id is None:
+            message_id = id_service.next_id()
         db = get_db_session()
         try:
-            new_message = ChatMessage(username=username, message=message)
+            revision = db.execute(take_revisions()).scalar_one()
+            new_message = ChatMessage(id=message_id, revision=revision, username=username, message=message)
             db.add(new_message)
+            db.flush()  # INSERT now so the key is known without a reload after commit
+            message_key = new_message.key
             db.commit()
-            return True
+            return message_key, revision
         except Exception as e:
+            record_error(e)
             db.rollback()
             print(f"Error creating message: {e}")
-            return False
+            return None
         finally:
             db.close()
     
     @staticmethod
+    @timed('database')
     def get_all_messages() -> List[ChatMessage]:
-        """Get all chat messages ordered by timestamp."""
+        """Get all chat messages (not deleted ones), oldest first (by message ID)."""
         db = get_db_session()
         try:
-            messages = db.query(ChatMessage).order_by(ChatMessage.timestamp.asc()).all()
+            messages = db.query(ChatMessage).filter(
+                ChatMessage.deleted_at.is_(None)
+            ).order_by(ChatMessage.id.asc()).all()
             return messages
         except Exception as e:
+            record_error(e)
             print(f"Error getting messages: {e}")
             return []
         finally:
             db.close()
     
     @staticmethod
+    @timed('database')
+    def get_changes_after(after_revision: int, limit: int = 500) -> List[ChatMessage]:
+        """
+        Get up to `limit` messages changed after after_revision - new
+        messages and tombstones of deleted ones - in revision order. Used
+        by long-poll clients to fetch what they missed.
+        """
+        db = get_db_session()
+        try:
+            messages = db.query(ChatMessage).filter(
+                ChatMessage.revision > after_revision
+            ).order_by(ChatMessage.revision.asc()).limit(limit).all()
+            return messages
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting changes after {after_revision}: {e}")
+            return []
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def get_latest_revision() -> Optional[int]:
+        """Get the revision of the latest committed change to messages or read markers (0 if none, None on error)."""
+        db = get_db_session()
+        try:
+            return db.execute(
+                select(FeedSequence.value).where(FeedSequence.name == FEED_SEQUENCE)
+            ).scalar() or 0
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting latest revision: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
     def get_message_by_id(message_id: int) -> Optional[ChatMessage]:
         """
-        Get a specific message by ID.
+        Get a specific message by ID (None if it was deleted).
         Used for message deletion verification.
         """
         db = get_db_session()
         try:
-            message = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
+            message = db.query(ChatMessage).filter(
+                ChatMessage.id == message_id,
+                ChatMessage.deleted_at.is_(None)
+            ).first()
             return message
         except Exception as e:
+            record_error(e)
             print(f"Error getting message by ID: {e}")
             return None
         finally:
             db.close()
     
     @staticmethod
-    def delete_message(message_id: int) -> bool:
+    @timed('database')
+    def delete_message(message_id: int, username: str = None) -> Optional[int]:
         """
-        Delete a specific message by ID.
-        Returns True if deleted successfully, False otherwise.
+        Soft-delete a message by ID (only if it belongs to username, when
+        given). A single UPDATE marks it deleted, clears its content and
+        gives it a new revision, so delta feeds pick up the tombstone;
+        compaction removes the row later.
+        Returns the tombstone's revision, or None if no such message was
+        found or it could not be deleted.
         """
+        conditions = [ChatMessage.id == message_id, ChatMessage.deleted_at.is_(None)]
+        if username is not None:
+            conditions.append(ChatMessage.username == username)
         db = get_db_session()
         try:
-            message = db.query(ChatMessage).filter(ChatMessage.id == message_id).first()
-            if message:
-                db.delete(message)
-                db.commit()
-                print(f"Message {message_id} deleted successfully!")
-                return True
-            else:
+            revision = db.execute(take_revisions()).scalar_one()
+            deleted = db.execute(
+                update(ChatMessage).where(*conditions)
+                .values(deleted_at=datetime.utcnow(), message='', revision=revision)
+                .returning(ChatMessage.key)
+            ).first()
+            if deleted is None:
+                db.rollback()  # Give the revision back
                 print(f"Message {message_id} not found")
-                return False
+                return None
+            db.commit()
+            print(f"Message {message_id} deleted successfully!")
+            return revision
         except Exception as e:
+            record_error(e)
             db.rollback()
             print(f"Error deleting message: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def purge_deleted_messages(deleted_before: datetime, limit: int = 1000) -> Optional[int]:
+        """
+        Hard-delete up to `limit` messages deleted before deleted_before,
+        with their pipeline verdicts and reactions, in one transaction
+        (compaction). Returns the number of messages removed, or None on error.
+        """
+        db = get_db_session()
+        try:
+            rows = db.execute(
+                select(ChatMessage.key, ChatMessage.id).where(ChatMessage.deleted_at < deleted_before).limit(limit)
+            ).all()
+            if rows:
+                keys = [key for key, _ in rows]
+                db.execute(delete(MessageVerdict).where(MessageVerdict.message_key.in_(keys)))
+                db.execute(delete(MessageReaction).where(MessageReaction.message_id.in_([id_ for _, id_ in rows])))
+                db.execute(delete(ChatMessage).where(ChatMessage.key.in_(keys)))
+            db.commit()
+            return len(rows)
+        except Exception as e:
+            record_error(e)
+            db.rollback()
+            print(f"Error purging deleted messages: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def save_message_verdicts(verdicts: List[Dict]) -> bool:
+        """
+        Store pipeline verdicts for a batch of messages in one transaction.
+        Each dict has message_key, verdict, spam_score and flags; a message
+        processed again (redelivery) has its previous verdict replaced.
+        """
+        if not verdicts:
+            return True
+        db = get_db_session()
+        try:
+            db.execute(delete(MessageVerdict).where(
+                MessageVerdict.message_key.in_([v['message_key'] for v in verdicts])
+            ))
+            db.execute(insert(MessageVerdict), verdicts)
+            db.commit()
+            return True
+        except Exception as e:
+            record_error(e)
+            db.rollback()
+            print(f"Error saving message verdicts: {e}")
             return False
         finally:
             db.close()
+    
+    @staticmethod
+    @timed('database')
+    def save_journaled_messages(entries: List[Dict]) -> Optional[Tuple[Dict[str, Tuple[int, int]],
+                                                                        Dict[str, Tuple[int, int]]]]:
+        """
+        Insert messages from the write-behind journal in one transaction,
+        in the given order. Each dict has entry_id, journaled_at (ms), id,
+        username, message and timestamp. Entries saved before (a batch
+        replayed after a crash) are not saved again. The messages get their
+        revisions now, when they are committed, not when they were sent.
+        Returns two dicts of (key, revision) by entry ID - the messages
+        saved now, and the replayed ones saved before (still present) - or
+        None if the batch could not be saved.
+        """
+        if not entries:
+            return {}, {}
+        db = get_db_session()
+        try:
+            saved_before = db.execute(
+                select(JournalEntry.entry_id, ChatMessage.key, ChatMessage.revision)
+                .outerjoin(ChatMessage, ChatMessage.key == JournalEntry.message_key)
+                .where(JournalEntry.entry_id.in_([e['entry_id'] for e in entries]))
+            ).all()
+            saved = {entry_id for entry_id, _, _ in saved_before}
+            replayed = {entry_id: (key, revision) for entry_id, key, revision in saved_before if key is not None}
+            new_entries = [e for e in entries if e['entry_id'] not in saved]
+            if not new_entries:
+                return {}, replayed
+            
+            last_revision = db.execute(take_revisions(len(new_entries))).scalar_one()
+            revisions = range(last_revision - len(new_entries) + 1, last_revision + 1)
+            message_keys = db.scalars(
+                insert(ChatMessage).returning(ChatMessage.key, sort_by_parameter_order=True),
+                [{'id': e['id'], 'revision': revision, 'username': e['username'], 'message': e['message'],
+                  'timestamp': e['timestamp']} for e, revision in zip(new_entries, revisions)]
+            ).all()
+            db.execute(insert(JournalEntry), [
+                {'entry_id': e['entry_id'], 'message_key': key, 'journaled_at': e['journaled_at']}
+                for e, key in zip(new_entries, message_keys)
+            ])
+            db.commit()
+            return {e['entry_id']: (key, revision)
+                    for e, key, revision in zip(new_entries, message_keys, revisions)}, replayed
+        except Exception as e:
+            record_error(e)
+            db.rollback()
+            print(f"Error saving journaled messages: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def prune_journal_entries(before_ms: int) -> int:
+        """Forget journal entries older than before_ms (they can't be replayed any more)."""
+        db = get_db_session()
+        try:
+            result = db.execute(delete(JournalEntry).where(JournalEntry.journaled_at < before_ms))
+            db.commit()
+            return result.rowcount
+        except Exception as e:
+            record_error(e)
+            db.rollback()
+            print(f"Error pruning journal entries: {e}")
+            return 0
+        finally:
+            db.close()
+    
+    # Reactions and Read Receipts
+    @staticmethod
+    @timed('database')
+    def get_reaction_counts(message_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """Get saved reaction counts ({emoji: count}) by message ID; messages without any are left out."""
+        if not message_ids:
+            return {}
+        db = get_db_session()
+        try:
+            counts = {}
+            for message_id, emoji, count in db.execute(
+                select(MessageReaction.message_id, MessageReaction.emoji, MessageReaction.count)
+                .where(MessageReaction.message_id.in_(message_ids))
+            ):
+                counts.setdefault(message_id, {})[emoji] = count
+            return counts
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting reaction counts: {e}")
+            return {}
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def get_saved_reactions(message_id: int) -> Dict[str, Tuple[int, List[str]]]:
+        """
+        Get a message's saved reactions: {emoji: (count, usernames)}. Rows
+        saved before usernames were recorded have a count but no usernames.
+        """
+        db = get_db_session()
+        try:
+            return {
+                emoji: (count, json.loads(users) if users else [])
+                for emoji, count, users in db.execute(
+                    select(MessageReaction.emoji, MessageReaction.count, MessageReaction.users)
+                    .where(MessageReaction.message_id == message_id)
+                )
+            }
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting reactions of message {message_id}: {e}")
+            return {}
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def save_reactions(reactions: Dict[int, Dict[str, Tuple[int, List[str]]]]) -> Optional[int]:
+        """
+        Replace the saved reactions ({emoji: (count, usernames)}) of the
+        given messages in one transaction, and give each message a new
+        revision so the delta feed carries the new counts. Returns the
+        highest new revision (0 if reactions is empty), or None if they
+        could not be saved.
+        """
+        if not reactions:
+            return 0
+        db = get_db_session()
+        try:
+            db.execute(delete(MessageReaction).where(MessageReaction.message_id.in_(list(reactions))))
+            rows = [{'message_id': message_id, 'emoji': emoji, 'count': count, 'users': json.dumps(users)}
+                    for message_id, emojis in reactions.items() for emoji, (count, users) in emojis.items() if count > 0]
+            if rows:
+                db.execute(insert(MessageReaction), rows)
+            last_revision = db.execute(take_revisions(len(reactions))).scalar_one()
+            revisions = [{'message_id': message_id, 'new_revision': last_revision - len(reactions) + 1 + i}
+                         for i, message_id in enumerate(sorted(reactions))]
+            table = ChatMessage.__table__
+            db.execute(
+                update(table).where(table.c.id == bindparam('message_id'), table.c.deleted_at.is_(None))
+                .values(revision=bindparam('new_revision')),
+                revisions
+            )
+            db.commit()
+            return revisions[-1]['new_revision']
+        except Exception as e:
+            record_error(e)
+            db.rollback()
+            print(f"Error saving reactions: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def get_read_markers(username: str = None) -> Dict[str, int]:
+        """Get saved read markers (last read message ID) by username - every user's, or only username's."""
+        db = get_db_session()
+        try:
+            query = select(ReadMarker.username, ReadMarker.last_read_id)
+            if username is not None:
+                query = query.where(ReadMarker.username == username)
+            return dict(db.execute(query).all())
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting read markers: {e}")
+            return {}
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def get_read_markers_after(after_revision: int, until_revision: int = None) -> List[ReadMarker]:
+        """Get read markers changed after after_revision (and not after until_revision), in revision order."""
+        db = get_db_session()
+        try:
+            query = db.query(ReadMarker).filter(ReadMarker.revision > after_revision)
+            if until_revision is not None:
+                query = query.filter(ReadMarker.revision <= until_revision)
+            return query.order_by(ReadMarker.revision.asc()).all()
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting read markers after {after_revision}: {e}")
+            return []
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def save_read_markers(markers: Dict[str, int]) -> Optional[int]:
+        """
+        Save read markers ({username: last read message ID}) in one
+        transaction. A marker never moves back: saved markers that are
+        already further along are kept. Returns the highest new revision (0
+        if nothing moved), or None if they could not be saved.
+        """
+        if not markers:
+            return 0
+        db = get_db_session()
+        try:
+            saved = dict(db.execute(
+                select(ReadMarker.username, ReadMarker.last_read_id).where(ReadMarker.username.in_(list(markers)))
+            ).all())
+            now = datetime.utcnow()
+            changed = [{'username': username, 'last_read_id': last_read_id, 'updated_at': now}
+                       for username, last_read_id in markers.items() if last_read_id > saved.get(username, -1)]
+            if not changed:
+                db.rollback()
+                return 0
+            last_revision = db.execute(take_revisions(len(changed))).scalar_one()
+            for i, row in enumerate(changed):
+                row['revision'] = last_revision - len(changed) + 1 + i
+            new_rows = [row for row in changed if row['username'] not in saved]
+            if new_rows:
+                db.execute(insert(ReadMarker), new_rows)
+            if len(new_rows) < len(changed):
+                db.execute(update(ReadMarker), [row for row in changed if row['username'] in saved])
+            db.commit()
+            return last_revision
+        except Exception as e:
+            record_error(e)
+            db.rollback()
+            print(f"Error saving read markers: {e}")
+            return None
+        finally:
+            db.close()
+    
+    @staticmethod
+    @timed('database')
+    def count_messages_after(message_id: int) -> Optional[int]:
+        """
+        Count the messages newer than message_id (not deleted ones) - a
+        range scan of the message ID index. Used for unread counts.
+        """
+        db = get_db_session()
+        try:
+            return db.execute(
+                select(func.count()).select_from(ChatMessage)
+                .where(ChatMessage.id > message_id, ChatMessage.deleted_at.is_(None))
+            ).scalar()
+        except Exception as e:
+            record_error(e)
+            print(f"Error counting messages after {message_id}: {e}")
+            return None
+        finally:
+            db.close()
 
 # Create database service instance
 db_service = DatabaseService()
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Conditional GET support for Chat Application.
+Tags list responses with weak ETags built from cheap version markers in
+Redis, and answers matching If-None-Match requests with 304 before the
+view touches the database or serializes anything.
+"""
+import hashlib
+from functools import wraps
+from typing import Callable, Iterable
+from flask import Response, make_response, request, session
+from app.services.redis_service import redis_service
+
+
+def _not_modified(etag: str) -> Response:
+    """Empty 304 response carrying the current validator."""
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _tag(response, etag: str):
+    """Attach the validator to a successful response."""
+    response = make_response(response)
+    if response.status_code == 200:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def conditional_on(scope: str) -> Callable:
+    """
+    Decorate a GET view whose output only changes when `scope` is bumped
+    (see RedisService.bump_data_version).
+    Unauthenticated requests, and requests while Redis is down, fall
+    through to the view unchanged.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if 'username' not in session:
+                return view(*args, **kwargs)
+
+            version = redis_service.get_data_version(scope)
+            if version is None:
+                return view(*args, **kwargs)
+
+            etag = f"{scope}-{version}"
+            if request.if_none_match.contains_weak(etag):
+                return _not_modified(etag)
+
+            return _tag(view(*args, **kwargs), etag)
+        return wrapper
+    return decorator
+
+
+def content_etag(scope: str, values: Iterable[str]) -> str:
+    """Weak validator derived from a small, already-fetched result."""
+    digest = hashlib.blake2b('\n'.join(sorted(values)).encode(), digest_size=8).hexdigest()
+    return f"{scope}-{digest}"
+
+
+def conditional_response(etag: str, build: Callable[[], Response]) -> Response:
+    """
+    Return 304 if the client already has `etag`, otherwise build the
+    response and tag it. Used where the version is the data itself.
+    """
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    return _tag(build(), etag)
@@ -0,0 +1,136 @@
+"""
+Password hashing service for Chat Application.
+Runs salted hash/verify work in a bounded process pool so logins never
+compete with normal requests for the worker threads.
+
+microservices/auth-service/hashing.py is the same pool for the auth
+service. The two are separate copies because each service is built from
+its own directory as its own image. Keep the pool, admission limit and
+defaults in step; tests/test_hashing.py checks that they match.
+"""
+import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+from app.services.monitoring_service import timed
+
+# Prefixes of the werkzeug hash formats we produce or accept
+HASH_PREFIXES = ('pbkdf2:',)
+# Werkzeug hash formats Werkzeug 2.0 can't verify: never taken for
+# plaintext (or re-hashed as such), never a match
+UNVERIFIABLE_HASH_PREFIXES = ('scrypt:',)
+
+
+class HashingUnavailableError(Exception):
+    """Raised when a hash job is rejected (queue full) or times out."""
+
+
+def _hash_password(password: str, method: str, salt_length: int) -> str:
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify_password(stored_hash: str, password: str) -> bool:
+    return check_password_hash(stored_hash, password)
+
+
+def is_password_hash(value: Optional[str]) -> bool:
+    """Check whether a stored password value is a werkzeug hash (not legacy plaintext)."""
+    return bool(value) and value.count('$') == 2 and value.startswith(HASH_PREFIXES + UNVERIFIABLE_HASH_PREFIXES)
+
+
+class HashingService:
+    """Service class for password hashing."""
+
+    def __init__(self, method: str = None, salt_length: int = None, workers: int = None,
+                 queue_size: int = None, timeout: float = None):
+        """Initialize hashing settings. The worker pool is created on first use."""
+        self.method = method or Config.PASSWORD_HASH_METHOD
+        self.salt_length = salt_length or Config.PASSWORD_SALT_LENGTH
+        self.workers = Config.HASH_WORKERS if workers is None else workers
+        self.queue_size = Config.HASH_QUEUE_SIZE if queue_size is None else queue_size
+        self.timeout = timeout or Config.HASH_TIMEOUT
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._dummy_hash = None
+
+    def _get_executor(self):
+        """Create the process pool on first use in this process (fork-safe)."""
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        """
+        Run fn in the pool.
+        Rejects immediately when workers and queue are full, and gives up
+        after the configured timeout.
+        """
+        if self.workers <= 0:
+            return fn(*args)
+
+        executor = self._get_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingUnavailableError("Hashing queue is full")
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingUnavailableError(f"Hashing timed out after {self.timeout}s")
+
+    @timed('hashing')
+    def hash_password(self, password: str) -> str:
+        """Return a salted hash of the password."""
+        return self._run(_hash_password, password, self.method, self.salt_length)
+
+    @timed('hashing')
+    def verify_password(self, stored: Optional[str], password: str) -> bool:
+        """
+        Check a password against a stored value.
+        Legacy plaintext values are compared in constant time. A missing
+        user (stored=None) still pays for one hash so response time does not
+        reveal whether the username exists.
+        """
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash_password(os.urandom(16).hex())
+            self._run(_verify_password, self._dummy_hash, password)
+            return False
+
+        if not is_password_hash(stored):
+            return hmac.compare_digest(stored.encode(), password.encode())
+        if stored.startswith(UNVERIFIABLE_HASH_PREFIXES):
+            return False
+
+        return self._run(_verify_password, stored, password)
+
+    def needs_rehash(self, stored: str) -> bool:
+        """Check whether a stored value is plaintext or uses other hash parameters."""
+        return not is_password_hash(stored) or stored.split('$', 1)[0] != self.method
+
+    def close(self):
+        """Shut down the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+# Create hashing service instance
+hashing_service = HashingService()
@@ -0,0 +1,179 @@
+"""
+Message ID Service
+Time-sortable 64-bit message IDs (Snowflake layout), generated in process;
+the only coordination between processes is the node lease below:
+
+    | 41 bits: ms since ID_EPOCH_MS | 10 bits: node | 12 bits: sequence |
+
+- IDs from one process always increase: if the wall clock steps back, or
+  more than 4096 IDs are needed in one millisecond, the generator keeps
+  counting from its last timestamp instead of waiting
+- IDs from different processes sort by creation time (to within clock
+  skew), so the ID is both the public message ID and the history order
+- IDs fit a signed BIGINT; JSON responses carry them as strings, since
+  JavaScript numbers lose precision beyond 2**53
+
+Each process needs its own node number, or two workers sending in the same
+millisecond would make the same ID. start() (with the background workers,
+so in every forked worker) leases a free node from Redis, held as the lock
+id_node:{node} for ID_NODE_LEASE_TTL seconds; a thread renews it every
+third of that and replaces a lost lease with a new node. next_id() never
+waits on Redis. Without a lease (Redis unavailable, or start() not called
+in this process) the node is derived from the host name and process ID,
+which can collide.
+"""
+import calendar
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from config import Config
+from app.services.redis_service import ID_NODE_LOCK_PREFIX, redis_service
+
+logger = logging.getLogger(__name__)
+
+# Config keys this service reads
+SETTINGS = ('ID_NODE_LEASE_TTL',)
+
+# 2020-01-01 UTC; 41 bits of milliseconds last until 2089
+ID_EPOCH_MS = 1577836800000
+
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = NODE_BITS + SEQUENCE_BITS
+
+
+def default_node() -> int:
+    """Node number derived from this host and process."""
+    seed = f"{socket.gethostname()}:{os.getpid()}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(seed, digest_size=4).digest(), 'big') & MAX_NODE
+
+
+def id_for_millis(millis: int, low_bits: int = 0) -> int:
+    """ID for a point in time (ms since the epoch); low_bits fill the node and sequence."""
+    return (max(millis - ID_EPOCH_MS, 0) << TIMESTAMP_SHIFT) | (low_bits & ((1 << TIMESTAMP_SHIFT) - 1))
+
+
+def id_for_datetime(value: datetime, low_bits: int = 0) -> int:
+    """ID for a naive UTC datetime (e.g. a stored message timestamp)."""
+    millis = calendar.timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
+    return id_for_millis(millis, low_bits)
+
+
+def id_millis(message_id: int) -> int:
+    """Time an ID was generated (ms since the epoch)."""
+    return (message_id >> TIMESTAMP_SHIFT) + ID_EPOCH_MS
+
+
+class IdService:
+    """Service generating message IDs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_millis = 0
+        self._sequence = 0
+        self._node = None
+        self._pid = None
+        self._leased = False
+        self._token = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.configure({})
+
+    def configure(self, settings):
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        settings = {key: settings.get(key, getattr(Config, key)) for key in SETTINGS}
+        self.lease_ttl = settings['ID_NODE_LEASE_TTL']
+
+    def init_app(self, app):
+        """Configure from the Flask app. The lease is taken with the background workers."""
+        self.configure(app.config)
+
+    @property
+    def node(self) -> int:
+        """This process's node number (the leased one, else derived from host and process)."""
+        with self._lock:
+            return self._current_node()
+
+    def _current_node(self) -> int:
+        """Call with the lock held."""
+        if self._pid != os.getpid():
+            # Not leased in this process (e.g. inherited across a fork)
+            self._node, self._leased, self._pid = default_node(), False, os.getpid()
+        return self._node
+
+    # Node lease
+    def start(self):
+        """Lease a node for this process now and start the renewal thread."""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return self._thread
+        with self._lock:
+            if self._pid != os.getpid():
+                self._node, self._leased, self._pid = None, False, os.getpid()
+            self._token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self._stopping.clear()
+        self._renew()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='id-node-lease')
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = 5.0):
+        """Stop renewing and give the node back (worker shutdown)."""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+            if self._leased:
+                redis_service.release_lock(f"{ID_NODE_LOCK_PREFIX}{self._node}", self._token)
+            with self._lock:
+                self._leased = False
+        self._thread = None
+
+    def _run(self):
+        """Renewal loop."""
+        while not self._stopping.wait(self.lease_ttl / 3):
+            self._renew()
+
+    def _renew(self):
+        """Renew the lease, or take a new one if there is none or it was lost."""
+        if self._leased:
+            renewed = redis_service.renew_lock(f"{ID_NODE_LOCK_PREFIX}{self._node}", self._token, self.lease_ttl)
+            if renewed is not False:
+                return  # Renewed (or Redis is unreachable: keep the node until it is back)
+
+        leased = redis_service.lease_id_node(self._token, self.lease_ttl, MAX_NODE + 1)
+        if leased is None and self._node is not None and not self._leased:
+            return  # Still no lease: keep the derived node
+        node = leased if leased is not None else default_node()
+        if leased is None:
+            logger.warning(f"Could not lease a message ID node; using {node} from the host name and process ID")
+        with self._lock:
+            if self._node is not None and node != self._node:
+                # Continue in the next millisecond, so IDs keep increasing with the new node
+                self._last_millis += 1
+                self._sequence = -1
+            self._node, self._leased, self._pid = node, leased is not None, os.getpid()
+
+    def next_id(self) -> int:
+        """A new message ID, greater than any this process generated before."""
+        with self._lock:
+            node = self._current_node()
+            now = int(time.time() * 1000)
+            if now > self._last_millis:
+                self._last_millis = now
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_millis += 1
+                    self._sequence = 0
+            return id_for_millis(self._last_millis, (node << SEQUENCE_BITS) | self._sequence)
+
+
+# Singleton instance
+id_service = IdService()
@@ -0,0 +1,144 @@
+"""
+JSON serialization layer for Chat Application.
+Encodes API responses with orjson when it is installed and falls back to the
+standard library otherwise. Both backends serialize datetimes as ISO 8601,
+so routes can put model values straight into the payload.
+"""
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+from uuid import UUID
+from flask import Response, current_app
+from app.services.monitoring_service import measure
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON_MIMETYPE = 'application/json'
+
+# Number of array items encoded per chunk when streaming
+STREAM_CHUNK_SIZE = 500
+
+
+def _default(obj: Any) -> Any:
+    """Handle types the encoders don't know natively."""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONProvider:
+    """Pluggable JSON encoder used for API responses."""
+
+    def __init__(self, backend: str = 'auto'):
+        """
+        Select the encoder.
+        backend: 'auto' (orjson if installed), 'orjson' or 'stdlib'.
+        """
+        self.stream_threshold = 1000
+        self.configure(backend)
+
+    def configure(self, backend: str) -> None:
+        """Switch encoder backend."""
+        if backend == 'orjson' and orjson is None:
+            logger.warning("orjson requested but not installed - using stdlib json")
+            backend = 'stdlib'
+        if backend == 'auto':
+            backend = 'orjson' if orjson is not None else 'stdlib'
+        self.backend = backend
+
+    def init_app(self, app) -> None:
+        """Attach the provider to a Flask app and apply its configuration."""
+        self.configure(app.config.get('JSON_BACKEND', 'auto'))
+        self.stream_threshold = app.config.get('JSON_STREAM_THRESHOLD', self.stream_threshold)
+        app.extensions['json_provider'] = self
+        logger.info(f"JSON backend: {self.backend}")
+
+    def dumps(self, obj: Any) -> bytes:
+        """Serialize obj to compact JSON bytes."""
+        if self.backend == 'orjson':
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def response(self, payload: Any, status: int = 200, headers: Optional[Dict] = None) -> Response:
+        """Build a JSON response."""
+        with measure('json', 'encode'):
+            body = self.dumps(payload)
+        return Response(body, status=status, headers=headers, mimetype=JSON_MIMETYPE)
+
+    def iter_array_document(self, head: Dict, key: str, items: Iterable,
+                            count_key: Optional[str] = 'count') -> Iterable[bytes]:
+        """
+        Yield a JSON object whose `key` array is encoded chunk by chunk.
+        Produces {**head, key: [...], count_key: n} without holding the
+        whole encoded array in memory.
+        """
+        opening = self.dumps(head)
+        if head:
+            yield opening[:-1] + b',' + self.dumps(key) + b':['
+        else:
+            yield b'{' + self.dumps(key) + b':['
+
+        count = 0
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= STREAM_CHUNK_SIZE:
+                yield (b',' if count else b'') + self.dumps(chunk)[1:-1]
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            yield (b',' if count else b'') + self.dumps(chunk)[1:-1]
+            count += len(chunk)
+
+        if count_key:
+            yield b'],' + self.dumps(count_key) + b':' + str(count).encode() + b'}'
+        else:
+            yield b']}'
+
+    def array_response(self, head: Dict, key: str, items: list, status: int = 200,
+                       count_key: Optional[str] = 'count') -> Response:
+        """
+        Respond with {**head, key: items, count_key: len(items)}.
+        Large result sets are streamed in chunks instead of encoded in one go.
+        """
+        if len(items) < self.stream_threshold:
+            payload = dict(head)
+            payload[key] = items
+            if count_key:
+                payload[count_key] = len(items)
+            return self.response(payload, status)
+
+        return Response(
+            self.iter_array_document(head, key, items, count_key),
+            status=status,
+            mimetype=JSON_MIMETYPE
+        )
+
+
+def get_json_provider() -> JSONProvider:
+    """Return the provider attached to the current app (or the default one)."""
+    return current_app.extensions.get('json_provider', json_provider)
+
+
+def json_response(payload: Any, status: int = 200, headers: Optional[Dict] = None) -> Response:
+    """Shortcut used by routes instead of jsonify()."""
+    return get_json_provider().response(payload, status, headers)
+
+
+def json_array_response(head: Dict, key: str, items: list, status: int = 200) -> Response:
+    """Shortcut for list endpoints; streams large result sets."""
+    return get_json_provider().array_response(head, key, items, status)
+
+# Create JSON provider instance
+json_provider = JSONProvider()
@@ -0,0 +1,197 @@
+"""
+In-process message broker for QUEUE_BACKEND = 'memory'.
+
+Implements the part of pika's BlockingConnection / channel API that
+QueueService uses (declare, publish, consume, ack/nack incl. multiple,
+passive declare for queue depths, process_data_events,
+add_callback_threadsafe + stop_consuming), so the
+queue service and its consumer threads run unchanged in a single process
+without RabbitMQ. Meant for tests, benchmarks and local runs: messages
+live in memory and are lost when the process exits.
+"""
+import itertools
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+import pika
+
+# How long consumers wait for a message before checking for callbacks
+CONSUME_POLL_INTERVAL = 0.1
+
+
+class MemoryBroker:
+    """Named FIFO queues with delivery tags and redelivery on nack."""
+
+    def __init__(self):
+        self._queues: Dict[str, deque] = {}
+        self._unacked = {}
+        self._tags = itertools.count(1)
+        self._condition = threading.Condition()
+
+    def connection(self) -> 'MemoryConnection':
+        return MemoryConnection(self)
+
+    def declare(self, queue: str, passive: bool = False) -> int:
+        """Create a queue if needed and return its ready message count."""
+        with self._condition:
+            if queue not in self._queues:
+                if passive:
+                    raise ValueError(f"NOT_FOUND - no queue '{queue}'")
+                self._queues[queue] = deque()
+            return len(self._queues[queue])
+
+    def publish(self, queue: str, body, headers: Dict = None, properties=None) -> None:
+        """Append a message to a queue and wake its consumers."""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if properties is None:
+            properties = pika.BasicProperties(delivery_mode=2, headers=headers)
+        with self._condition:
+            self._queues.setdefault(queue, deque()).append((body, properties, False))
+            self._condition.notify_all()
+
+    def get(self, queue: str, timeout: float, owner=None):
+        """Take the next message (tag, body, properties, redelivered) or None after timeout."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while not self._queues.get(queue):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            body, properties, redelivered = self._queues[queue].popleft()
+            tag = next(self._tags)
+            self._unacked[tag] = (owner, queue, body, properties)
+            return tag, body, properties, redelivered
+
+    def _settle(self, tag: int, multiple: bool, owner):
+        """Remove and return the unacked messages a (multiple) ack/nack covers."""
+        if not multiple:
+            message = self._unacked.pop(tag, None)
+            return [message] if message is not None else []
+        tags = sorted(t for t, message in self._unacked.items()
+                      if message[0] is owner and (tag == 0 or t <= tag))
+        return [self._unacked.pop(t) for t in tags]
+
+    def ack(self, tag: int, multiple: bool = False, owner=None) -> None:
+        with self._condition:
+            self._settle(tag, multiple, owner)
+
+    def nack(self, tag: int, multiple: bool = False, requeue: bool = True, owner=None) -> None:
+        with self._condition:
+            messages = self._settle(tag, multiple, owner)
+            if requeue and messages:
+                for _, queue, body, properties in reversed(messages):
+                    self._queues[queue].appendleft((body, properties, True))
+                self._condition.notify_all()
+
+    def purge(self, queue: Optional[str] = None) -> None:
+        """Drop ready messages from one queue, or from all of them."""
+        with self._condition:
+            for name, messages in self._queues.items():
+                if queue is None or name == queue:
+                    messages.clear()
+
+
+class MemoryConnection:
+    """Stand-in for pika.BlockingConnection."""
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self.is_closed = False
+        self._callbacks = deque()
+        self._channels = []
+
+    def channel(self) -> 'MemoryChannel':
+        channel = MemoryChannel(self)
+        self._channels.append(channel)
+        return channel
+
+    def add_callback_threadsafe(self, callback: Callable) -> None:
+        """Run callback in the thread that is consuming on this connection."""
+        self._callbacks.append(callback)
+
+    def process_callbacks(self) -> None:
+        while self._callbacks:
+            self._callbacks.popleft()()
+
+    def process_data_events(self, time_limit: float = 0) -> None:
+        """
+        Run pending callbacks and deliver messages to consumers. Like pika,
+        returns once something was delivered or time_limit has passed.
+        """
+        deadline = time.monotonic() + time_limit
+        while not self.is_closed:
+            self.process_callbacks()
+            consumers = [(channel, queue, callback) for channel in self._channels
+                         for queue, callback in list(channel._consumers.items())]
+            wait = min(max(deadline - time.monotonic(), 0), CONSUME_POLL_INTERVAL)
+            if not consumers:
+                time.sleep(wait)
+            delivered = False
+            for channel, queue, callback in consumers:
+                message = self.broker.get(queue, 0 if delivered else wait / len(consumers), owner=channel)
+                if message is None:
+                    continue
+                tag, body, properties, redelivered = message
+                delivered = True
+                method = SimpleNamespace(delivery_tag=tag, routing_key=queue, redelivered=redelivered)
+                callback(channel, method, properties, body)
+            if delivered or time.monotonic() >= deadline:
+                return
+
+    def close(self) -> None:
+        self.is_closed = True
+
+
+class MemoryChannel:
+    """Stand-in for a pika BlockingChannel (default exchange only)."""
+
+    def __init__(self, connection: MemoryConnection):
+        self.connection = connection
+        self.broker = connection.broker
+        self._consumers = {}
+        self._consuming = False
+
+    @property
+    def consumer_tags(self):
+        return list(self._consumers)
+
+    def queue_declare(self, queue: str, durable: bool = False, passive: bool = False):
+        count = self.broker.declare(queue, passive=passive)
+        return SimpleNamespace(method=SimpleNamespace(queue=queue, message_count=count))
+
+    def basic_qos(self, prefetch_count: int = 0) -> None:
+        pass  # Consumers take one message at a time
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties=None) -> None:
+        if exchange:
+            raise ValueError("The memory broker only supports the default exchange")
+        self.broker.publish(routing_key, body, properties=properties)
+
+    def basic_consume(self, queue: str, on_message_callback: Callable) -> None:
+        self.broker.declare(queue)
+        self._consumers[queue] = on_message_callback
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False) -> None:
+        self.broker.ack(delivery_tag, multiple, owner=self)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True) -> None:
+        self.broker.nack(delivery_tag, multiple, requeue, owner=self)
+
+    def start_consuming(self) -> None:
+        """Deliver messages to the registered callbacks until stop_consuming."""
+        self._consuming = True
+        while self._consuming and not self.connection.is_closed:
+            self.connection.process_data_events(CONSUME_POLL_INTERVAL)
+
+    def stop_consuming(self) -> None:
+        """Cancel this channel's consumers (ends start_consuming)."""
+        self._consuming = False
+        self._consumers.clear()
+
+
+# Create memory broker instance
+memory_broker = MemoryBroker()
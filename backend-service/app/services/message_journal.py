@@ -0,0 +1,255 @@
+"""
+Write-Behind Message Journal
+With WRITE_BEHIND_ENABLED, send_message appends each message to a Redis
+Stream (one round trip) and answers at once; the database commit happens
+later, off the request path, so send latency no longer follows database
+latency and a database hiccup no longer loses the message.
+
+- Every worker process runs a persister thread in the JOURNAL_GROUP
+  consumer group. It reads entries, saves them with one batched INSERT per
+  read and then acknowledges and deletes them (XACK + XDEL), so the stream
+  only ever holds unsaved messages. Bursts are absorbed by the stream and
+  saved in bigger batches.
+- Saving and acknowledging are separate steps: a persister that dies in
+  between leaves its entries pending. They are taken over by another
+  persister after JOURNAL_CLAIM_IDLE seconds (or re-read by the same one
+  after a failed save), and the message_journal table, written in the same
+  transaction as the messages, makes sure a replayed entry is not saved
+  twice. It is announced again, though, since the failure may have come
+  before the announcement.
+- Saved messages are announced like directly written ones (message
+  counts, ETag version, long-poll notification, processing queue). Their
+  delta feed revision is taken when they are committed, not when they were
+  sent, so a poll cursor can't move past a message still in the journal.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from config import Config
+from app.services.database import db_service
+from app.services.id_service import id_service
+from app.services.monitoring_service import (
+    journal_backlog_messages, journal_batch_size, journal_messages_total,
+    journal_oldest_message_age_seconds, journal_save_duration_seconds
+)
+from app.services.queue_service import queue_service
+from app.services.redis_service import RECONNECT_INTERVAL, redis_service
+
+logger = logging.getLogger(__name__)
+
+# Config keys this service reads
+SETTINGS = ('WRITE_BEHIND_ENABLED', 'JOURNAL_STREAM', 'JOURNAL_GROUP', 'JOURNAL_BATCH_SIZE',
+            'JOURNAL_BLOCK_MS', 'JOURNAL_CLAIM_IDLE', 'JOURNAL_MAX_LENGTH')
+
+# Seconds to wait before retrying a batch that could not be saved
+RETRY_INTERVAL = 2.0
+
+# How often the backlog gauges are refreshed and old journal rows pruned (seconds)
+MAINTENANCE_INTERVAL = 15
+
+# Journal rows are kept this much longer than needed (seconds), a margin for
+# clock differences between the app hosts and Redis
+PRUNE_MARGIN = 3600
+
+# Backends that don't block on reads (fakeredis) are polled this often (seconds)
+IDLE_POLL_INTERVAL = 0.1
+
+
+def journal_fields(message_id: int, username: str, message: str, user_id: Optional[str]) -> Dict[str, str]:
+    """Stream entry fields for a chat message."""
+    return {'id': message_id, 'username': username, 'message': message, 'user_id': user_id or ''}
+
+
+def entry_millis(entry_id: str) -> int:
+    """Time an entry was added (ms since the epoch), from its ID."""
+    return int(entry_id.split('-', 1)[0])
+
+
+class MessageJournal:
+    """Service for write-behind persistence of chat messages."""
+
+    def __init__(self):
+        self.configure({})
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+
+    def configure(self, settings):
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        settings = {key: settings.get(key, getattr(Config, key)) for key in SETTINGS}
+        self.enabled = settings['WRITE_BEHIND_ENABLED']
+        self.stream = settings['JOURNAL_STREAM']
+        self.group = settings['JOURNAL_GROUP']
+        self.batch_size = settings['JOURNAL_BATCH_SIZE']
+        self.block_ms = settings['JOURNAL_BLOCK_MS']
+        self.claim_idle_ms = settings['JOURNAL_CLAIM_IDLE'] * 1000
+        self.max_length = settings['JOURNAL_MAX_LENGTH']
+
+    def init_app(self, app):
+        """Configure from the Flask app. The persister starts with the background workers."""
+        self.configure(app.config)
+
+    # Sending
+    def append(self, message_id: int, username: str, message: str,
+               user_id: Optional[str] = None) -> Optional[str]:
+        """
+        Journal a message for saving. Returns the entry ID, or None if the
+        journal is off, unavailable or full - then save the message directly.
+        """
+        if not self.enabled:
+            return None
+        entry_id = redis_service.append_to_journal(
+            self.stream, journal_fields(message_id, username, message, user_id), self.max_length
+        )
+        self.count_append(entry_id)
+        return entry_id
+
+    @staticmethod
+    def count_append(entry_id: Optional[str]):
+        """Record the outcome of an append (also used by the async app)."""
+        journal_messages_total.labels(outcome='appended' if entry_id else 'full').inc()
+
+    # Persisting
+    def start(self):
+        """Start the persister thread in this process (if write-behind is on)."""
+        if not self.enabled:
+            return None
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return self._thread
+        self._stopping.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='journal-persister')
+        self._thread.start()
+        logger.info("Journal persister started")
+        return self._thread
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the persister after its current batch."""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        """Persister loop: own unacknowledged entries, then abandoned ones, then new ones."""
+        consumer = f"{socket.gethostname()}-{os.getpid()}"
+        group_ready = False
+        pending = True
+        next_claim = next_maintenance = 0.0
+        while not self._stopping.is_set():
+            if not group_ready:
+                group_ready = redis_service.create_journal_group(self.stream, self.group)
+                if not group_ready:
+                    self._stopping.wait(RECONNECT_INTERVAL)
+                    continue
+
+            entries = []
+            if pending:
+                entries = redis_service.read_journal(self.stream, self.group, consumer,
+                                                     self.batch_size, pending=True)
+                pending = entries is None or len(entries) > 0
+            if not entries and time.monotonic() >= next_claim:
+                entries = redis_service.claim_journal_entries(self.stream, self.group, consumer,
+                                                              self.claim_idle_ms, self.batch_size)
+                next_claim = time.monotonic() + self.claim_idle_ms / 2000
+            if not entries:
+                started = time.monotonic()
+                entries = redis_service.read_journal(self.stream, self.group, consumer,
+                                                     self.batch_size, block_ms=self.block_ms)
+                if entries == [] and time.monotonic() - started < self.block_ms / 1000:
+                    self._stopping.wait(IDLE_POLL_INTERVAL)
+
+            if entries is None:
+                # Redis went away, or the stream and group with it (e.g. FLUSHALL)
+                group_ready = False
+                pending = True
+                self._stopping.wait(RETRY_INTERVAL)
+            elif entries and not self.persist(entries):
+                pending = True
+                self._stopping.wait(RETRY_INTERVAL)
+
+            if time.monotonic() >= next_maintenance:
+                self._maintenance()
+                next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+
+    def persist(self, entries: List[Tuple[str, Optional[Dict]]]) -> bool:
+        """
+        Save a batch of stream entries, then acknowledge them. Returns False
+        if anything failed; the entries stay pending and are retried.
+        """
+        rows = []
+        for entry_id, fields in entries:
+            if not fields:
+                continue  # Deleted from the stream while pending - nothing to save
+            millis = entry_millis(entry_id)
+            rows.append({
+                'entry_id': entry_id,
+                'journaled_at': millis,
+                'id': int(fields['id']) if fields.get('id') else id_service.next_id(),
+                'username': fields.get('username'),
+                'message': fields.get('message'),
+                'user_id': fields.get('user_id') or None,
+                'timestamp': datetime.utcfromtimestamp(millis / 1000)
+            })
+
+        start = time.perf_counter()
+        result = db_service.save_journaled_messages(rows)
+        if result is None:
+            return False
+        saved, replayed = result
+        if rows:
+            journal_save_duration_seconds.observe(time.perf_counter() - start)
+            journal_batch_size.observe(len(rows))
+        if not redis_service.ack_journal_entries(self.stream, self.group, [entry_id for entry_id, _ in entries]):
+            return False  # Saved; a replay will skip them
+
+        journal_messages_total.labels(outcome='saved').inc(len(saved))
+        if len(rows) > len(saved):
+            journal_messages_total.labels(outcome='replayed').inc(len(rows) - len(saved))
+        # Replayed entries were saved but maybe never announced (the ack or
+        # the process failed in between), so announce them again
+        announced = dict(replayed, **saved)
+        self._announce([dict(row, key=announced[row['entry_id']][0], revision=announced[row['entry_id']][1])
+                        for row in rows if row['entry_id'] in announced])
+        return True
+
+    @staticmethod
+    def _announce(messages: List[Dict]):
+        """Do for newly saved messages what send_message does after a direct write."""
+        if not messages:
+            return
+        if redis_service.is_available():
+            redis_service.increment_message_counts(Counter(message['username'] for message in messages))
+            redis_service.bump_data_version('messages', max_key=max(message['key'] for message in messages))
+            redis_service.publish_new_message(max(message['revision'] for message in messages))
+
+        if queue_service.is_available():
+            for message in messages:
+                queue_service.queue_message_processing({
+                    'id': message['key'],
+                    'username': message['username'],
+                    'message': message['message'],
+                    'user_id': message['user_id']
+                })
+
+    def _maintenance(self):
+        """Refresh the backlog gauges and drop journal rows no entry can replay any more."""
+        now_ms = int(time.time() * 1000)
+        backlog = redis_service.get_journal_backlog(self.stream)
+        if backlog is None:
+            return
+        length, oldest = backlog
+        journal_backlog_messages.set(length)
+        journal_oldest_message_age_seconds.set(max(now_ms - entry_millis(oldest), 0) / 1000 if oldest else 0)
+        # Entries older than the oldest one left in the stream were all acknowledged
+        floor_ms = min(entry_millis(oldest), now_ms) if oldest else now_ms
+        db_service.prune_journal_entries(floor_ms - PRUNE_MARGIN * 1000)
+
+
+# Singleton instance
+message_journal = MessageJournal()
@@ -0,0 +1,125 @@
+"""
+Message Processing Pipeline
+Consumes the message_processing queue in micro-batches and runs each
+batch through the configured stages (PIPELINE_STAGES):
+
+- blocklist   whole-word blocklist matching with an Aho-Corasick automaton
+- spam        hashed-trigram spam score, vectorized over the batch (NumPy)
+- duplicates  repeated content and per-user message rate (Redis)
+
+Verdicts (ok / flagged / blocked) are written back in one transaction per
+batch. Per-stage throughput is exported as Prometheus metrics and kept in
+process for /admin/pipeline.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List
+from config import Config
+from app.services.database import db_service
+from app.services.monitoring_service import (
+    pipeline_batch_size, pipeline_messages_total, pipeline_stage_duration_seconds,
+    pipeline_stage_messages_total
+)
+from app.services.queue_service import queue_service
+
+logger = logging.getLogger(__name__)
+
+# Config keys this service reads
+SETTINGS = ('PIPELINE_STAGES', 'PIPELINE_BATCH_SIZE', 'PIPELINE_MAX_WAIT', 'BLOCKLIST_TERMS',
+            'BLOCKLIST_FILE', 'SPAM_THRESHOLD', 'SPAM_MODEL_FILE', 'DUPLICATE_WINDOW',
+            'MESSAGE_RATE_LIMIT', 'MESSAGE_RATE_WINDOW')
+
+# Throughput is logged at most this often (seconds)
+LOG_INTERVAL = 60
+
+
+class MessagePipeline:
+    """Service for batch processing of queued chat messages."""
+
+    def __init__(self):
+        self.settings = {key: getattr(Config, key) for key in SETTINGS}
+        self.stages = None  # Built by start(); imports NumPy
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._next_log = 0.0
+
+    def init_app(self, app):
+        """Configure from the Flask app. Stages are built when the consumer starts."""
+        self.settings = {key: app.config.get(key, getattr(Config, key)) for key in SETTINGS}
+        self.stages = None
+
+    def build_stages(self) -> List:
+        from app.services.pipeline_stages import STAGES
+        names = [name.strip() for name in self.settings['PIPELINE_STAGES'] if name.strip()]
+        unknown = [name for name in names if name not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages {unknown}; choose from {sorted(STAGES)}")
+        return [STAGES[name](self.settings) for name in names]
+
+    def start(self):
+        """Start consuming the message_processing queue in this process."""
+        if self.stages is None:
+            self.stages = self.build_stages()
+        return queue_service.start_message_processor(
+            self.process_batch,
+            batch_size=self.settings['PIPELINE_BATCH_SIZE'],
+            max_wait=self.settings['PIPELINE_MAX_WAIT']
+        )
+
+    def process_batch(self, payloads: List[Dict]) -> None:
+        """
+        Run a batch of queued messages through every stage and save the
+        verdicts. Raises if they could not be saved, so the batch is requeued.
+        """
+        from app.services.pipeline_stages import PipelineMessage
+        if self.stages is None:
+            self.stages = self.build_stages()
+
+        batch = [PipelineMessage(p.get('message_id'), p.get('username'), p.get('message')) for p in payloads]
+        pipeline_batch_size.observe(len(batch))
+        for stage in self.stages:
+            start = time.perf_counter()
+            stage.process(batch)
+            self._record(stage.name, len(batch), time.perf_counter() - start)
+
+        verdicts = [{
+            'message_key': message.key,
+            'verdict': message.verdict,
+            'spam_score': message.spam_score,
+            'flags': ','.join(message.flags) or None
+        } for message in batch if message.key is not None]
+        if not db_service.save_message_verdicts(verdicts):
+            raise RuntimeError("Could not save message verdicts")
+        for message in batch:
+            pipeline_messages_total.labels(verdict=message.verdict).inc()
+        self._maybe_log()
+
+    def _record(self, stage: str, messages: int, seconds: float):
+        pipeline_stage_duration_seconds.labels(stage=stage).observe(seconds)
+        pipeline_stage_messages_total.labels(stage=stage).inc(messages)
+        with self._lock:
+            stats = self._stats.setdefault(stage, {'batches': 0, 'messages': 0, 'seconds': 0.0})
+            stats['batches'] += 1
+            stats['messages'] += messages
+            stats['seconds'] += seconds
+
+    def stats(self) -> Dict[str, Dict]:
+        """Batches, messages, busy seconds and messages/second per stage (this process)."""
+        with self._lock:
+            return {stage: dict(values, messages_per_second=round(values['messages'] / values['seconds'], 1)
+                                if values['seconds'] else None)
+                    for stage, values in self._stats.items()}
+
+    def _maybe_log(self):
+        now = time.monotonic()
+        if now < self._next_log:
+            return
+        self._next_log = now + LOG_INTERVAL
+        for stage, values in self.stats().items():
+            logger.info(f"Pipeline stage {stage}: {values['messages']} messages, "
+                        f"{values['messages_per_second']} msg/s")
+
+
+# Singleton instance
+message_pipeline = MessagePipeline()
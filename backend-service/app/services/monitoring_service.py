@@ -6,14 +6,38 @@ Metrics exposed:
 - http_requests_total: Total HTTP requests (counter)
 - http_request_duration_seconds: Request latency (histogram)
 - http_requests_in_progress: Requests currently being processed (gauge)
+- service_operation_duration_seconds: Service-layer call latency by service/operation (histogram)
+- service_operation_errors_total: Failed service-layer calls by service/operation/error (counter)
+- db_pool_connections: SQLAlchemy pool connections by state (gauge)
+- rabbitmq_queue_messages: Messages waiting per queue (gauge)
+
+Service methods are instrumented with @timed(service) or, for a block of
+code, `with measure(service, operation):`. Methods that catch their own
+exceptions call record_error(e) so the failure is still counted. When
+tracing is enabled, each measured call is also recorded as a span.
+
+Only paths under METRICS_PATH_PREFIXES are recorded, so scrapes and probes
+don't skew the request histograms. Under Gunicorn, PROMETHEUS_MULTIPROC_DIR
+is set (see gunicorn.conf.py) and /metrics aggregates every worker.
 """
+import asyncio
+import os
 import time
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, Gauge, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
 from flask import request, g
+from app.services.tracing_service import tracing_service
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Metrics are written to shared files when running under several workers
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
 # Define metrics
 http_requests_total = Counter(
     'http_requests_total',
@@ -30,9 +54,268 @@ http_request_duration_seconds = Histogram(
 http_requests_in_progress = Gauge(
     'http_requests_in_progress',
     'HTTP requests currently being processed',
-    ['method', 'endpoint']
+    ['method'],
+    multiprocess_mode='livesum'
+)
+
+# Service-layer metrics. Buckets span sub-millisecond Redis calls up to
+# slow PostgreSQL queries and RabbitMQ connects.
+service_operation_duration_seconds = Histogram(
+    'service_operation_duration_seconds',
+    'Latency of service-layer operations in seconds',
+    ['service', 'operation'],
+    buckets=(0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+             0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+service_operation_errors_total = Counter(
+    'service_operation_errors_total',
+    'Service-layer operations that raised an error',
+    ['service', 'operation', 'error']
+)
+
+db_pool_connections = Gauge(
+    'db_pool_connections',
+    'Database connection pool usage',
+    ['state'],
+    multiprocess_mode='livesum'
+)
+
+rabbitmq_queue_messages = Gauge(
+    'rabbitmq_queue_messages',
+    'Messages waiting in a RabbitMQ queue',
+    ['queue'],
+    multiprocess_mode='livemax'
+)
+
+# Rate limiting. Limits are exported so dashboards can show usage against them.
+rate_limit_rejections_total = Counter(
+    'rate_limit_rejections_total',
+    'Requests rejected by a rate limit or duplicate check',
+    ['endpoint', 'scope']
+)
+
+rate_limit_max_requests = Gauge(
+    'rate_limit_max_requests',
+    'Configured requests allowed per window',
+    ['endpoint', 'scope'],
+    multiprocess_mode='livemax'
+)
+
+rate_limit_window_seconds = Gauge(
+    'rate_limit_window_seconds',
+    'Configured rate-limit window in seconds (duplicate: suppression period)',
+    ['endpoint', 'scope'],
+    multiprocess_mode='livemax'
+)
+
+# Message-processing pipeline. Per-stage throughput is
+# rate(pipeline_stage_messages_total) / rate(pipeline_stage_duration_seconds_sum).
+pipeline_stage_duration_seconds = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Time a pipeline stage spends on one batch in seconds',
+    ['stage'],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+             0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+pipeline_stage_messages_total = Counter(
+    'pipeline_stage_messages_total',
+    'Messages run through a pipeline stage',
+    ['stage']
+)
+
+pipeline_messages_total = Counter(
+    'pipeline_messages_total',
+    'Messages processed by the pipeline, by verdict',
+    ['verdict']
+)
+
+pipeline_batch_size = Histogram(
+    'pipeline_batch_size',
+    'Messages per pipeline batch',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+# Write-behind journal. outcome: appended, full (written directly instead),
+# saved, replayed (already saved before a crash)
+journal_messages_total = Counter(
+    'journal_messages_total',
+    'Messages through the write-behind journal, by outcome',
+    ['outcome']
+)
+
+journal_save_duration_seconds = Histogram(
+    'journal_save_duration_seconds',
+    'Time to save one batch of journaled messages in seconds',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+journal_batch_size = Histogram(
+    'journal_batch_size',
+    'Messages per journal save',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+
+journal_backlog_messages = Gauge(
+    'journal_backlog_messages',
+    'Journaled messages not yet saved to the database',
+    multiprocess_mode='livemax'
+)
+
+journal_oldest_message_age_seconds = Gauge(
+    'journal_oldest_message_age_seconds',
+    'Age of the oldest journaled message not yet saved in seconds',
+    multiprocess_mode='livemax'
+)
+
+# Tombstone compaction (deleted messages removed for good)
+compacted_messages_total = Counter(
+    'compacted_messages_total',
+    'Deleted messages removed from the database by compaction'
+)
+
+compaction_duration_seconds = Histogram(
+    'compaction_duration_seconds',
+    'Time for one compaction run in seconds',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+# Reactions and read receipts saved from Redis. kind: read_marker, reaction
+receipts_saved_total = Counter(
+    'receipts_saved_total',
+    'Read markers and message reaction counts saved to the database, by kind',
+    ['kind']
 )
 
+# Distinct error label values before new ones are reported as 'other'
+MAX_ERROR_TYPES = 25
+
+# Queue depths are fetched from RabbitMQ at most this often (seconds)
+QUEUE_DEPTH_REFRESH_INTERVAL = 15
+
+# In multiprocess mode each worker publishes its pool usage this often (seconds)
+POOL_GAUGE_REFRESH_INTERVAL = 5
+
+# (service, operation) of the innermost instrumented call
+_current_operation = ContextVar('service_operation', default=None)
+_error_types = set()
+
+
+def _error_label(exc: BaseException) -> str:
+    """Exception class name, capped so the label set stays bounded."""
+    name = type(exc).__name__
+    if name not in _error_types:
+        if len(_error_types) >= MAX_ERROR_TYPES:
+            return 'other'
+        _error_types.add(name)
+    return name
+
+
+def record_error(exc: BaseException):
+    """
+    Count a failure of the operation currently being measured.
+    Call from except blocks that handle the error instead of raising it.
+    """
+    current = _current_operation.get()
+    if current is not None:
+        service_operation_errors_total.labels(*current, _error_label(exc)).inc()
+        span = tracing_service.current_span() if tracing_service.enabled else None
+        if span is not None and span.error is None:
+            span.error = f"{type(exc).__name__}: {exc}"
+
+
+@contextmanager
+def measure(service: str, operation: str):
+    """Time a block of code as one service operation."""
+    span = tracing_service.start_span(f"{service}.{operation}") if tracing_service.enabled else None
+    token = _current_operation.set((service, operation))
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(e)
+        raise
+    finally:
+        service_operation_duration_seconds.labels(service, operation).observe(time.perf_counter() - start)
+        _current_operation.reset(token)
+        if span is not None:
+            tracing_service.end_span(span)
+
+
+def timed(service: str, operation: str = None):
+    """
+    Decorator timing every call of a service method (sync or async).
+    The operation label defaults to the function name.
+    """
+    def decorator(func):
+        name = operation or func.__name__
+        histogram = service_operation_duration_seconds.labels(service, name)
+        span_name = f"{service}.{name}"
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                span = tracing_service.start_span(span_name) if tracing_service.enabled else None
+                token = _current_operation.set((service, name))
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    record_error(e)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+                    _current_operation.reset(token)
+                    if span is not None:
+                        tracing_service.end_span(span)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            span = tracing_service.start_span(span_name) if tracing_service.enabled else None
+            token = _current_operation.set((service, name))
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                record_error(e)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+                _current_operation.reset(token)
+                if span is not None:
+                    tracing_service.end_span(span)
+        return wrapper
+    return decorator
+
+
+# Gauge state -> SQLAlchemy pool method
+POOL_STATS = {
+    'size': 'size',
+    'checked_out': 'checkedout',
+    'idle': 'checkedin',
+    'overflow': 'overflow',
+}
+
+
+def _pool_stat(method: str):
+    """Read a pool statistic of the current engine (0 if not applicable)."""
+    def read():
+        from app.models import engine
+        stat = getattr(engine.pool, method, None) if engine is not None else None
+        return max(stat(), 0) if callable(stat) else 0  # overflow() starts negative
+    return read
+
+
+# Single process: read at scrape time. Multiprocess: callbacks can't cross
+# processes, so workers publish their values (see refresh_pool_gauges).
+_pool_readers = {state: _pool_stat(method) for state, method in POOL_STATS.items()}
+if not MULTIPROCESS:
+    for _state, _read in _pool_readers.items():
+        db_pool_connections.labels(state=_state).set_function(_read)
+
+
 # Custom business metrics (optional - add your own!)
 # Example: chat_messages_sent_total = Counter('chat_messages_sent_total', 'Total chat messages sent')
 
@@ -40,20 +323,58 @@ http_requests_in_progress = Gauge(
 class MonitoringService:
     """Service for tracking application metrics."""
     
+    # Request paths that are measured (see register_middleware)
+    path_prefixes = ('/api/',)
+    
+    # Pre-bound metric children, keyed by (method, endpoint[, status])
+    _request_children = {}
+    _status_children = {}
+    _in_progress_children = {}
+    _pool_refreshed = 0.0
+    
+    @staticmethod
+    def _children(method, endpoint):
+        """Return the cached (duration histogram, in-progress gauge) children."""
+        key = (method, endpoint)
+        children = MonitoringService._request_children.get(key)
+        if children is None:
+            in_progress = MonitoringService._in_progress_children.get(method)
+            if in_progress is None:
+                in_progress = http_requests_in_progress.labels(method=method)
+                MonitoringService._in_progress_children[method] = in_progress
+            children = (http_request_duration_seconds.labels(method=method, endpoint=endpoint), in_progress)
+            MonitoringService._request_children[key] = children
+        return children
+    
+    @staticmethod
+    def _counter(method, endpoint, status):
+        """Return the cached request counter child."""
+        key = (method, endpoint, status)
+        child = MonitoringService._status_children.get(key)
+        if child is None:
+            child = http_requests_total.labels(method=method, endpoint=endpoint, status=status)
+            MonitoringService._status_children[key] = child
+        return child
+    
     @staticmethod
     def before_request():
         """
         Called before each request.
         Records start time and increments in-progress counter.
         """
-        g.start_time = time.time()
+        req = request._get_current_object()  # one context lookup instead of three
+        if not req.path.startswith(MonitoringService.path_prefixes):
+            return
+        
+        method, endpoint = req.method, req.endpoint or 'unknown'
+        duration, in_progress = MonitoringService._children(method, endpoint)
         
         # Track concurrent requests
-        endpoint = request.endpoint or 'unknown'
-        http_requests_in_progress.labels(
-            method=request.method,
-            endpoint=endpoint
-        ).inc()
+        in_progress.inc()
+        g.metrics_state = (method, endpoint, duration, in_progress, time.perf_counter())
+        
+        if MULTIPROCESS:
+            MonitoringService.refresh_pool_gauges()
     
     @staticmethod
     def after_request(response):
@@ -61,40 +382,54 @@ class MonitoringService:
         Called after each request.
         Records metrics: duration, status code, decrements in-progress counter.
         """
-        # Calculate request duration
-        if hasattr(g, 'start_time'):
-            request_latency = time.time() - g.start_time
-        else:
-            request_latency = 0
-        
-        endpoint = request.endpoint or 'unknown'
+        state = g.pop('metrics_state', None)
+        if state is None:
+            return response
         
-        # Record metrics
-        http_requests_total.labels(
-            method=request.method,
-            endpoint=endpoint,
-            status=response.status_code
-        ).inc()
-        
-        http_request_duration_seconds.labels(
-            method=request.method,
-            endpoint=endpoint
-        ).observe(request_latency)
+        method, endpoint, duration, in_progress, start_time = state
+        duration.observe(time.perf_counter() - start_time)
+        MonitoringService._counter(method, endpoint, response.status_code).inc()
         
         # Decrement in-progress counter
-        http_requests_in_progress.labels(
-            method=request.method,
-            endpoint=endpoint
-        ).dec()
+        in_progress.dec()
         
         return response
     
+    @staticmethod
+    def refresh_pool_gauges():
+        """Publish this worker's DB pool usage (multiprocess mode, rate-limited)."""
+        now = time.monotonic()
+        if now - MonitoringService._pool_refreshed < POOL_GAUGE_REFRESH_INTERVAL:
+            return
+        MonitoringService._pool_refreshed = now
+        for state, read in _pool_readers.items():
+            db_pool_connections.labels(state=state).set(read())
+    
+    _queue_depth_checked = 0.0
+    
+    @staticmethod
+    def refresh_queue_depths():
+        """Update the queue depth gauges (rate-limited; one broker round trip)."""
+        now = time.monotonic()
+        if now - MonitoringService._queue_depth_checked < QUEUE_DEPTH_REFRESH_INTERVAL:
+            return
+        MonitoringService._queue_depth_checked = now
+        
+        from app.services.queue_service import queue_service
+        for queue, depth in queue_service.get_queue_depths().items():
+            rabbitmq_queue_messages.labels(queue=queue).set(depth)
+    
     @staticmethod
     def get_metrics():
         """
         Returns Prometheus metrics in text format.
         This is what Prometheus scrapes.
         """
+        MonitoringService.refresh_queue_depths()
+        if MULTIPROCESS:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
         return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
     
     @staticmethod
@@ -103,9 +438,12 @@ class MonitoringService:
         Register monitoring middleware with Flask app.
         Call this in your app factory.
         """
+        prefixes = app.config.get('METRICS_PATH_PREFIXES')
+        if prefixes:
+            MonitoringService.path_prefixes = tuple(prefixes)
         app.before_request(MonitoringService.before_request)
         app.after_request(MonitoringService.after_request)
-        logger.info("✅ Monitoring middleware registered")
+        logger.info(f"✅ Monitoring middleware registered ({'multiprocess' if MULTIPROCESS else 'single process'})")
 
 
 # Singleton instance
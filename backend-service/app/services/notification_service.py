@@ -0,0 +1,189 @@
+"""
+New-message notifications for long-polling clients.
+
+Every saved change (new or deleted message, reactions, read markers) is
+published on a Redis pub/sub channel as its delta feed revision, after the
+commit. Every worker process runs one subscriber thread that records the
+newest revision and wakes all of its waiting requests at once, so a change
+costs one Redis delivery per process, not one per client. Clients woken by
+the same change share a single database read (see messages_after).
+"""
+import os
+import threading
+from typing import Callable, List, Optional
+from app.services.redis_service import redis_service, MESSAGE_CHANNEL
+
+# How often the subscriber thread checks whether it should stop (seconds)
+LISTEN_INTERVAL = 1.0
+
+
+class _Batch:
+    """Result of one shared database read (messages stays None if it failed)."""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.messages = None
+        self.error = None
+
+
+class NotificationService:
+    """Per-process fan-out of "new message" events to long-poll waiters."""
+
+    def __init__(self):
+        self.latest_id = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pubsub = None
+        self._pid = None
+        self._stopping = False
+        self._batches = {}
+        self._batches_lock = threading.Lock()
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    def _listening(self) -> bool:
+        return self._thread is not None and self._pid == os.getpid()
+
+    def start(self, latest_id_loader: Callable[[], Optional[int]]) -> bool:
+        """
+        Start the subscriber thread if it isn't running in this process.
+        latest_id_loader returns the newest revision; it is called after
+        subscribing, so no message can slip in between.
+        """
+        if self._listening():
+            return True
+
+        with self._condition:
+            if self._listening():
+                return True
+            client = redis_service.redis_client
+            if client is None:
+                return False
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(MESSAGE_CHANNEL)
+            except Exception as e:
+                print(f"Error subscribing to new messages: {e}")
+                return False
+
+            latest_id = latest_id_loader()
+            if latest_id is None:
+                pubsub.close()
+                return False
+
+            self.latest_id = latest_id
+            self._pubsub = pubsub
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._listen, args=(pubsub,), daemon=True, name='message-notifications'
+            )
+            self._thread.start()
+        return True
+
+    def _listen(self, pubsub):
+        """Subscriber loop: record the newest ID and wake every waiter."""
+        try:
+            while not self._stopping:
+                message = pubsub.get_message(timeout=LISTEN_INTERVAL)
+                if message is None:
+                    continue
+                try:
+                    message_id = int(message['data'])
+                except (TypeError, ValueError):
+                    continue
+                with self._condition:
+                    if message_id > self.latest_id:
+                        self.latest_id = message_id
+                        self._condition.notify_all()
+        except Exception as e:
+            print(f"New message listener stopped: {e}")
+        finally:
+            with self._condition:
+                if self._pubsub is pubsub:
+                    self._thread = None
+                    self._pubsub = None
+                # Wake waiters so they fall back instead of sleeping it out
+                self._condition.notify_all()
+            try:
+                pubsub.close()
+            except Exception:
+                pass
+
+    def reserve_waiter(self, limit: int) -> bool:
+        """
+        Take one of `limit` long-poll slots of this process. Returns False
+        when all are taken: the caller should answer without waiting, since
+        every waiting request holds a server thread.
+        """
+        with self._waiting_lock:
+            if self._waiting >= limit:
+                return False
+            self._waiting += 1
+            return True
+
+    def release_waiter(self):
+        """Give back a slot taken with reserve_waiter."""
+        with self._waiting_lock:
+            self._waiting -= 1
+
+    def wait_for_message(self, after_id: int, timeout: float) -> Optional[int]:
+        """
+        Block until a message newer than after_id exists or timeout expires.
+        Returns the newest known ID, or None if notifications are not
+        running (the caller should fall back to checking the database).
+        """
+        with self._condition:
+            if not self._listening():
+                return None
+            self._condition.wait_for(
+                lambda: not self._listening() or self.latest_id > after_id,
+                timeout
+            )
+            return self.latest_id if self._listening() else None
+
+    def messages_after(self, after_id: int, latest_id: int,
+                       fetch: Callable[[int], List], timeout: float = 10.0) -> List:
+        """
+        Return fetch(after_id), sharing one call among every request asking
+        for the same (after_id, latest_id). After a wake-up most waiters
+        hold the same cursor, so they are all served by one query. If that
+        query fails, the owner gets its exception and every other waiter
+        runs fetch(after_id) itself.
+        """
+        batch_key = (after_id, latest_id)
+        with self._batches_lock:
+            batch = self._batches.get(batch_key)
+            owner = batch is None
+            if owner:
+                # Older batches are never asked for again once a newer ID exists
+                self._batches = {key: value for key, value in self._batches.items()
+                                 if key[1] >= latest_id}
+                batch = self._batches[batch_key] = _Batch()
+
+        if owner:
+            try:
+                batch.messages = fetch(after_id)
+            except Exception as e:
+                batch.error = e
+                with self._batches_lock:
+                    # Don't hand the failure to later requests
+                    if self._batches.get(batch_key) is batch:
+                        del self._batches[batch_key]
+                raise
+            finally:
+                batch.ready.set()
+        elif not batch.ready.wait(timeout) or batch.error is not None:
+            return fetch(after_id)
+        return batch.messages
+
+    def close(self):
+        """Stop the subscriber thread."""
+        with self._condition:
+            self._stopping = True
+            thread = self._thread if self._listening() else None
+        if thread is not None:
+            thread.join(LISTEN_INTERVAL * 2)
+
+# Create notification service instance
+notification_service = NotificationService()
@@ -0,0 +1,192 @@
+"""
+Sampled Request Profiling Service
+Profiles a sample of live requests in place and keeps the slowest ones.
+
+- 1 in PROFILING_SAMPLE_RATE requests is profiled (0 = no sampling)
+- A request carrying `X-Profile: <PROFILING_TOKEN>` is always profiled
+- The PROFILING_KEEP slowest profiles of the last PROFILING_WINDOW seconds
+  are kept in memory and served by /admin/profiles
+
+Uses pyinstrument when installed (readable call trees, HTML flamegraph
+view) and cProfile otherwise. When neither sampling nor a token is
+configured no hooks are registered, so the cost is zero.
+"""
+import cProfile
+import hmac
+import io
+import itertools
+import logging
+import pstats
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+from flask import g, request
+
+try:
+    from pyinstrument import Profiler as InstrumentProfiler
+except ImportError:  # Optional dependency - cProfile only
+    InstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+# Lines of pstats output kept per cProfile capture
+CPROFILE_LINES = 60
+
+
+class ProfilingService:
+    """Service for sampling and storing request profiles."""
+
+    def __init__(self):
+        self.sample_rate = 0
+        self.token = None
+        self.keep = 20
+        self.window = 3600
+        self.engine = 'cprofile'
+        self._counter = itertools.count(1)
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.token)
+
+    def _should_profile(self) -> bool:
+        """Sample 1 in N requests, plus any request with the right header."""
+        if self.token:
+            supplied = request.headers.get(PROFILE_HEADER)
+            if supplied and hmac.compare_digest(supplied, self.token):
+                return True
+        return self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0
+
+    def before_request(self):
+        """Start a profiler for sampled requests."""
+        if request.path.startswith('/admin/') or not self._should_profile():
+            return
+
+        try:
+            if self.engine == 'pyinstrument':
+                profiler = InstrumentProfiler(async_mode='disabled')
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except (RuntimeError, ValueError) as e:
+            # Another profiler is already active in this thread/interpreter
+            logger.debug(f"Profiling skipped: {e}")
+            return
+        g.profiler = profiler
+        g.profile_start = time.perf_counter()
+
+    def after_request(self, response):
+        """Stop the profiler and keep the profile if it is among the slowest."""
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+
+        duration = time.perf_counter() - g.pop('profile_start')
+        if self.engine == 'pyinstrument':
+            profiler.stop()
+            text, html = profiler.output_text(unicode=True), profiler.output_html()
+        else:
+            profiler.disable()
+            text, html = self._format_cprofile(profiler), None
+
+        self._store({
+            'id': uuid.uuid4().hex[:12],
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint or 'unknown',
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'captured_at': datetime.utcnow().isoformat(),
+            'engine': self.engine,
+            'text': text,
+            'html': html,
+        })
+        return response
+
+    def teardown_request(self, exc=None):
+        """Make sure a profiler never outlives its request (e.g. on errors)."""
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+        if self.engine == 'pyinstrument':
+            profiler.stop()
+        else:
+            profiler.disable()
+
+    @staticmethod
+    def _format_cprofile(profiler) -> str:
+        """Render the top of a cProfile capture, by cumulative time."""
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(CPROFILE_LINES)
+        return out.getvalue()
+
+    def _store(self, profile: Dict):
+        """Keep only the slowest `keep` profiles captured within the window."""
+        cutoff = time.time() - self.window
+        profile['_captured'] = time.time()
+        with self._lock:
+            profiles = [p for p in self._profiles if p['_captured'] >= cutoff]
+            profiles.append(profile)
+            profiles.sort(key=lambda p: p['duration_ms'], reverse=True)
+            self._profiles = profiles[:self.keep]
+
+    def list_profiles(self) -> List[Dict]:
+        """Summaries of the kept profiles, slowest first."""
+        cutoff = time.time() - self.window
+        with self._lock:
+            profiles = list(self._profiles)
+        return [
+            {key: value for key, value in p.items() if key not in ('text', 'html', '_captured')}
+            for p in profiles if p['_captured'] >= cutoff
+        ]
+
+    def get_profile(self, profile_id: str) -> Optional[Dict]:
+        """Full profile by ID."""
+        with self._lock:
+            for profile in self._profiles:
+                if profile['id'] == profile_id:
+                    return profile
+        return None
+
+    def is_authorized(self) -> bool:
+        """True if the request carries the profiling token."""
+        supplied = request.headers.get(PROFILE_HEADER)
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    def register_middleware(self, app):
+        """
+        Register profiling hooks with Flask app.
+        Call this in your app factory, next to the monitoring middleware.
+        """
+        self.sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 0)
+        self.token = app.config.get('PROFILING_TOKEN') or None
+        self.keep = app.config.get('PROFILING_KEEP', self.keep)
+        self.window = app.config.get('PROFILING_WINDOW', self.window)
+
+        engine = app.config.get('PROFILING_ENGINE', 'auto')
+        if engine == 'auto':
+            engine = 'pyinstrument' if InstrumentProfiler is not None else 'cprofile'
+        elif engine == 'pyinstrument' and InstrumentProfiler is None:
+            logger.warning("pyinstrument requested but not installed - using cProfile")
+            engine = 'cprofile'
+        self.engine = engine
+
+        if not self.enabled:
+            logger.info("Request profiling disabled")
+            return
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+        logger.info(f"✅ Request profiling registered ({self.engine}, 1 in {self.sample_rate or '-'})")
+
+
+# Singleton instance
+profiling_service = ProfilingService()
@@ -5,43 +5,102 @@ Handles background tasks and message queuing with RabbitMQ.
 import pika
 import json
 from datetime import datetime
-from typing import Dict, Callable
+from typing import Dict, Callable, List
 from config import Config
+from app.services.monitoring_service import timed, record_error
+from app.services.tracing_service import tracing_service
+from app.services.memory_broker import memory_broker
 import threading
+import time
+
+# Seconds to wait before retrying an unreachable RabbitMQ
+RECONNECT_INTERVAL = 30
+
+# Durable queues used by the application
+QUEUES = [
+    'email_notifications',
+    'push_notifications',
+    'message_processing',
+    'user_activity',
+    'system_logs'
+]
+
+# Config keys this service reads
+SETTINGS = ('RABBITMQ_HOST', 'RABBITMQ_PORT', 'RABBITMQ_USER', 'RABBITMQ_PASSWORD',
+            'RABBITMQ_CONNECT_TIMEOUT', 'QUEUE_BACKEND')
 
 class QueueService:
     """Service class for RabbitMQ operations."""
     
     def __init__(self):
-        """Initialize RabbitMQ connection."""
-        try:
-            self.connection_params = pika.ConnectionParameters(
-                host=Config.RABBITMQ_HOST,
-                port=Config.RABBITMQ_PORT,
-                credentials=pika.PlainCredentials(
-                    Config.RABBITMQ_USER,
-                    Config.RABBITMQ_PASSWORD
-                )
-            )
-            
-            # Test connection
-            connection = pika.BlockingConnection(self.connection_params)
-            connection.close()
-            print("RabbitMQ connection established successfully!")
-            self.available = True
-            
-        except Exception as e:
-            print(f"Warning: RabbitMQ not available. Queue features disabled. Error: {e}")
-            self.available = False
+        """Set up the service. RabbitMQ is not contacted until first use."""
+        self.settings = {key: getattr(Config, key) for key in SETTINGS}
+        self.available = None  # Unknown until the first check
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+        self._consumers = []
+        self._build_connection_params()
+    
+    def _build_connection_params(self):
+        self.connection_params = pika.ConnectionParameters(
+            host=self.settings['RABBITMQ_HOST'],
+            port=self.settings['RABBITMQ_PORT'],
+            credentials=pika.PlainCredentials(
+                self.settings['RABBITMQ_USER'],
+                self.settings['RABBITMQ_PASSWORD']
+            ),
+            socket_timeout=self.settings['RABBITMQ_CONNECT_TIMEOUT'],
+            connection_attempts=1
+        )
+    
+    def init_app(self, app):
+        """Configure from the Flask app. RabbitMQ is still contacted lazily."""
+        self.close()
+        self.settings = {key: app.config.get(key, getattr(Config, key)) for key in SETTINGS}
+        self._build_connection_params()
+        self.available = None
+        self._next_attempt = 0.0
+    
+    def _check_connection(self):
+        """Test the broker once, or again after RECONNECT_INTERVAL if it was down."""
+        with self._lock:
+            if self.available or time.monotonic() < self._next_attempt:
+                return
+            if self.settings['QUEUE_BACKEND'] == 'memory':
+                self.available = True
+                return
+            try:
+                # Test connection
+                connection = pika.BlockingConnection(self.connection_params)
+                connection.close()
+                print("RabbitMQ connection established successfully!")
+                self.available = True
+            except Exception as e:
+                print(f"Warning: RabbitMQ not available. Queue features disabled. Error: {e}")
+                self.available = False
+                self._next_attempt = time.monotonic() + RECONNECT_INTERVAL
     
     def is_available(self) -> bool:
-        """Check if RabbitMQ is available."""
-        return self.available
+        """Check if RabbitMQ is available (tested on first call)."""
+        if not self.available and time.monotonic() >= self._next_attempt:
+            self._check_connection()
+        return bool(self.available)
+    
+    def close(self):
+        """Stop consumer threads started by this process."""
+        for connection, channel in self._consumers:
+            try:
+                connection.add_callback_threadsafe(channel.stop_consuming)
+            except Exception:
+                pass  # Already closed
+        self._consumers = []
     
     def _get_connection(self):
         """Get a new RabbitMQ connection."""
         if not self.is_available():
             return None
+        if self.settings['QUEUE_BACKEND'] == 'memory':
+            return memory_broker.connection()
         try:
             return pika.BlockingConnection(self.connection_params)
         except Exception as e:
@@ -50,18 +109,11 @@ class QueueService:
     
     def _declare_queues(self, channel):
         """Declare all necessary queues."""
-        queues = [
-            'email_notifications',
-            'push_notifications',
-            'message_processing',
-            'user_activity',
-            'system_logs'
-        ]
-        
-        for queue in queues:
+        for queue in QUEUES:
             channel.queue_declare(queue=queue, durable=True)
     
     # Email Notifications
+    @timed('queue')
     def queue_email_notification(self, recipient_email: str, subject: str, message: str) -> bool:
         """Queue an email notification."""
         if not self.is_available():
@@ -91,6 +143,7 @@ class QueueService:
                 body=json.dumps(notification_data),
                 properties=pika.BasicProperties(
                     delivery_mode=2,  # Make message persistent
+                    headers=tracing_service.inject({})
                 )
             )
             
@@ -98,6 +151,7 @@ class QueueService:
             return True
             
         except Exception as e:
+            record_error(e)
             print(f"Error queuing email notification: {e}")
             return False
         finally:
@@ -105,6 +159,7 @@ class QueueService:
                 connection.close()
     
     # Push Notifications
+    @timed('queue')
     def queue_push_notification(self, username: str, title: str, message: str) -> bool:
         """Queue a push notification."""
         if not self.is_available():
@@ -133,6 +188,7 @@ class QueueService:
                 body=json.dumps(notification_data),
                 properties=pika.BasicProperties(
                     delivery_mode=2,
+                    headers=tracing_service.inject({})
                 )
             )
             
@@ -140,6 +196,7 @@ class QueueService:
             return True
             
         except Exception as e:
+            record_error(e)
             print(f"Error queuing push notification: {e}")
             return False
         finally:
@@ -147,6 +204,7 @@ class QueueService:
                 connection.close()
     
     # Message Processing
+    @timed('queue')
     def queue_message_processing(self, message_data: Dict) -> bool:
         """Queue message for background processing (spam detection, etc.)."""
         if not self.is_available():
@@ -175,6 +233,7 @@ class QueueService:
                 body=json.dumps(processing_data),
                 properties=pika.BasicProperties(
                     delivery_mode=2,
+                    headers=tracing_service.inject({})
                 )
             )
             
@@ -182,6 +241,7 @@ class QueueService:
             return True
             
         except Exception as e:
+            record_error(e)
             print(f"Error queuing message processing: {e}")
             return False
         finally:
@@ -189,6 +249,7 @@ class QueueService:
                 connection.close()
     
     # User Activity Logging
+    @timed('queue')
     def log_user_activity(self, username: str, activity: str, details: Dict = None) -> bool:
         """Log user activity for analytics."""
         if not self.is_available():
@@ -217,18 +278,46 @@ class QueueService:
                 body=json.dumps(activity_data),
                 properties=pika.BasicProperties(
                     delivery_mode=2,
+                    headers=tracing_service.inject({})
                 )
             )
             
             return True
             
         except Exception as e:
+            record_error(e)
             print(f"Error logging user activity: {e}")
             return False
         finally:
             if connection and not connection.is_closed:
                 connection.close()
     
+    # Monitoring
+    @timed('queue')
+    def get_queue_depths(self) -> Dict[str, int]:
+        """Number of ready messages in each application queue (one connection)."""
+        if not self.is_available():
+            return {}
+        
+        connection = self._get_connection()
+        if not connection:
+            return {}
+        
+        try:
+            channel = connection.channel()
+            self._declare_queues(channel)
+            return {
+                queue: channel.queue_declare(queue=queue, passive=True).method.message_count
+                for queue in QUEUES
+            }
+        except Exception as e:
+            record_error(e)
+            print(f"Error reading queue depths: {e}")
+            return {}
+        finally:
+            if connection and not connection.is_closed:
+                connection.close()
+    
     # Background Workers (Consumer Methods)
     def start_email_worker(self, email_handler: Callable):
         """Start background worker for email notifications."""
@@ -248,13 +337,15 @@ class QueueService:
                 def callback(ch, method, properties, body):
                     try:
                         data = json.loads(body)
-                        email_handler(data)
+                        with tracing_service.consume('email_notifications', properties.headers):
+                            email_handler(data)
                         ch.basic_ack(delivery_tag=method.delivery_tag)
                     except Exception as e:
                         print(f"Error processing email: {e}")
                         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
                 
                 channel.basic_qos(prefetch_count=1)
+                self._consumers.append((connection, channel))
                 channel.basic_consume(
                     queue='email_notifications',
                     on_message_callback=callback
@@ -292,13 +383,15 @@ class QueueService:
                 def callback(ch, method, properties, body):
                     try:
                         data = json.loads(body)
-                        log_handler(data)
+                        with tracing_service.consume('user_activity', properties.headers):
+                            log_handler(data)
                         ch.basic_ack(delivery_tag=method.delivery_tag)
                     except Exception as e:
                         print(f"Error processing activity log: {e}")
                         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
                 
                 channel.basic_qos(prefetch_count=1)
+                self._consumers.append((connection, channel))
                 channel.basic_consume(
                     queue='user_activity',
                     on_message_callback=callback
@@ -317,6 +410,87 @@ class QueueService:
         worker_thread = threading.Thread(target=worker, daemon=True)
         worker_thread.start()
         return worker_thread
+    
+    def start_message_processor(self, batch_handler: Callable[[List[Dict]], None],
+                                batch_size: int = 100, max_wait: float = 0.05):
+        """
+        Start background worker for message processing.
+        Messages are handed to batch_handler in micro-batches: a batch is
+        flushed when it holds batch_size messages or max_wait seconds after
+        its first message arrived. The whole batch is acked with one
+        multiple-ack, or requeued if the handler raises.
+        """
+        if not self.is_available():
+            print("Message processor not started: RabbitMQ not available")
+            return
+        
+        def worker():
+            connection = self._get_connection()
+            if not connection:
+                return
+                
+            try:
+                channel = connection.channel()
+                self._declare_queues(channel)
+                batch = []
+                
+                def callback(ch, method, properties, body):
+                    batch.append((method.delivery_tag, properties.headers, body))
+                
+                # The broker never has more than one batch in flight to us
+                channel.basic_qos(prefetch_count=batch_size)
+                self._consumers.append((connection, channel))
+                channel.basic_consume(
+                    queue='message_processing',
+                    on_message_callback=callback
+                )
+                
+                print("Message processor started. Waiting for messages...")
+                deadline = None
+                while channel.consumer_tags:
+                    connection.process_data_events(
+                        time_limit=max(deadline - time.monotonic(), 0) if deadline else 1.0
+                    )
+                    if batch and deadline is None:
+                        deadline = time.monotonic() + max_wait
+                    if batch and (len(batch) >= batch_size or time.monotonic() >= deadline):
+                        self._process_batch(channel, batch, batch_handler)
+                        batch.clear()
+                        deadline = None
+                if batch:
+                    self._process_batch(channel, batch, batch_handler)
+                
+            except Exception as e:
+                print(f"Message processor error: {e}")
+            finally:
+                if connection and not connection.is_closed:
+                    connection.close()
+        
+        # Start worker in background thread
+        worker_thread = threading.Thread(target=worker, daemon=True)
+        worker_thread.start()
+        return worker_thread
+    
+    def _process_batch(self, channel, batch: List, batch_handler: Callable[[List[Dict]], None]):
+        """Run batch_handler over decoded messages, then ack or requeue them together."""
+        last_tag = batch[-1][0]
+        messages = []
+        for _, _, body in batch:
+            try:
+                messages.append(json.loads(body))
+            except ValueError as e:
+                print(f"Dropping undecodable message: {e}")
+        try:
+            # One consumer span per batch, continuing the first message's trace
+            with tracing_service.consume('message_processing', batch[0][1]) as span:
+                if span is not None:
+                    span.set_attribute('messaging.batch.message_count', len(batch))
+                if messages:
+                    batch_handler(messages)
+            channel.basic_ack(delivery_tag=last_tag, multiple=True)
+        except Exception as e:
+            print(f"Error processing message batch: {e}")
+            channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
 
 # Example email handler function
 def handle_email_notification(data: Dict):
@@ -0,0 +1,199 @@
+"""
+Rate Limiting Service
+Per-route request limits by user and by client IP, plus suppression of
+repeated message content (RATE_LIMITS).
+
+- Limits are sliding-window counters: the previous fixed window's count is
+  weighted by how much of it the sliding window still covers, so each
+  subject costs two small counters instead of a log of timestamps
+- All limits of a request are checked, and counted if it passes, by one
+  Lua script: one Redis round trip, and concurrent requests can't both
+  slip under a limit
+- Checks run before the view, ahead of any database work; rejections get
+  429 (or 409 for a duplicate) with Retry-After
+- Without Redis, requests are let through
+"""
+import hashlib
+import math
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from flask import jsonify, request, session
+from config import Config
+from app.services.monitoring_service import (
+    rate_limit_max_requests, rate_limit_rejections_total, rate_limit_window_seconds
+)
+from app.services.redis_service import redis_service
+
+# Config keys this service reads
+SETTINGS = ('RATE_LIMIT_ENABLED', 'RATE_LIMITS', 'TRUSTED_PROXY_COUNT')
+
+# Subjects a limit can be counted per
+SCOPES = ('user', 'ip')
+
+# Words for content hashing (case, spacing and punctuation are ignored)
+WORD_RE = re.compile(r"\w+")
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[List[Tuple[str, int, int]], int]]:
+    """
+    Parse RATE_LIMITS, e.g. "chat.send_message=user:20/10,duplicate:10",
+    into {endpoint: ([(scope, requests, window seconds)], duplicate seconds)}.
+    """
+    routes = {}
+    for route in filter(None, (part.strip() for part in spec.split(';'))):
+        endpoint, _, rules = route.partition('=')
+        limits, duplicate = [], 0
+        for rule in filter(None, (part.strip() for part in rules.split(','))):
+            scope, _, value = rule.partition(':')
+            if scope == 'duplicate':
+                duplicate = int(value)
+            elif scope in SCOPES:
+                requests, _, window = value.partition('/')
+                limits.append((scope, int(requests), int(window)))
+            else:
+                raise ValueError(f"Unknown rate limit scope '{scope}' for {endpoint}")
+        routes[endpoint.strip()] = (limits, duplicate)
+    return routes
+
+
+def client_ip(remote_addr: Optional[str], forwarded_for: Optional[str], trusted_proxies: int) -> Optional[str]:
+    """The client's address, looking past trusted_proxies entries of X-Forwarded-For."""
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        if hops:
+            return hops[max(len(hops) - trusted_proxies, 0)]
+    return remote_addr
+
+
+def content_hash(text: str) -> str:
+    """Hash of a message's words, so "Hi  there!" and "hi there" collide."""
+    words = ' '.join(WORD_RE.findall(text.casefold()))
+    return hashlib.blake2b(words.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def retry_after(requests: int, window: int, offset: float, current: int, previous: int) -> int:
+    """Seconds until a request fits under a limit again, `offset` seconds into the current window."""
+    remaining = window - offset
+    if previous and current + 1 <= requests:
+        # The previous window's share shrinks as the sliding window moves on
+        wait = window * (current + previous + 1 - requests) / previous - offset
+        if wait < remaining:
+            return max(math.ceil(wait), 1)
+    # Once this window is the previous one, its count is what gets weighted
+    after = window * (1 - (requests - 1) / current) if current else 0
+    return max(math.ceil(remaining + max(after, 0)), 1)
+
+
+class RateLimitService:
+    """Service for per-route rate limits and duplicate suppression."""
+
+    def __init__(self):
+        self.configure({})
+
+    def configure(self, settings):
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        settings = {key: settings.get(key, getattr(Config, key)) for key in SETTINGS}
+        self.enabled = settings['RATE_LIMIT_ENABLED']
+        self.routes = parse_rate_limits(settings['RATE_LIMITS']) if self.enabled else {}
+        self.trusted_proxies = settings['TRUSTED_PROXY_COUNT']
+
+        rate_limit_max_requests.clear()
+        rate_limit_window_seconds.clear()
+        for endpoint, (limits, duplicate) in self.routes.items():
+            for scope, requests, window in limits:
+                rate_limit_max_requests.labels(endpoint=endpoint, scope=scope).set(requests)
+                rate_limit_window_seconds.labels(endpoint=endpoint, scope=scope).set(window)
+            if duplicate:
+                rate_limit_window_seconds.labels(endpoint=endpoint, scope='duplicate').set(duplicate)
+
+    def wants_content(self, endpoint: str) -> bool:
+        """True if the endpoint suppresses duplicate content (needs the request body)."""
+        return bool(self.routes.get(endpoint, ((), 0))[1])
+
+    def prepare(self, endpoint: str, username: Optional[str], ip: Optional[str],
+                content: Optional[str] = None) -> Optional[Tuple[List[str], List, List]]:
+        """Script keys and args for a request, plus what was checked; None if nothing applies."""
+        if endpoint not in self.routes:
+            return None
+        limits, duplicate = self.routes[endpoint]
+        subjects = {'user': username, 'ip': ip}
+        now = time.time()
+        keys, args, checked = [], [], []
+        for scope, requests, window in limits:
+            if not subjects[scope]:
+                continue
+            index, offset = divmod(now, window)
+            base = f"ratelimit:{endpoint}:{scope}:{subjects[scope]}"
+            keys += [f"{base}:{int(index)}", f"{base}:{int(index) - 1}"]
+            args += [requests, window, f"{1 - offset / window:.6f}"]
+            checked.append((scope, requests, window, offset))
+
+        subject = username or ip
+        if duplicate and isinstance(content, str) and content.strip() and subject:
+            keys.append(f"duplicate:{endpoint}:{subject}:{content_hash(content)}")
+        else:
+            duplicate = 0
+        if not checked and not duplicate:
+            return None
+        return keys, [duplicate, len(checked)] + args, checked
+
+    def evaluate(self, endpoint: str, checked: List, result: Optional[List[int]]) -> Optional[Dict]:
+        """Turn the script's reply into a rejection (status, error, retry_after), or None."""
+        if not result or result[0] == 0:
+            return None
+        if result[0] == 1:
+            scope, requests, window, offset = checked[result[1] - 1]
+            rejection = {
+                'status': 429,
+                'scope': scope,
+                'error': 'Too many requests - please slow down',
+                'retry_after': retry_after(requests, window, offset, result[2], result[3])
+            }
+        else:
+            rejection = {
+                'status': 409,
+                'scope': 'duplicate',
+                'error': 'Duplicate message - you just sent this',
+                'retry_after': max(result[1], 1)
+            }
+        rate_limit_rejections_total.labels(endpoint=endpoint, scope=rejection['scope']).inc()
+        return rejection
+
+    def check(self, endpoint: str, username: Optional[str], ip: Optional[str],
+              content: Optional[str] = None) -> Optional[Dict]:
+        """Check and count one request; returns a rejection or None if allowed."""
+        prepared = self.prepare(endpoint, username, ip, content)
+        if prepared is None:
+            return None
+        keys, args, checked = prepared
+        return self.evaluate(endpoint, checked, redis_service.check_rate_limits(keys, args))
+
+    # Flask integration
+    def before_request(self):
+        """Reject the request before the view runs if it is over a limit."""
+        if request.endpoint not in self.routes:
+            return None
+        content = None
+        if self.wants_content(request.endpoint):
+            data = request.get_json(silent=True)
+            content = data.get('content') if isinstance(data, dict) else None
+        ip = client_ip(request.remote_addr, request.headers.get('X-Forwarded-For'), self.trusted_proxies)
+
+        rejection = self.check(request.endpoint, session.get('username'), ip, content)
+        if rejection is None:
+            return None
+        response = jsonify({'error': rejection['error'], 'retry_after': rejection['retry_after']})
+        response.status_code = rejection['status']
+        response.headers['Retry-After'] = str(rejection['retry_after'])
+        return response
+
+    def register_middleware(self, app):
+        """Configure from the app and check requests to limited routes."""
+        self.configure(app.config)
+        if self.routes:
+            app.before_request(self.before_request)
+
+
+# Singleton instance
+rate_limit_service = RateLimitService()
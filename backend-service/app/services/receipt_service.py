@@ -0,0 +1,164 @@
+"""
+Reactions and Read Receipts
+Both change far more often than messages are sent, so neither is stored
+as a row per reader or per reaction:
+
+- Read receipts are watermarks: each user has one read marker, the ID of
+  the newest message they have read, and every message after it is unread.
+  The unread count is a range count on the message ID index.
+- Reactions are counters: Redis keeps the counts by emoji of each message
+  (and who reacted, so reacting twice counts once) for REACTION_TTL after
+  they last changed or were saved. The database row per message and emoji
+  keeps both too, so reactions Redis forgot are loaded back whole.
+- Both change in Redis only, with one script call. A flusher thread in
+  every worker saves the changed markers and counts every
+  RECEIPT_FLUSH_INTERVAL seconds, RECEIPT_FLUSH_BATCH_SIZE per transaction,
+  and gives what it saved a new revision, so long-polling clients receive
+  it in the delta feed. A batch that could not be saved is put back for
+  the next round.
+- Without Redis, read markers are saved directly; reactions are unavailable.
+"""
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+from config import Config
+from app.services.database import db_service
+from app.services.monitoring_service import receipts_saved_total
+from app.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+# Config keys this service reads
+SETTINGS = ('RECEIPT_FLUSH_INTERVAL', 'RECEIPT_FLUSH_BATCH_SIZE')
+
+# Longest emoji (characters) accepted as a reaction
+MAX_EMOJI_LENGTH = 16
+
+
+def valid_emoji(emoji) -> bool:
+    """Whether emoji can be used as a reaction (short, no whitespace)."""
+    return (isinstance(emoji, str) and 0 < len(emoji) <= MAX_EMOJI_LENGTH
+            and not any(char.isspace() for char in emoji))
+
+
+class ReceiptService:
+    """Service for message reactions and read receipts."""
+
+    def __init__(self):
+        self.configure({})
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+
+    def configure(self, settings):
+        """Configure from a mapping of settings (e.g. a Flask app.config)."""
+        settings = {key: settings.get(key, getattr(Config, key)) for key in SETTINGS}
+        self.flush_interval = settings['RECEIPT_FLUSH_INTERVAL']
+        self.batch_size = settings['RECEIPT_FLUSH_BATCH_SIZE']
+
+    def init_app(self, app):
+        """Configure from the Flask app. The flusher starts with the background workers."""
+        self.configure(app.config)
+
+    # Read receipts
+    def mark_read(self, username: str, message_id: int) -> Optional[int]:
+        """Move a user's read marker forward to message_id. Returns the marker, or None on error."""
+        marker = redis_service.set_read_marker(username, message_id)
+        if marker is not None:
+            return marker
+        # Redis unavailable: save it directly
+        if db_service.save_read_markers({username: message_id}) is None:
+            return None
+        return self.get_read_marker(username)
+
+    def get_read_marker(self, username: str) -> int:
+        """The ID of the newest message a user has read (0 if none)."""
+        markers = redis_service.get_read_markers(username)
+        if not markers:
+            markers = db_service.get_read_markers(username)
+        return markers.get(username, 0)
+
+    def get_read_markers(self) -> Dict[str, int]:
+        """Every user's read marker by username."""
+        markers = db_service.get_read_markers()
+        for username, marker in (redis_service.get_read_markers() or {}).items():
+            markers[username] = max(marker, markers.get(username, 0))
+        return markers
+
+    # Reactions
+    def react(self, message_id: int, username: str, emoji: str, add: bool = True) -> Optional[Dict[str, int]]:
+        """Add (or remove) a reaction. Returns the message's counts, or None if Redis is unavailable."""
+        saved = db_service.get_saved_reactions(message_id)
+        return redis_service.react(message_id, username, emoji, add, saved)
+
+    def get_reactions(self, message_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """Reaction counts by message ID (live from Redis, else as saved); messages without any are left out."""
+        counts = redis_service.get_reactions(message_ids) or {}
+        missing = [message_id for message_id in message_ids if message_id not in counts]
+        counts.update(db_service.get_reaction_counts(missing))
+        return {message_id: emojis for message_id, emojis in counts.items() if emojis}
+
+    # Flushing
+    def start(self):
+        """Start the flusher thread in this process (if an interval is set)."""
+        if self.flush_interval <= 0:
+            return None
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return self._thread
+        self._stopping.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='receipt-flusher')
+        self._thread.start()
+        logger.info("Receipt flusher started")
+        return self._thread
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flusher after its current batch."""
+        self._stopping.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        """Flusher loop."""
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        Save unsaved read markers and reaction counts and wake the
+        long-poll waiters. Returns False if a batch could not be saved.
+        """
+        markers_saved, markers_revision = self._flush_batches(
+            'read_marker', redis_service.take_unsaved_read_markers, db_service.save_read_markers,
+            lambda markers: redis_service.mark_receipts_unsaved(usernames=list(markers))
+        )
+        reactions_saved, reactions_revision = self._flush_batches(
+            'reaction', redis_service.take_unsaved_reactions, db_service.save_reactions,
+            lambda counts: redis_service.mark_receipts_unsaved(message_ids=list(counts))
+        )
+        revision = max(markers_revision, reactions_revision)
+        if revision:
+            redis_service.publish_new_message(revision)
+        return markers_saved and reactions_saved
+
+    def _flush_batches(self, kind: str, take: Callable, save: Callable, put_back: Callable):
+        """Take and save batches until one is short. Returns (all saved, highest new revision)."""
+        revision = 0
+        while True:
+            batch = take(self.batch_size)
+            if not batch:
+                return True, revision
+            saved = save(batch)
+            if saved is None:
+                put_back(batch)
+                return False, revision
+            receipts_saved_total.labels(kind=kind).inc(len(batch))
+            revision = max(revision, saved)
+            if len(batch) < self.batch_size or self._stopping.is_set():
+                return True, revision
+
+
+# Singleton instance
+receipt_service = ReceiptService()
@@ -0,0 +1,296 @@
+"""
+Lua scripts for compound Redis operations.
+
+Each script runs atomically on the server in one round trip, so flows that
+used to read and then write (and could race with another worker or pod in
+between) can't interleave. Scripts are registered here by name; RedisScripts
+binds them to a client, loads them all with one pipelined SCRIPT LOAD when
+the client connects and then calls them with EVALSHA. If Redis has lost
+them (restart, SCRIPT FLUSH) the NOSCRIPT reply makes redis-py load the
+script again and retry.
+
+Scripts taking key prefixes in ARGV build key names on the server, which a
+Redis Cluster would reject; this app uses a single Redis.
+"""
+from typing import Dict, Iterable
+
+# Script source by name
+SCRIPTS: Dict[str, str] = {}
+
+
+def register(name: str, source: str) -> str:
+    """Add a script to the registry; returns its source."""
+    SCRIPTS[name] = source.strip()
+    return SCRIPTS[name]
+
+
+# Data version markers used for ETags: version:{scope} is a hash of
+#   epoch   - random-ish value set when the marker is (re)created, so a
+#             flushed Redis can never reproduce an old version
+#   max_key - highest key written (e.g. newest message)
+#   changes - counter bumped by deletes and other in-place changes
+GET_VERSION_SCRIPT = register('get_version', """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], 'epoch', ARGV[1], 'max_key', 0, 'changes', 0)
+end
+return redis.call('HMGET', KEYS[1], 'epoch', 'max_key', 'changes')
+""")
+
+BUMP_VERSION_SCRIPT = register('bump_version', """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[1] ~= '' then
+    local current = tonumber(redis.call('HGET', KEYS[1], 'max_key') or '0')
+    if tonumber(ARGV[1]) > current then
+        redis.call('HSET', KEYS[1], 'max_key', ARGV[1])
+        return 1
+    end
+end
+redis.call('HINCRBY', KEYS[1], 'changes', 1)
+return 1
+""")
+
+# Sliding-window rate limits plus duplicate suppression, checked and counted
+# in one atomic step (see rate_limit_service). For each of the ARGV[2] limits:
+#   KEYS[2i-1], KEYS[2i]  request counters of the current and previous window
+#   ARGV[3i], ARGV[3i+1], ARGV[3i+2]  limit, window seconds, previous-window weight
+# The key after the counters, if ARGV[1] (seconds) > 0, marks recent content.
+# Returns {0} when allowed and counted, {1, i, current, previous} when limit i
+# is reached, {2, ttl} for a duplicate. Rejected requests are not counted.
+RATE_LIMIT_SCRIPT = register('rate_limit', """
+local limits = tonumber(ARGV[2])
+for i = 1, limits do
+    local current = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+    if current + previous * tonumber(ARGV[3 * i + 2]) + 1 > tonumber(ARGV[3 * i]) then
+        return {1, i, current, previous}
+    end
+end
+local duplicate_ttl = tonumber(ARGV[1])
+if duplicate_ttl > 0 then
+    local marker = KEYS[2 * limits + 1]
+    if not redis.call('SET', marker, 1, 'NX', 'EX', duplicate_ttl) then
+        return {2, redis.call('TTL', marker)}
+    end
+end
+for i = 1, limits do
+    redis.call('INCR', KEYS[2 * i - 1])
+    redis.call('EXPIRE', KEYS[2 * i - 1], 2 * tonumber(ARGV[3 * i + 1]))
+end
+return {0}
+""")
+
+# Online users: KEYS[1] is the set of usernames, ARGV[1] the prefix of the
+# per-user keys that expire when a user goes quiet. Returns the users whose
+# key still exists and removes the others from the set.
+GET_ONLINE_USERS_SCRIPT = register('get_online_users', """
+local online = {}
+for _, user in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    if redis.call('EXISTS', ARGV[1] .. user) == 1 then
+        online[#online + 1] = user
+    else
+        redis.call('SREM', KEYS[1], user)
+    end
+end
+return online
+""")
+
+# Logout: KEYS are session:{id}, user_sessions:{username}, online_users and
+# user_online:{username}; ARGV the session ID and username.
+END_SESSION_SCRIPT = register('end_session', """
+redis.call('DEL', KEYS[1], KEYS[4])
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('SREM', KEYS[3], ARGV[2])
+return 1
+""")
+
+# Every session of a user: KEYS[1] is user_sessions:{username}, KEYS[2]
+# online_users, any further keys (user_online:{username}, caches, counters)
+# are deleted too. ARGV is the session key prefix and the username. Returns
+# the IDs of the deleted sessions.
+END_USER_SESSIONS_SCRIPT = register('end_user_sessions', """
+local session_ids = redis.call('SMEMBERS', KEYS[1])
+for _, session_id in ipairs(session_ids) do
+    redis.call('DEL', ARGV[1] .. session_id)
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[2])
+for i = 3, #KEYS do
+    redis.call('DEL', KEYS[i])
+end
+return session_ids
+""")
+
+# Write-behind journal: KEYS[1] is the stream, ARGV[1] the most unsaved
+# entries it may hold (0 = no limit), the rest field/value pairs. Returns
+# the new entry ID, or nil when the journal is full.
+JOURNAL_APPEND_SCRIPT = register('journal_append', """
+local max_length = tonumber(ARGV[1])
+if max_length > 0 and redis.call('XLEN', KEYS[1]) >= max_length then
+    return false
+end
+return redis.call('XADD', KEYS[1], '*', unpack(ARGV, 2))
+""")
+
+# Read receipts: KEYS[1] is the hash of read markers (username -> last read
+# message ID), KEYS[2] the set of users whose marker is not saved yet; ARGV
+# the username and message ID. A marker only moves forward. IDs are compared
+# as decimal strings (Lua numbers lose 64-bit precision). Returns the marker.
+ADVANCE_READ_MARKER_SCRIPT = register('advance_read_marker', """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if current and (#current > #ARGV[2] or (#current == #ARGV[2] and current >= ARGV[2])) then
+    return current
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[1])
+return ARGV[2]
+""")
+
+# Read markers to save: pops up to ARGV[1] users from the set KEYS[1] and
+# returns username, marker pairs from the hash KEYS[2].
+TAKE_READ_MARKERS_SCRIPT = register('take_read_markers', """
+local usernames = redis.call('SPOP', KEYS[1], ARGV[1])
+if #usernames == 0 then
+    return {}
+end
+local markers = redis.call('HMGET', KEYS[2], unpack(usernames))
+local result = {}
+for i, username in ipairs(usernames) do
+    if markers[i] then
+        result[#result + 1] = username
+        result[#result + 1] = markers[i]
+    end
+end
+return result
+""")
+
+# Reactions: KEYS[1] is the hash of counts by emoji of one message, KEYS[2]
+# the set of "emoji username" reactions to it, KEYS[3] the set of messages
+# whose counts are not saved yet. ARGV: message ID, emoji, username, 1 to
+# add or 0 to remove, TTL (seconds), the number n of saved reactions, those
+# n "emoji username" reactions, then saved emoji/count pairs.
+# A missing hash is filled first: counted from the set if that is still
+# there, else both are filled from the saved reactions and counts (so
+# reacting after they expired doesn't count anyone twice). Its ' loaded'
+# field keeps the hash from disappearing (and being filled again from stale
+# counts) when the last reaction goes. Both keys expire TTL seconds after
+# the last change. Reacting twice (or removing twice) changes nothing.
+# Returns the counts.
+REACT_SCRIPT = register('react', """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    local fields = {' loaded', 1}
+    local reactions = redis.call('SMEMBERS', KEYS[2])
+    if #reactions > 0 then
+        local counts = {}
+        for _, reaction in ipairs(reactions) do
+            local emoji = string.match(reaction, '^%S+')
+            counts[emoji] = (counts[emoji] or 0) + 1
+        end
+        for emoji, count in pairs(counts) do
+            fields[#fields + 1] = emoji
+            fields[#fields + 1] = count
+        end
+    else
+        local saved = tonumber(ARGV[6])
+        for i = 7, 6 + saved, 1000 do
+            redis.call('SADD', KEYS[2], unpack(ARGV, i, math.min(i + 999, 6 + saved)))
+        end
+        for i = 7 + saved, #ARGV do
+            fields[#fields + 1] = ARGV[i]
+        end
+    end
+    redis.call('HSET', KEYS[1], unpack(fields))
+end
+local reaction = ARGV[2] .. ' ' .. ARGV[3]
+local changed = false
+if ARGV[4] == '1' then
+    if redis.call('SADD', KEYS[2], reaction) == 1 then
+        redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+        changed = true
+    end
+elseif redis.call('SREM', KEYS[2], reaction) == 1 then
+    if redis.call('HINCRBY', KEYS[1], ARGV[2], -1) <= 0 then
+        redis.call('HDEL', KEYS[1], ARGV[2])
+    end
+    changed = true
+end
+if changed then
+    redis.call('SADD', KEYS[3], ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return redis.call('HGETALL', KEYS[1])
+""")
+
+# Reactions to save: pops up to ARGV[1] message IDs from the set KEYS[1]
+# and returns each ID followed by the HGETALL of ARGV[2] .. ID and the
+# SMEMBERS of ARGV[2] .. ID .. ':users'. Both keys get a fresh TTL of
+# ARGV[3] seconds, so they outlive a save that fails and is retried.
+TAKE_REACTIONS_SCRIPT = register('take_reactions', """
+local result = {}
+for _, message_id in ipairs(redis.call('SPOP', KEYS[1], ARGV[1])) do
+    local counts = ARGV[2] .. message_id
+    local users = counts .. ':users'
+    redis.call('EXPIRE', counts, ARGV[3])
+    redis.call('EXPIRE', users, ARGV[3])
+    result[#result + 1] = message_id
+    result[#result + 1] = redis.call('HGETALL', counts)
+    result[#result + 1] = redis.call('SMEMBERS', users)
+end
+return result
+""")
+
+# Lock release: deletes KEYS[1] only if it still holds this owner's token
+# ARGV[1], so an expired lock taken over by someone else stays theirs.
+RELEASE_LOCK_SCRIPT = register('release_lock', """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+# Lock renewal: resets the TTL of KEYS[1] to ARGV[2] seconds only if it
+# still holds this owner's token ARGV[1]. Returns 0 if the lock was lost.
+RENEW_LOCK_SCRIPT = register('renew_lock', """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+""")
+
+# Message ID node lease: tries the nodes round robin from the counter
+# KEYS[1] and takes the first free lock ARGV[1] .. node (token ARGV[2], TTL
+# ARGV[3] seconds) of ARGV[4] nodes. Returns the node, or -1 if all are taken.
+LEASE_ID_NODE_SCRIPT = register('lease_id_node', """
+local nodes = tonumber(ARGV[4])
+for _ = 1, nodes do
+    local node = redis.call('INCR', KEYS[1]) % nodes
+    if redis.call('SET', ARGV[1] .. node, ARGV[2], 'NX', 'EX', ARGV[3]) then
+        return node
+    end
+end
+return -1
+""")
+
+
+class RedisScripts:
+    """
+    The registered scripts bound to one client (sync or redis.asyncio).
+    With an async client, load() and run() return awaitables.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._scripts = {name: client.register_script(source) for name, source in SCRIPTS.items()}
+
+    def load(self):
+        """Load every script into Redis in one round trip."""
+        pipe = self.client.pipeline(transaction=False)
+        for script in self._scripts.values():
+            pipe.script_load(script.script)
+        return pipe.execute()
+
+    def run(self, name: str, keys: Iterable = (), args: Iterable = ()):
+        """Run a script by name (EVALSHA, reloading it on NOSCRIPT)."""
+        return self._scripts[name](keys=list(keys), args=list(args))
@@ -4,79 +4,245 @@ Handles session management, caching, and real-time features.
 """
 import redis
 import json
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from config import Config
+from app.services.monitoring_service import timed, record_error
+from app.services.redis_scripts import RedisScripts
+from app.services.session_store import SessionStore, SESSION_KEY, USER_SESSIONS_KEY
+
+try:
+    import fakeredis
+except ImportError:  # Optional dependency - only needed for REDIS_BACKEND = 'fake'
+    fakeredis = None
+
+# Pub/sub channel carrying the revision of each newly saved change
+MESSAGE_CHANNEL = 'chat:new_messages'
+
+# Read receipts: hash of read markers (last read message ID) by username,
+# and the set of users whose marker is not saved to the database yet
+READ_MARKERS_KEY = 'read_markers'
+UNSAVED_READ_MARKERS_KEY = 'unsaved_read_markers'
+
+# Reactions: reactions:{message_id} holds counts by emoji,
+# reactions:{message_id}:users who reacted with what ("emoji username"),
+# both for REACTION_TTL after the last change; the set lists messages whose
+# reactions are not saved to the database yet
+REACTIONS_PREFIX = 'reactions:'
+UNSAVED_REACTIONS_KEY = 'unsaved_reactions'
+
+# Field keeping a reactions hash in place while it has no counts (see redis_scripts)
+REACTIONS_LOADED_FIELD = ' loaded'
+
+# Message ID nodes: lock:id_node:{node} is held by the process using that
+# node; the counter spreads new leases over the free ones
+ID_NODE_LOCK_PREFIX = 'id_node:'
+ID_NODE_COUNTER_KEY = 'id_node:next'
+
+# Seconds to wait before retrying an unreachable Redis
+RECONNECT_INTERVAL = 30
+
+# Config keys this service reads
+SETTINGS = ('REDIS_HOST', 'REDIS_PORT', 'REDIS_DB', 'REDIS_CONNECT_TIMEOUT', 'REDIS_BACKEND',
+            'SESSION_TTL', 'SESSION_TOUCH_INTERVAL', 'REACTION_TTL')
+
+_fake_server = None
+
+def fake_redis_server():
+    """In-process fakeredis server shared by every client in this process."""
+    global _fake_server
+    if fakeredis is None:
+        raise RuntimeError("REDIS_BACKEND is 'fake' but fakeredis is not installed")
+    if _fake_server is None:
+        _fake_server = fakeredis.FakeServer()
+    return _fake_server
+
+def reaction_counts(fields) -> Dict[str, int]:
+    """Reaction counts from a reactions hash (a dict, or HGETALL pairs from a script)."""
+    if isinstance(fields, list):
+        fields = dict(zip(fields[::2], fields[1::2]))
+    return {emoji: int(count) for emoji, count in fields.items() if emoji != REACTIONS_LOADED_FIELD}
+
+def reaction_users(reactions) -> Dict[str, List[str]]:
+    """Usernames by emoji from the members ("emoji username") of a reactions users set."""
+    users = {}
+    for reaction in reactions:
+        emoji, _, username = reaction.partition(' ')
+        users.setdefault(emoji, []).append(username)
+    return {emoji: sorted(usernames) for emoji, usernames in users.items()}
 
 class RedisService:
     """Service class for Redis operations."""
     
     def __init__(self):
-        """Initialize Redis connection."""
-        try:
-            self.redis_client = redis.Redis(
-                host=Config.REDIS_HOST,
-                port=Config.REDIS_PORT,
-                db=Config.REDIS_DB,
-                decode_responses=True
+        """Set up the service. No connection is made until first use."""
+        self.settings = {key: getattr(Config, key) for key in SETTINGS}
+        self.sessions = None
+        self.scripts = None
+        self._client = None
+        self._next_attempt = 0.0
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        """Configure from the Flask app. The connection is still opened lazily."""
+        self.close()
+        self.settings = {key: app.config.get(key, getattr(Config, key)) for key in SETTINGS}
+    
+    @property
+    def redis_client(self):
+        """Redis client, connected on first use (None while Redis is unreachable)."""
+        if self._client is None and time.monotonic() >= self._next_attempt:
+            self._connect()
+        return self._client
+    
+    def _connect(self):
+        """Open and verify the connection, or back off for RECONNECT_INTERVAL."""
+        with self._lock:
+            if self._client is not None or time.monotonic() < self._next_attempt:
+                return
+            try:
+                if self.settings['REDIS_BACKEND'] == 'fake':
+                    client = fakeredis.FakeRedis(server=fake_redis_server(), decode_responses=True)
+                else:
+                    client = redis.Redis(
+                        host=self.settings['REDIS_HOST'],
+                        port=self.settings['REDIS_PORT'],
+                        db=self.settings['REDIS_DB'],
+                        socket_connect_timeout=self.settings['REDIS_CONNECT_TIMEOUT'],
+                        decode_responses=True
+                    )
+                # Test connection and preload the Lua scripts
+                client.ping()
+                scripts = RedisScripts(client)
+                scripts.load()
+                print("Redis connection established successfully!")
+            except redis.ConnectionError:
+                print("Warning: Redis not available. Session features disabled.")
+                self._next_attempt = time.monotonic() + RECONNECT_INTERVAL
+                return
+            except Exception as e:
+                print(f"Redis connection error: {e}")
+                self._next_attempt = time.monotonic() + RECONNECT_INTERVAL
+                return
+            
+            self.scripts = scripts
+            self.sessions = SessionStore(
+                client,
+                ttl=self.settings['SESSION_TTL'],
+                touch_interval=self.settings['SESSION_TOUCH_INTERVAL']
             )
-            # Test connection
-            self.redis_client.ping()
-            print("Redis connection established successfully!")
-        except redis.ConnectionError:
-            print("Warning: Redis not available. Session features disabled.")
-            self.redis_client = None
-        except Exception as e:
-            print(f"Redis connection error: {e}")
-            self.redis_client = None
+            self._client = client
     
     def is_available(self) -> bool:
-        """Check if Redis is available."""
+        """Check if Redis is available (connects on first call)."""
         return self.redis_client is not None
     
+    def reset_connections(self):
+        """
+        Forget pooled connections inherited from a parent process.
+        Call in a forked worker; new connections are opened on demand.
+        """
+        if self._client is not None:
+            self._client.connection_pool.reset()
+    
+    def close(self):
+        """Close the connection pool; the next use reconnects."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self.sessions = None
+            self._next_attempt = 0.0
+    
     # Session Management
+    @timed('redis')
     def store_session(self, session_id: str, user_data: Dict) -> bool:
-        """Store user session in Redis."""
+        """Store user session in Redis (sliding expiry, indexed by username)."""
         if not self.is_available():
             return False
         
         try:
-            self.redis_client.setex(
-                f"session:{session_id}",
-                3600,  # 1 hour expiry
-                json.dumps(user_data)
-            )
+            self.sessions.create(session_id, user_data)
             print(f"Session stored for session ID: {session_id}")
             return True
         except Exception as e:
+            record_error(e)
             print(f"Error storing session: {e}")
             return False
     
+    @timed('redis')
     def get_session(self, session_id: str) -> Optional[Dict]:
-        """Get user session from Redis."""
+        """Get user session from Redis, extending its expiry if due."""
         if not self.is_available():
             return None
         
         try:
-            data = self.redis_client.get(f"session:{session_id}")
-            return json.loads(data) if data else None
+            return self.sessions.get(session_id)
         except Exception as e:
+            record_error(e)
             print(f"Error getting session: {e}")
             return None
     
-    def delete_session(self, session_id: str) -> bool:
+    @timed('redis')
+    def delete_session(self, session_id: str, username: str = None) -> bool:
         """Delete user session from Redis."""
         if not self.is_available():
             return False
         
         try:
-            self.redis_client.delete(f"session:{session_id}")
+            self.sessions.delete(session_id, username)
             return True
         except Exception as e:
+            record_error(e)
             print(f"Error deleting session: {e}")
             return False
     
+    @timed('redis')
+    def end_session(self, session_id: str, username: str) -> bool:
+        """Log out: delete the session and mark the user offline (one atomic step)."""
+        if not self.is_available():
+            return False
+        
+        try:
+            self.scripts.run('end_session', keys=[
+                SESSION_KEY.format(session_id), USER_SESSIONS_KEY.format(username),
+                "online_users", f"user_online:{username}"
+            ], args=[session_id, username])
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error ending session: {e}")
+            return False
+    
+    @timed('redis')
+    def end_user_sessions(self, username: str, extra_keys: List[str] = ()) -> int:
+        """
+        Log a user out everywhere: delete all their sessions, mark them
+        offline and delete extra_keys, in one atomic step.
+        Returns the number of sessions removed.
+        """
+        if not self.is_available():
+            return 0
+        
+        try:
+            session_ids = self.scripts.run('end_user_sessions', keys=[
+                USER_SESSIONS_KEY.format(username), "online_users", f"user_online:{username}", *extra_keys
+            ], args=[SESSION_KEY.format(''), username])
+            return len(session_ids)
+        except Exception as e:
+            record_error(e)
+            print(f"Error ending user sessions: {e}")
+            return 0
+    
+    def purge_user(self, username: str) -> int:
+        """Remove a deleted user's sessions, online status, cached data and counters."""
+        return self.end_user_sessions(username, [f"user_cache:{username}", f"message_count:{username}"])
+    
     # Online Users Management
+    @timed('redis')
     def add_online_user(self, username: str) -> bool:
         """Mark user as online."""
         if not self.is_available():
@@ -88,9 +254,11 @@ class RedisService:
             self.redis_client.setex(f"user_online:{username}", 300, "true")  # 5 minutes
             return True
         except Exception as e:
+            record_error(e)
             print(f"Error adding online user: {e}")
             return False
     
+    @timed('redis')
     def remove_online_user(self, username: str) -> bool:
         """Mark user as offline."""
         if not self.is_available():
@@ -101,28 +269,25 @@ class RedisService:
             self.redis_client.delete(f"user_online:{username}")
             return True
         except Exception as e:
+            record_error(e)
             print(f"Error removing online user: {e}")
             return False
     
+    @timed('redis')
     def get_online_users(self) -> List[str]:
         """Get list of all online users."""
         if not self.is_available():
             return []
         
         try:
-            online_users = list(self.redis_client.smembers("online_users"))
-            # Clean up expired users
-            active_users = []
-            for user in online_users:
-                if self.redis_client.exists(f"user_online:{user}"):
-                    active_users.append(user)
-                else:
-                    self.redis_client.srem("online_users", user)
-            return active_users
+            # Drops expired users from the set in the same round trip
+            return self.scripts.run('get_online_users', keys=["online_users"], args=["user_online:"])
         except Exception as e:
+            record_error(e)
             print(f"Error getting online users: {e}")
             return []
     
+    @timed('redis')
     def is_user_online(self, username: str) -> bool:
         """Check if a specific user is online."""
         if not self.is_available():
@@ -131,10 +296,12 @@ class RedisService:
         try:
             return self.redis_client.exists(f"user_online:{username}") == 1
         except Exception as e:
+            record_error(e)
             print(f"Error checking user online status: {e}")
             return False
     
     # Typing Indicators
+    @timed('redis')
     def set_typing_indicator(self, username: str, room_id: str = "general") -> bool:
         """Set typing indicator for a user in a room."""
         if not self.is_available():
@@ -144,9 +311,11 @@ class RedisService:
             self.redis_client.setex(f"typing:{room_id}:{username}", 5, "true")  # 5 seconds
             return True
         except Exception as e:
+            record_error(e)
             print(f"Error setting typing indicator: {e}")
             return False
     
+    @timed('redis')
     def get_typing_users(self, room_id: str = "general") -> List[str]:
         """Get users currently typing in a room."""
         if not self.is_available():
@@ -158,10 +327,12 @@ class RedisService:
             typing_users = [key.split(':')[-1] for key in typing_keys]
             return typing_users
         except Exception as e:
+            record_error(e)
             print(f"Error getting typing users: {e}")
             return []
     
     # Caching
+    @timed('redis')
     def cache_user_data(self, username: str, user_data: Dict, expiry: int = 300) -> bool:
         """Cache user data for faster access."""
         if not self.is_available():
@@ -175,9 +346,11 @@ class RedisService:
             )
             return True
         except Exception as e:
+            record_error(e)
             print(f"Error caching user data: {e}")
             return False
     
+    @timed('redis')
     def get_cached_user_data(self, username: str) -> Optional[Dict]:
         """Get cached user data."""
         if not self.is_available():
@@ -187,10 +360,86 @@ class RedisService:
             data = self.redis_client.get(f"user_cache:{username}")
             return json.loads(data) if data else None
         except Exception as e:
+            record_error(e)
             print(f"Error getting cached user data: {e}")
             return None
     
+    # Data Versions (ETags)
+    @timed('redis')
+    def get_data_version(self, scope: str) -> Optional[str]:
+        """
+        Get the version marker of a data set (e.g. 'messages', 'users').
+        Creates a fresh marker if none exists. Read it BEFORE querying the
+        data, so a concurrent change always yields a newer version.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            epoch = f"{int(time.time() * 1000):x}{os.urandom(2).hex()}"
+            values = self.scripts.run('get_version', keys=[f"version:{scope}"], args=[epoch])
+            return '-'.join(str(value) for value in values)
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting data version: {e}")
+            return None
+    
+    @timed('redis')
+    def bump_data_version(self, scope: str, max_key: int = None) -> bool:
+        """
+        Record a change to a data set.
+        With max_key (a newly written key) only raises the high-water mark;
+        without it, counts an in-place change such as a delete.
+        """
+        if not self.is_available():
+            return False
+        
+        try:
+            self.scripts.run(
+                'bump_version',
+                keys=[f"version:{scope}"],
+                args=['' if max_key is None else max_key]
+            )
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error bumping data version: {e}")
+            return False
+    
+    # Rate Limiting
+    @timed('redis')
+    def check_rate_limits(self, keys: List[str], args: List) -> Optional[List[int]]:
+        """
+        Run the rate-limit script (one round trip) with keys and args built
+        by rate_limit_service. None if Redis is not available.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            return self.scripts.run('rate_limit', keys=keys, args=args)
+        except Exception as e:
+            record_error(e)
+            print(f"Error checking rate limits: {e}")
+            return None
+    
+    # New Message Notifications
+    @timed('redis')
+    def publish_new_message(self, revision: int) -> bool:
+        """Tell every worker's long-poll waiters that a change with this revision was saved."""
+        if not self.is_available():
+            return False
+        
+        try:
+            self.redis_client.publish(MESSAGE_CHANNEL, revision)
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error publishing new message: {e}")
+            return False
+    
     # Statistics
+    @timed('redis')
     def increment_message_count(self, username: str) -> int:
         """Increment and return user's message count."""
         if not self.is_available():
@@ -199,9 +448,28 @@ class RedisService:
         try:
             return self.redis_client.incr(f"message_count:{username}")
         except Exception as e:
+            record_error(e)
             print(f"Error incrementing message count: {e}")
             return 0
     
+    @timed('redis')
+    def increment_message_counts(self, counts: Dict[str, int]) -> bool:
+        """Add to several users' message counts in one round trip."""
+        if not self.is_available():
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for username, count in counts.items():
+                pipe.incrby(f"message_count:{username}", count)
+            pipe.execute()
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error incrementing message counts: {e}")
+            return False
+    
+    @timed('redis')
     def get_message_count(self, username: str) -> int:
         """Get user's message count."""
         if not self.is_available():
@@ -211,8 +479,366 @@ class RedisService:
             count = self.redis_client.get(f"message_count:{username}")
             return int(count) if count else 0
         except Exception as e:
+            record_error(e)
             print(f"Error getting message count: {e}")
             return 0
+    
+    # Message Pipeline
+    @timed('redis')
+    def record_message_fingerprints(self, entries: List[Tuple[str, str]], window: int,
+                                    rate_window: int) -> Optional[List[Tuple[bool, int]]]:
+        """
+        Record (username, content hash) pairs for a batch of messages in one
+        round trip. Returns, per entry, whether the user already sent that
+        content within `window` seconds and their message count in the
+        current rate_window bucket. None if Redis is not available.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            bucket = int(time.time()) // rate_window
+            pipe = self.redis_client.pipeline(transaction=False)
+            for username, digest in entries:
+                pipe.set(f"message_fingerprint:{username}:{digest}", 1, nx=True, ex=window)
+                pipe.incr(f"message_rate:{username}:{bucket}")
+                pipe.expire(f"message_rate:{username}:{bucket}", rate_window)
+            replies = pipe.execute()
+            return [(not replies[i], replies[i + 1]) for i in range(0, len(replies), 3)]
+        except Exception as e:
+            record_error(e)
+            print(f"Error recording message fingerprints: {e}")
+            return None
+    
+    # Message Journal (write-behind)
+    @timed('redis')
+    def append_to_journal(self, stream: str, fields: Dict, max_length: int = 0) -> Optional[str]:
+        """
+        Append a message to the journal stream. Returns the entry ID, or
+        None if Redis is not available or the stream already holds
+        max_length entries (0 = no limit).
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            args = [max_length]
+            for name, value in fields.items():
+                args += [name, value]
+            return self.scripts.run('journal_append', keys=[stream], args=args)
+        except Exception as e:
+            record_error(e)
+            print(f"Error appending to journal: {e}")
+            return None
+    
+    @timed('redis')
+    def create_journal_group(self, stream: str, group: str) -> bool:
+        """Create the consumer group (and the stream) unless it exists."""
+        if not self.is_available():
+            return False
+        
+        try:
+            self.redis_client.xgroup_create(stream, group, id='0', mkstream=True)
+            return True
+        except redis.ResponseError as e:
+            if str(e).startswith('BUSYGROUP'):
+                return True
+            record_error(e)
+            print(f"Error creating journal group: {e}")
+            return False
+        except Exception as e:
+            record_error(e)
+            print(f"Error creating journal group: {e}")
+            return False
+    
+    # Not timed: it waits up to block_ms for new entries
+    def read_journal(self, stream: str, group: str, consumer: str, count: int,
+                     block_ms: int = None, pending: bool = False) -> Optional[List[Tuple[str, Dict]]]:
+        """
+        Read up to count entries as (entry ID, fields) for this consumer:
+        new ones (waiting up to block_ms), or with pending=True the ones it
+        was given before but never acknowledged. None on error.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            reply = self.redis_client.xreadgroup(
+                group, consumer, {stream: '0' if pending else '>'},
+                count=count, block=None if pending else block_ms
+            )
+            return reply[0][1] if reply else []
+        except Exception as e:
+            record_error(e)
+            print(f"Error reading journal: {e}")
+            return None
+    
+    @timed('redis')
+    def claim_journal_entries(self, stream: str, group: str, consumer: str,
+                              min_idle_ms: int, count: int) -> Optional[List[Tuple[str, Dict]]]:
+        """Take over entries another consumer has left unacknowledged for min_idle_ms."""
+        if not self.is_available():
+            return None
+        
+        try:
+            reply = self.redis_client.xautoclaim(stream, group, consumer, min_idle_ms, count=count)
+            return reply[1]
+        except Exception as e:
+            record_error(e)
+            print(f"Error claiming journal entries: {e}")
+            return None
+    
+    @timed('redis')
+    def ack_journal_entries(self, stream: str, group: str, entry_ids: List[str]) -> bool:
+        """Acknowledge saved entries and delete them, so the stream only holds unsaved ones."""
+        if not self.is_available():
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.xack(stream, group, *entry_ids)
+            pipe.xdel(stream, *entry_ids)
+            pipe.execute()
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error acknowledging journal entries: {e}")
+            return False
+    
+    @timed('redis')
+    def get_journal_backlog(self, stream: str) -> Optional[Tuple[int, Optional[str]]]:
+        """Number of unsaved entries and the ID of the oldest one (None if empty)."""
+        if not self.is_available():
+            return None
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.xlen(stream)
+            pipe.xrange(stream, count=1)
+            length, oldest = pipe.execute()
+            return length, oldest[0][0] if oldest else None
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting journal backlog: {e}")
+            return None
+    
+    # Reactions and Read Receipts
+    @timed('redis')
+    def react(self, message_id: int, username: str, emoji: str, add: bool = True,
+              saved: Optional[Dict[str, Tuple[int, List[str]]]] = None) -> Optional[Dict[str, int]]:
+        """
+        Add (or remove) a user's emoji reaction to a message. saved is the
+        message's reactions from the database ({emoji: (count, usernames)}),
+        used if Redis has none. Returns the message's reaction counts, or
+        None if Redis is not available.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            saved = saved or {}
+            reactions = [f"{saved_emoji} {user}" for saved_emoji, (_, users) in saved.items() for user in users]
+            counts = [value for saved_emoji, (count, _) in saved.items() for value in (saved_emoji, count)]
+            reply = self.scripts.run('react', [
+                f"{REACTIONS_PREFIX}{message_id}", f"{REACTIONS_PREFIX}{message_id}:users", UNSAVED_REACTIONS_KEY
+            ], [message_id, emoji, username, 1 if add else 0, self.settings['REACTION_TTL'],
+                len(reactions), *reactions, *counts])
+            return reaction_counts(reply)
+        except Exception as e:
+            record_error(e)
+            print(f"Error reacting to message {message_id}: {e}")
+            return None
+    
+    @timed('redis')
+    def get_reactions(self, message_ids: List[int]) -> Optional[Dict[int, Dict[str, int]]]:
+        """
+        Reaction counts by message ID, in one round trip. Messages Redis
+        has no counts for are left out (look them up in the database).
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for message_id in message_ids:
+                pipe.hgetall(f"{REACTIONS_PREFIX}{message_id}")
+            return {message_id: reaction_counts(fields)
+                    for message_id, fields in zip(message_ids, pipe.execute()) if fields}
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting reactions: {e}")
+            return None
+    
+    @timed('redis')
+    def clear_reactions(self, message_id: int) -> bool:
+        """Drop a (deleted) message's reactions; the next save removes them from the database too."""
+        if not self.is_available():
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.delete(f"{REACTIONS_PREFIX}{message_id}", f"{REACTIONS_PREFIX}{message_id}:users")
+            pipe.sadd(UNSAVED_REACTIONS_KEY, message_id)
+            pipe.execute()
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error clearing reactions of message {message_id}: {e}")
+            return False
+    
+    @timed('redis')
+    def take_unsaved_reactions(self, count: int) -> Optional[Dict[int, Dict[str, Tuple[int, List[str]]]]]:
+        """
+        Take up to count messages off the unsaved list, with their
+        reactions: {message_id: {emoji: (count, usernames)}}.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            reply = self.scripts.run('take_reactions', [UNSAVED_REACTIONS_KEY],
+                                     [count, REACTIONS_PREFIX, self.settings['REACTION_TTL']])
+            reactions = {}
+            for message_id, fields, members in zip(reply[::3], reply[1::3], reply[2::3]):
+                users = reaction_users(members)
+                reactions[int(message_id)] = {emoji: (emoji_count, users.get(emoji, []))
+                                              for emoji, emoji_count in reaction_counts(fields).items()}
+            return reactions
+        except Exception as e:
+            record_error(e)
+            print(f"Error taking unsaved reactions: {e}")
+            return None
+    
+    @timed('redis')
+    def set_read_marker(self, username: str, message_id: int) -> Optional[int]:
+        """
+        Move a user's read marker forward to message_id (never back).
+        Returns the marker, or None if Redis is not available.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            return int(self.scripts.run('advance_read_marker', [READ_MARKERS_KEY, UNSAVED_READ_MARKERS_KEY],
+                                        [username, message_id]))
+        except Exception as e:
+            record_error(e)
+            print(f"Error setting read marker for {username}: {e}")
+            return None
+    
+    @timed('redis')
+    def get_read_markers(self, username: str = None) -> Optional[Dict[str, int]]:
+        """Read markers by username (only username's, if given); None if Redis is not available."""
+        if not self.is_available():
+            return None
+        
+        try:
+            if username is not None:
+                marker = self.redis_client.hget(READ_MARKERS_KEY, username)
+                return {username: int(marker)} if marker else {}
+            return {name: int(marker) for name, marker in self.redis_client.hgetall(READ_MARKERS_KEY).items()}
+        except Exception as e:
+            record_error(e)
+            print(f"Error getting read markers: {e}")
+            return None
+    
+    @timed('redis')
+    def take_unsaved_read_markers(self, count: int) -> Optional[Dict[str, int]]:
+        """Take up to count users off the unsaved list, with their read markers."""
+        if not self.is_available():
+            return None
+        
+        try:
+            reply = self.scripts.run('take_read_markers', [UNSAVED_READ_MARKERS_KEY, READ_MARKERS_KEY], [count])
+            return {username: int(marker) for username, marker in zip(reply[::2], reply[1::2])}
+        except Exception as e:
+            record_error(e)
+            print(f"Error taking unsaved read markers: {e}")
+            return None
+    
+    @timed('redis')
+    def mark_receipts_unsaved(self, usernames: List[str] = (), message_ids: List[int] = ()) -> bool:
+        """Put read markers and reaction counts back on the unsaved lists (after a failed save)."""
+        if not self.is_available():
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            if usernames:
+                pipe.sadd(UNSAVED_READ_MARKERS_KEY, *usernames)
+            if message_ids:
+                pipe.sadd(UNSAVED_REACTIONS_KEY, *message_ids)
+            pipe.execute()
+            return True
+        except Exception as e:
+            record_error(e)
+            print(f"Error marking receipts unsaved: {e}")
+            return False
+    
+    # Locks (for jobs that one process at a time should run)
+    @timed('redis')
+    def acquire_lock(self, name: str, token: str, ttl: int) -> Optional[bool]:
+        """
+        Take lock:{name} for ttl seconds. Returns True if taken, False if
+        someone else holds it, None if Redis is not available.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            return bool(self.redis_client.set(f"lock:{name}", token, nx=True, ex=ttl))
+        except Exception as e:
+            record_error(e)
+            print(f"Error acquiring lock {name}: {e}")
+            return None
+    
+    @timed('redis')
+    def release_lock(self, name: str, token: str) -> bool:
+        """Release lock:{name} if it is still held with this token."""
+        if not self.is_available():
+            return False
+        
+        try:
+            return bool(self.scripts.run('release_lock', [f"lock:{name}"], [token]))
+        except Exception as e:
+            record_error(e)
+            print(f"Error releasing lock {name}: {e}")
+            return False
+    
+    @timed('redis')
+    def renew_lock(self, name: str, token: str, ttl: int) -> Optional[bool]:
+        """
+        Extend lock:{name} to ttl seconds if it is still held with this
+        token. Returns False if it was lost, None if Redis is not available.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            return bool(self.scripts.run('renew_lock', [f"lock:{name}"], [token, ttl]))
+        except Exception as e:
+            record_error(e)
+            print(f"Error renewing lock {name}: {e}")
+            return None
+    
+    @timed('redis')
+    def lease_id_node(self, token: str, ttl: int, nodes: int) -> Optional[int]:
+        """
+        Lease a free message ID node (0 .. nodes - 1) for ttl seconds, as
+        the lock id_node:{node}. Returns the node, or None if Redis is not
+        available or every node is leased.
+        """
+        if not self.is_available():
+            return None
+        
+        try:
+            node = self.scripts.run('lease_id_node', [ID_NODE_COUNTER_KEY],
+                                    [f"lock:{ID_NODE_LOCK_PREFIX}", token, ttl, nodes])
+            return node if node >= 0 else None
+        except Exception as e:
+            record_error(e)
+            print(f"Error leasing a message ID node: {e}")
+            return None
 
 # Create Redis service instance
 redis_service = RedisService()
\ No newline at end of file
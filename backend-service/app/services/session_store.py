@@ -0,0 +1,80 @@
+"""
+Redis session store for Chat Application.
+Shared session format (also used by the auth microservice):
+
+    session:{session_id}         compact JSON object, sliding TTL
+    user_sessions:{username}     set of that user's session IDs
+
+Reads refresh the TTL at most once per touch interval, so polling clients
+don't turn every read into a write. Logging a user out everywhere is
+RedisService.end_user_sessions (one atomic script).
+"""
+import json
+from typing import Dict, Optional
+
+SESSION_KEY = "session:{}"
+USER_SESSIONS_KEY = "user_sessions:{}"
+
+
+def serialize_session(data: Dict) -> str:
+    """Encode session data as compact JSON."""
+    return json.dumps(data, separators=(',', ':'), default=str)
+
+
+def deserialize_session(raw) -> Optional[Dict]:
+    """Decode session data stored by either service."""
+    if not raw:
+        return None
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return json.loads(raw)
+
+
+class SessionStore:
+    """Session storage with sliding expiry and a per-user session index."""
+
+    def __init__(self, redis_client, ttl: int = 3600, touch_interval: int = 60):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+
+    def create(self, session_id: str, data: Dict) -> None:
+        """Store a new session and add it to the user's index (one round trip)."""
+        username = data.get('username')
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.setex(SESSION_KEY.format(session_id), self.ttl, serialize_session(data))
+        if username:
+            pipe.sadd(USER_SESSIONS_KEY.format(username), session_id)
+            pipe.expire(USER_SESSIONS_KEY.format(username), self.ttl)
+        pipe.execute()
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """
+        Read a session, extending its TTL if the last refresh is older than
+        the touch interval. The read and the TTL check share one round trip.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(SESSION_KEY.format(session_id))
+        pipe.ttl(SESSION_KEY.format(session_id))
+        raw, remaining = pipe.execute()
+
+        data = deserialize_session(raw)
+        if data is None:
+            return None
+
+        if remaining is not None and 0 <= remaining < self.ttl - self.touch_interval:
+            username = data.get('username')
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.expire(SESSION_KEY.format(session_id), self.ttl)
+            if username:
+                pipe.expire(USER_SESSIONS_KEY.format(username), self.ttl)
+            pipe.execute()
+        return data
+
+    def delete(self, session_id: str, username: str = None) -> None:
+        """Delete one session and drop it from the user's index."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(SESSION_KEY.format(session_id))
+        if username:
+            pipe.srem(USER_SESSIONS_KEY.format(username), session_id)
+        pipe.execute()
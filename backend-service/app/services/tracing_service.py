@@ -0,0 +1,344 @@
+"""
+Tracing Service
+Lightweight OpenTelemetry-style tracing for the Chat Application.
+
+- One server span per API request, continuing an incoming W3C `traceparent`
+- A child span for every service-layer call instrumented with
+  monitoring_service.timed / measure (PostgreSQL, Redis, RabbitMQ, ...)
+- Trace context is injected into AMQP message headers when publishing and
+  extracted by the consumers, so a message's processing span joins the
+  trace of the request that queued it. Consumer spans carry
+  `messaging.queue_time_ms` (time spent waiting in the queue).
+
+Finished spans are exported in batches from a background thread, either
+as JSON lines to TRACING_FILE or as OTLP/HTTP JSON to TRACING_OTLP_ENDPOINT
+(an OpenTelemetry collector or any stand-in). Tracing is off by default;
+when off, instrumented calls only pay one attribute check.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+
+# AMQP header holding the publish time (ns since epoch)
+PUBLISHED_AT_HEADER = 'x-published-at'
+
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# Spans buffered for export before new ones are dropped
+MAX_QUEUED_SPANS = 10000
+
+# Spans per export batch, and the longest a span waits to be exported (seconds)
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 2.0
+
+_current_span = ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'sampled',
+                 'start_ns', 'end_ns', 'attributes', 'error', '_token')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str],
+                 kind: str = 'internal', sampled: bool = True, attributes: Dict = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self, service_name: str) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'service': service_name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'status': 'error' if self.error else 'ok',
+            'error': self.error,
+        }
+
+
+def parse_traceparent(value: Optional[str]):
+    """Return (trace_id, parent span_id, sampled) or None if invalid."""
+    if not value:
+        return None
+    match = TRACEPARENT_RE.match(value.strip().lower())
+    if not match or match.group(1) == '0' * 32 or match.group(2) == '0' * 16:
+        return None
+    return match.group(1), match.group(2), match.group(3) == '01'
+
+
+class SpanExporter:
+    """Background batch exporter writing to a JSON-lines file or OTLP/HTTP."""
+
+    def __init__(self, service_name: str, file_path: str = None, otlp_endpoint: str = None):
+        self.service_name = service_name
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self._queue = queue.Queue(MAX_QUEUED_SPANS)
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    def export(self, span: Span) -> None:
+        """Queue a finished span (never blocks the request)."""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        # Started lazily, so each forked worker gets its own thread
+        self._pid = os.getpid()
+        self._queue = queue.Queue(MAX_QUEUED_SPANS)
+        self._thread = threading.Thread(target=self._run, daemon=True, name='span-exporter')
+        self._thread.start()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            if batch and batch[-1] is None:  # close() was called
+                batch.pop()
+                stopping = True
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.warning(f"Span export failed ({len(batch)} spans dropped): {e}")
+
+    def _next_batch(self) -> List[Span]:
+        """Collect up to EXPORT_BATCH_SIZE spans, waiting at most EXPORT_INTERVAL."""
+        batch = []
+        deadline = time.monotonic() + EXPORT_INTERVAL
+        while len(batch) < EXPORT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+            if batch[-1] is None:
+                break
+        return batch
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Export the spans still queued and stop the thread (worker shutdown)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def _write(self, batch: List[Span]) -> None:
+        if self.otlp_endpoint:
+            import requests
+            requests.post(self.otlp_endpoint, json=self._otlp_payload(batch), timeout=5)
+        if self.file_path:
+            with open(self.file_path, 'a', encoding='utf-8') as f:
+                for span in batch:
+                    f.write(json.dumps(span.to_dict(self.service_name), default=str) + '\n')
+
+    def _otlp_payload(self, batch: List[Span]) -> Dict:
+        """Encode spans as an OTLP/HTTP JSON ExportTraceServiceRequest."""
+        kinds = {'internal': 1, 'server': 2, 'client': 3, 'producer': 4, 'consumer': 5}
+        spans = []
+        for span in batch:
+            spans.append({
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'parentSpanId': span.parent_id or '',
+                'name': span.name,
+                'kind': kinds.get(span.kind, 1),
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns),
+                'attributes': [{'key': key, 'value': {'stringValue': str(value)}}
+                               for key, value in span.attributes.items()],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+            })
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': self.service_name}}
+            ]},
+            'scopeSpans': [{'scope': {'name': 'connecthub'}, 'spans': spans}],
+        }]}
+
+
+class TracingService:
+    """Service for creating, propagating and exporting spans."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_ratio = 1.0
+        self.service_name = 'connecthub-backend'
+        self.exporter = None
+
+    def configure(self, settings) -> None:
+        """Apply settings from a mapping (e.g. a Flask app.config)."""
+        self.enabled = bool(settings.get('TRACING_ENABLED', False))
+        self.sample_ratio = float(settings.get('TRACING_SAMPLE_RATIO', 1.0))
+        self.service_name = settings.get('TRACING_SERVICE_NAME', self.service_name)
+        exporter = settings.get('TRACING_EXPORTER', 'file')
+        self.exporter = SpanExporter(
+            self.service_name,
+            file_path=settings.get('TRACING_FILE') if exporter in ('file', 'both') else None,
+            otlp_endpoint=settings.get('TRACING_OTLP_ENDPOINT') if exporter in ('otlp', 'both') else None,
+        )
+
+    def close(self) -> None:
+        """Export any spans not yet written."""
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(self, name: str, kind: str = 'internal', attributes: Dict = None,
+                   traceparent: str = None) -> Span:
+        """
+        Start a span and make it current. Its parent is the remote context in
+        `traceparent` if given, otherwise the current span (a new trace if none).
+        """
+        remote = parse_traceparent(traceparent)
+        parent = _current_span.get()
+        if remote:
+            trace_id, parent_id, sampled = remote
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < self.sample_ratio
+        span = Span(name, trace_id, parent_id, kind, sampled, attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span: Span, error: BaseException = None) -> None:
+        """Finish a span, restore its parent as current and queue it for export."""
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            _current_span.set(None)  # Ended in a different context
+        if span.sampled and self.exporter is not None:
+            self.exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'internal', attributes: Dict = None, traceparent: str = None):
+        """Context manager around start_span/end_span (no-op when tracing is off)."""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, kind, attributes, traceparent)
+        try:
+            yield span
+        except Exception as e:
+            self.end_span(span, e)
+            raise
+        self.end_span(span)
+
+    # Propagation
+    def inject(self, headers: Dict) -> Dict:
+        """Add the current trace context and publish time to message headers."""
+        span = _current_span.get()
+        if self.enabled and span is not None:
+            headers[TRACEPARENT_HEADER] = span.traceparent
+            headers[PUBLISHED_AT_HEADER] = time.time_ns()
+        return headers
+
+    @contextmanager
+    def consume(self, queue_name: str, headers: Optional[Dict]):
+        """Consumer span continuing the producer's trace from message headers."""
+        headers = headers or {}
+        with self.span(f"{queue_name} process", kind='consumer',
+                       attributes={'messaging.system': 'rabbitmq', 'messaging.destination': queue_name},
+                       traceparent=headers.get(TRACEPARENT_HEADER)) as span:
+            published_at = headers.get(PUBLISHED_AT_HEADER)
+            if span is not None and published_at:
+                span.set_attribute('messaging.queue_time_ms', round((span.start_ns - int(published_at)) / 1e6, 3))
+            yield span
+
+    # Flask integration
+    def before_request(self):
+        """Start the server span, continuing the caller's trace if any."""
+        span = self.start_span(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            kind='server',
+            attributes={'http.method': request.method, 'http.target': request.path},
+            traceparent=request.headers.get(TRACEPARENT_HEADER)
+        )
+        g.trace_span = span
+
+    def after_request(self, response):
+        """Record the status and expose the trace context to the client."""
+        span = g.get('trace_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            response.headers[TRACEPARENT_HEADER] = span.traceparent
+        return response
+
+    def teardown_request(self, exc=None):
+        """End the server span (also runs when the view raised)."""
+        span = g.pop('trace_span', None)
+        if span is not None:
+            self.end_span(span, exc)
+
+    def register_middleware(self, app):
+        """
+        Register tracing with Flask app.
+        Call this in your app factory.
+        """
+        self.configure(app.config)
+        if not self.enabled:
+            logger.info("Tracing disabled")
+            return
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+        logger.info(f"✅ Tracing registered (sample ratio {self.sample_ratio})")
+
+
+# Singleton instance
+tracing_service = TracingService()
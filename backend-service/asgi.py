@@ -0,0 +1,14 @@
+"""
+ASGI entry point for the high-concurrency chat endpoints.
+Served by Uvicorn alongside the Gunicorn/Flask app (see app/aio/asgi.py
+for the routes it handles):
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 --workers 4
+
+Both apps must share SECRET_KEY so the session cookie is accepted here.
+Async dependencies are listed in requirements-async.txt.
+"""
+from app.aio.asgi import create_asgi_app
+
+# Create ASGI application
+app = create_asgi_app()
@@ -0,0 +1,80 @@
+"""
+Serialization microbenchmark for API list responses.
+
+Compares the old route path (per-row .isoformat() + stdlib json) with the
+JSON provider's stdlib and orjson backends, plus chunked streaming, over
+message payloads shaped like GET /api/chat/messages.
+
+Usage (from backend-service/):
+    python benchmarks/bench_json.py [--sizes 10000 100000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from app.services.json_service import JSONProvider, orjson
+
+
+def make_messages(count):
+    """Build message rows as the route does, with datetime values."""
+    start = datetime(2024, 1, 1)
+    return [{
+        'id': i,
+        'user_id': None,
+        'username': f'user{i % 50}',
+        'content': f'message number {i} with a bit of text to make it realistic',
+        'created_at': start + timedelta(seconds=i, microseconds=i % 1000)
+    } for i in range(count)]
+
+
+def legacy_encode(messages):
+    """What the routes did before: isoformat per row, then stdlib json."""
+    rows = []
+    for msg in messages:
+        row = dict(msg)
+        row['created_at'] = msg['created_at'].isoformat()
+        rows.append(row)
+    return json.dumps({'success': True, 'messages': rows, 'count': len(rows)}).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON serialization microbenchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    stdlib = JSONProvider('stdlib')
+    candidates = [
+        ('legacy (isoformat + json)', legacy_encode),
+        ('provider stdlib', lambda m: stdlib.dumps({'success': True, 'messages': m, 'count': len(m)})),
+        ('provider stdlib streamed', lambda m: b''.join(stdlib.iter_array_document({'success': True}, 'messages', m))),
+    ]
+    if orjson is not None:
+        fast = JSONProvider('orjson')
+        candidates += [
+            ('provider orjson', lambda m: fast.dumps({'success': True, 'messages': m, 'count': len(m)})),
+            ('provider orjson streamed', lambda m: b''.join(fast.iter_array_document({'success': True}, 'messages', m))),
+        ]
+    else:
+        print("orjson not installed - only stdlib backends measured")
+
+    for size in args.sizes:
+        messages = make_messages(size)
+        reference = json.loads(legacy_encode(messages))
+        print(f"\n{size:,} messages")
+        baseline = None
+        for name, encode in candidates:
+            assert json.loads(encode(messages)) == reference, f"{name} output differs"
+            best = min(timeit.repeat(lambda: encode(messages), number=1, repeat=args.repeat))
+            baseline = baseline or best
+            print(f"  {name:<28} {best * 1000:9.1f} ms  {size / best / 1e6:6.2f} M rows/s  x{baseline / best:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Per-request overhead of the Prometheus middleware.
+
+Times the before/after request hooks directly inside a request context,
+for the previous implementation (label lookups on every request), the
+current one (cached label children) and an excluded path (/health), plus
+end-to-end requests through the Flask test client with and without the
+middleware.
+
+Usage (from backend-service/):
+    python benchmarks/bench_metrics.py [--requests 20000] [--repeat 5]
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty directory to measure
+multiprocess mode, where every metric update is an mmap write.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import Flask, Response, g, request
+from prometheus_client import Counter, Gauge, Histogram
+from app.services.monitoring_service import MonitoringService, MULTIPROCESS
+
+# The middleware as it was before label children were cached
+legacy_total = Counter('legacy_http_requests_total', 'Legacy', ['method', 'endpoint', 'status'])
+legacy_duration = Histogram('legacy_http_request_duration_seconds', 'Legacy', ['method', 'endpoint'])
+legacy_in_progress = Gauge('legacy_http_requests_in_progress', 'Legacy', ['method', 'endpoint'],
+                           multiprocess_mode='livesum')
+
+
+def legacy_before_request():
+    g.start_time = time.time()
+    endpoint = request.endpoint or 'unknown'
+    legacy_in_progress.labels(method=request.method, endpoint=endpoint).inc()
+
+
+def legacy_after_request(response):
+    request_latency = time.time() - g.start_time if hasattr(g, 'start_time') else 0
+    endpoint = request.endpoint or 'unknown'
+    legacy_total.labels(method=request.method, endpoint=endpoint, status=response.status_code).inc()
+    legacy_duration.labels(method=request.method, endpoint=endpoint).observe(request_latency)
+    legacy_in_progress.labels(method=request.method, endpoint=endpoint).dec()
+    return response
+
+
+def make_app(before=None, after=None):
+    """Tiny app with one API route and a health route."""
+    app = Flask(__name__)
+
+    @app.route('/api/chat/messages')
+    def messages():
+        return Response(b'{}', mimetype='application/json')
+
+    @app.route('/health')
+    def health():
+        return Response(b'{}', mimetype='application/json')
+
+    if before:
+        app.before_request(before)
+        app.after_request(after)
+    return app
+
+
+def hook_cost(app, path, before, after, count):
+    """Seconds per before+after pair inside a live request context."""
+    response = Response(b'{}')
+    with app.test_request_context(path):
+        request.url_rule, request.view_args = app.url_map.bind('localhost').match(path, return_rule=True)
+        start = time.perf_counter()
+        for _ in range(count):
+            before()
+            after(response)
+        return (time.perf_counter() - start) / count
+
+
+def request_cost(app, count):
+    """Seconds per end-to-end test-client request."""
+    client = app.test_client()
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get('/api/chat/messages')
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics middleware overhead")
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Prometheus mode: {'multiprocess' if MULTIPROCESS else 'single process'}")
+    app = make_app()
+    hooks = [
+        ('legacy hooks, /api path', '/api/chat/messages', legacy_before_request, legacy_after_request),
+        ('current hooks, /api path', '/api/chat/messages',
+         MonitoringService.before_request, MonitoringService.after_request),
+        ('current hooks, /health (skipped)', '/health',
+         MonitoringService.before_request, MonitoringService.after_request),
+    ]
+    print("\nHook cost per request")
+    for name, path, before, after in hooks:
+        best = min(hook_cost(app, path, before, after, args.requests) for _ in range(args.repeat))
+        print(f"  {name:<34} {best * 1e6:8.2f} us")
+
+    print("\nEnd-to-end test client request")
+    apps = [
+        ('no middleware', make_app()),
+        ('legacy middleware', make_app(legacy_before_request, legacy_after_request)),
+        ('current middleware', make_app(MonitoringService.before_request, MonitoringService.after_request)),
+    ]
+    count = args.requests // 4
+    best = {name: float('inf') for name, _ in apps}
+    for _ in range(args.repeat):
+        # Interleave the apps so drift affects them equally
+        for name, app in apps:
+            best[name] = min(best[name], request_cost(app, count))
+    baseline = best['no middleware']
+    for name, _ in apps:
+        print(f"  {name:<34} {best[name] * 1e6:8.2f} us  (+{(best[name] - baseline) * 1e6:.2f} us)")
+
+if __name__ == '__main__':
+    main()
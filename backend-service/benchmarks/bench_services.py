@@ -0,0 +1,291 @@
+"""
+Microbenchmarks for service-layer primitives.
+
+Each case times one call in isolation: a timeit-style calibration picks
+the loop count so a round lasts at least --min-time, then --repeat rounds
+run with the garbage collector off. Min and median per call are reported;
+min is the most stable figure on a busy laptop, and the spread (stdev as
+a percentage of the median) shows how much to trust it.
+
+Each case seeds its own data first, so --filter also skips the seeding of
+cases it leaves out.
+
+Cases:
+    db.create_chat_message
+    db.get_all_messages[rows]        --message-rows (default 1k, 100k, 1M)
+    redis.get_online_users[members]  --online-members (default 10, 10k)
+    redis.get_typing_users[keys]     --keyspace (default 100k other keys)
+    queue.queue_message_processing
+    json.encode_messages[rows]       JSONProvider with the configured backend
+    pipeline.<stage>[batch]          one message-pipeline stage over a batch
+                                     (--pipeline-batch, default 100)
+
+The database is in-memory SQLite unless DATABASE_URL is set. Redis is
+fakeredis unless --real-redis is given (then REDIS_HOST/REDIS_PORT), and
+the queue is the in-memory broker unless --real-queue is given (then
+RABBITMQ_HOST). With the fakes, numbers measure this code rather than the
+network.
+
+Usage (from backend-service/):
+    python benchmarks/bench_services.py [--filter redis] [--output after.json]
+    python benchmarks/bench_services.py --baseline before.json
+"""
+import argparse
+import contextlib
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+SEED_BATCH = 10000
+
+
+def measure(func, min_time, repeat):
+    """Seconds per call for each round (timeit disables GC while timing)."""
+    timer = timeit.Timer(func)
+    func()  # warm-up: caches, lazy connections, prepared statements
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.2))
+    return loops, [t / loops for t in timer.repeat(repeat, loops)]
+
+
+def human(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+# Cases
+def database_cases(args):
+    from sqlalchemy import delete, func, insert, select
+    from app.models import ChatMessage, create_tables, get_db_session
+    from app.services.database import db_service
+    from app.services.id_service import id_for_datetime
+
+    create_tables()
+
+    def row_count():
+        db = get_db_session()
+        try:
+            return db.execute(select(func.count()).select_from(ChatMessage)).scalar()
+        finally:
+            db.close()
+
+    def seed_row(i):
+        timestamp = datetime(2024, 1, 1) + timedelta(seconds=i)
+        message_id = id_for_datetime(timestamp)
+        return {'id': message_id, 'revision': message_id, 'username': f"user{i % 50}",
+                'message': f"message number {i} with some text", 'timestamp': timestamp}
+
+    def seed(target):
+        """Top the table up to `target` rows."""
+        db = get_db_session()
+        try:
+            for offset in range(row_count(), target, SEED_BATCH):
+                db.execute(insert(ChatMessage), [
+                    seed_row(i) for i in range(offset, min(offset + SEED_BATCH, target))
+                ])
+                db.commit()
+        finally:
+            db.close()
+
+    def clear():
+        db = get_db_session()
+        try:
+            db.execute(delete(ChatMessage))
+            db.commit()
+        finally:
+            db.close()
+
+    def create_messages():
+        clear()
+        return lambda: db_service.create_chat_message('bench', 'a benchmark message')
+
+    yield 'db.create_chat_message', create_messages
+
+    for rows in sorted(args.message_rows):
+        def all_messages(rows=rows):
+            db = get_db_session()
+            try:
+                db.execute(delete(ChatMessage).where(ChatMessage.username == 'bench'))
+                db.commit()
+            finally:
+                db.close()
+            if row_count() > rows:
+                clear()
+            seed(rows)
+            return db_service.get_all_messages
+
+        yield f"db.get_all_messages[{rows}]", all_messages
+
+
+def redis_cases(args):
+    from app.services.redis_service import redis_service
+
+    client = redis_service.redis_client
+    if client is None:
+        print("  skipped: Redis not available", file=sys.stderr)
+        return
+
+    for members in args.online_members:
+        def online_users(members=members):
+            client.flushdb()
+            pipe = client.pipeline(transaction=False)
+            for i in range(members):
+                pipe.sadd('online_users', f"user{i}")
+                pipe.setex(f"user_online:user{i}", 3600, 'true')
+            pipe.execute()
+            return redis_service.get_online_users
+
+        yield f"redis.get_online_users[{members}]", online_users
+
+    def typing_users():
+        client.flushdb()
+        pipe = client.pipeline(transaction=False)
+        for i in range(args.keyspace):
+            pipe.set(f"cache:key:{i}", 'x')
+            if i % SEED_BATCH == 0:
+                pipe.execute()
+        for i in range(args.typing_users):
+            pipe.setex(f"typing:general:user{i}", 3600, 'true')
+        pipe.execute()
+        return redis_service.get_typing_users
+
+    yield f"redis.get_typing_users[{args.keyspace}]", typing_users
+
+
+def queue_cases(args):
+    from app.services.queue_service import queue_service
+
+    if not queue_service.is_available():
+        print("  skipped: RabbitMQ not available", file=sys.stderr)
+        return
+    def message_processing():
+        from app.services.memory_broker import memory_broker
+        memory_broker.purge()
+        message = {'id': 1, 'username': 'bench', 'message': 'a benchmark message'}
+        return lambda: queue_service.queue_message_processing(message)
+
+    yield 'queue.queue_message_processing', message_processing
+
+
+def json_cases(args):
+    from app.services.json_service import JSONProvider
+    from config import Config
+
+    provider = JSONProvider(Config.JSON_BACKEND)
+    start = datetime(2024, 1, 1)
+    for rows in args.json_rows:
+        def encode_messages(rows=rows):
+            messages = [{
+                'id': None, 'user_id': None, 'username': f"user{i % 50}",
+                'content': f"message number {i} with some text", 'created_at': start + timedelta(seconds=i)
+            } for i in range(rows)]
+            document = {'success': True, 'messages': messages, 'count': rows}
+            return lambda: provider.dumps(document)
+
+        yield f"json.encode_messages[{rows}]", encode_messages
+
+
+def pipeline_cases(args):
+    from app.services.message_pipeline import message_pipeline
+    from app.services.pipeline_stages import STAGES, PipelineMessage
+
+    words = ['hello', 'there', 'anyone', 'up', 'for', 'lunch', 'free', 'money', 'click', 'here', 'ok']
+    texts = [' '.join(words[(i * 7 + j) % len(words)] for j in range(i % 12 + 3)) for i in range(args.pipeline_batch)]
+    settings = dict(message_pipeline.settings, BLOCKLIST_TERMS=[f"blocked{i}" for i in range(1000)])
+    for name, stage_class in STAGES.items():
+        def run_stage(stage_class=stage_class):
+            stage = stage_class(settings)
+            return lambda: stage.process([PipelineMessage(i, f"user{i % 50}", text) for i, text in enumerate(texts)])
+
+        yield f"pipeline.{name}[{args.pipeline_batch}]", run_stage
+
+
+GROUPS = [database_cases, redis_cases, queue_cases, json_cases, pipeline_cases]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service-layer microbenchmarks",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--filter', default='*', help="Glob on case names, e.g. 'redis.*'")
+    parser.add_argument('--repeat', type=int, default=7, help="Timed rounds per case")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Minimum seconds per round")
+    parser.add_argument('--message-rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--online-members', type=int, nargs='+', default=[10, 10000])
+    parser.add_argument('--keyspace', type=int, default=100000, help="Unrelated keys next to typing keys")
+    parser.add_argument('--typing-users', type=int, default=20)
+    parser.add_argument('--json-rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--pipeline-batch', type=int, default=100, help="Messages per pipeline batch")
+    parser.add_argument('--real-redis', action='store_true', help="Use the Redis at REDIS_HOST")
+    parser.add_argument('--real-queue', action='store_true', help="Use the RabbitMQ at RABBITMQ_HOST")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Results JSON of a previous run to compare with")
+    args = parser.parse_args()
+
+    # Read by config.py, which is imported with the services below
+    os.environ['REDIS_BACKEND'] = 'redis' if args.real_redis else 'fake'
+    os.environ['QUEUE_BACKEND'] = 'rabbitmq' if args.real_queue else 'memory'
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    print(f"{'case':<40} {'loops':>7} {'min':>12} {'median':>12} {'stdev':>7}" + ('  vs baseline' if baseline else ''))
+    for group in GROUPS:
+        # Services print on every call; keep the table readable
+        with open(os.devnull, 'w') as devnull:
+            cases = group(args)
+            while True:
+                with contextlib.redirect_stdout(devnull):
+                    name, prepare = next(cases, (None, None))
+                if name is None:
+                    break
+                if not fnmatch.fnmatch(name, args.filter):
+                    continue
+                with contextlib.redirect_stdout(devnull):
+                    loops, rounds = measure(prepare(), args.min_time, args.repeat)
+                median = statistics.median(rounds)
+                spread = statistics.stdev(rounds) / median * 100 if len(rounds) > 1 else 0.0
+                results[name] = {'loops': loops, 'min': min(rounds), 'median': median,
+                                 'stdev_pct': round(spread, 2), 'rounds': rounds}
+                line = f"{name:<40} {loops:>7} {human(min(rounds)):>12} {human(median):>12} {spread:>6.1f}%"
+                if name in baseline:
+                    line += f"  {(median - baseline[name]['median']) / baseline[name]['median'] * 100:>+7.1f}%"
+                print(line, flush=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'database_url': os.environ['DATABASE_URL'].rsplit('@', 1)[-1],
+                    'redis': 'real' if args.real_redis else 'fakeredis',
+                    'queue': 'rabbitmq' if args.real_queue else 'memory',
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
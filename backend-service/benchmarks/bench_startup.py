@@ -0,0 +1,88 @@
+"""
+Startup-time benchmark with Redis and RabbitMQ unreachable.
+
+Each run is a fresh interpreter that times `import app`, `create_app()` and
+the first `is_available()` call of each service. Services connect lazily,
+so an unreachable broker should only cost time on that first use (bounded
+by REDIS_CONNECT_TIMEOUT / RABBITMQ_CONNECT_TIMEOUT), never at import.
+
+Usage (from backend-service/):
+    python benchmarks/bench_startup.py [--runs 5] [--host 10.255.255.1]
+
+The default host refuses connections immediately; pass a blackholed
+address to measure the connect-timeout path instead.
+With --config testing, Redis and the queue are the in-process fakes
+(REDIS_BACKEND=fake, QUEUE_BACKEND=memory) and no host is contacted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = r"""
+import json, os, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app_instance = app.create_app(os.environ['BENCH_CONFIG'], start_workers=False)
+t2 = time.perf_counter()
+from app.services.redis_service import redis_service
+redis_service.is_available()
+t3 = time.perf_counter()
+from app.services.queue_service import queue_service
+queue_service.is_available()
+t4 = time.perf_counter()
+print('RESULT ' + json.dumps({
+    'import': t1 - t0,
+    'create_app': t2 - t1,
+    'first redis check': t3 - t2,
+    'first queue check': t4 - t3,
+}))
+"""
+
+
+def run_once(env):
+    """Run one cold start and return its phase timings."""
+    out = subprocess.run(
+        [sys.executable, '-c', CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(l for l in out.splitlines() if l.startswith('RESULT '))
+    return json.loads(line[len('RESULT '):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="Address used for Redis and RabbitMQ")
+    parser.add_argument('--port', type=int, default=1,
+                        help="Port used for both (default: a closed port)")
+    parser.add_argument('--config', default='development',
+                        help="Config name; 'testing' uses the in-process fakes")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': 'sqlite://',
+        'REDIS_HOST': args.host,
+        'REDIS_PORT': str(args.port),
+        'RABBITMQ_HOST': args.host,
+        'RABBITMQ_PORT': str(args.port),
+        'BENCH_CONFIG': args.config,
+    })
+
+    results = [run_once(env) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts ({args.config}), services at {args.host}:{args.port}")
+    for phase in results[0]:
+        samples = [r[phase] * 1000 for r in results]
+        print(f"  {phase:<20} median {statistics.median(samples):8.1f} ms  "
+              f"min {min(samples):8.1f} ms  max {max(samples):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
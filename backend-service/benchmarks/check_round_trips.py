@@ -0,0 +1,217 @@
+"""
+Round-trip budget check for RedisService.
+
+Counts the requests each operation sends to Redis (a pipeline or a Lua
+script counts as one) and exits non-zero if any operation needs more than
+its budget, so a change that splits a script back into separate calls is
+caught before it ships. Operations run against seeded data (many online
+users, several sessions per user), so a budget holds at any size.
+
+Redis is fakeredis unless --real-redis is given (then REDIS_HOST/REDIS_PORT;
+the check writes keys, so use a scratch database). The test suite runs the
+same checks against fakeredis (tests/test_redis_round_trips.py).
+
+Usage (from backend-service/):
+    python benchmarks/check_round_trips.py [--real-redis] [--online-users 1000]
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Round trips allowed per operation
+BUDGETS = {
+    'store_session': 1,
+    'get_session': 1,
+    'get_online_users': 1,
+    'end_session': 1,
+    'end_user_sessions': 1,
+    'purge_user': 1,
+    'get_data_version': 1,
+    'bump_data_version': 1,
+    'check_rate_limits': 1,
+    'record_message_fingerprints': 1,
+    'publish_new_message': 1,
+    'increment_message_count': 1,
+    'append_to_journal': 1,
+    'react': 1,
+    'get_reactions': 1,
+    'take_unsaved_reactions': 1,
+    'set_read_marker': 1,
+    'take_unsaved_read_markers': 1,
+    'lease_id_node': 1,
+    'renew_lock': 1,
+    # EVALSHA -> NOSCRIPT, SCRIPT LOAD, EVALSHA again
+    'get_online_users after SCRIPT FLUSH': 3,
+}
+
+
+class RoundTripCounter:
+    """Counts requests written to Redis connections while active."""
+
+    def __init__(self):
+        self.count = 0
+
+    @contextlib.contextmanager
+    def counting(self):
+        from redis.connection import Connection
+        original = Connection.send_packed_command
+
+        def send_packed_command(connection, command, check_health=True):
+            self.count += 1
+            return original(connection, command, check_health)
+
+        Connection.send_packed_command = send_packed_command
+        try:
+            yield self
+        finally:
+            Connection.send_packed_command = original
+
+
+def operations(redis_service, args):
+    """Yield (name, setup, operation, check): check(result) returns an error or None."""
+    client = redis_service.redis_client
+
+    def seed_online():
+        client.delete('online_users')
+        pipe = client.pipeline(transaction=False)
+        for i in range(args.online_users):
+            pipe.sadd('online_users', f"user{i}")
+            if i % 2 == 0:  # The other half has expired
+                pipe.setex(f"user_online:user{i}", 300, 'true')
+        pipe.execute()
+
+    seeded = {}
+
+    def seed_sessions():
+        for i in range(args.sessions):
+            redis_service.store_session(f"check-{i}", {'username': 'checker', 'user_id': '1'})
+        redis_service.add_online_user('checker')
+        client.set('user_cache:checker', '{}')
+        client.set('message_count:checker', 3)
+        seeded['sessions'] = client.scard('user_sessions:checker')
+
+    def expect(value):
+        return lambda result: None if result == value else f"returned {result!r}, expected {value!r}"
+
+    def expect_seeded(result):
+        return None if result == seeded['sessions'] else f"{result} sessions, expected {seeded['sessions']}"
+
+    online = args.online_users // 2
+    yield 'store_session', None, lambda: redis_service.store_session('check-x', {'username': 'checker'}), expect(True)
+    yield 'get_session', None, lambda: redis_service.get_session('check-x'), \
+        lambda result: None if result else "session not found"
+    yield 'get_online_users', seed_online, redis_service.get_online_users, \
+        lambda result: None if len(result) == online else f"{len(result)} users, expected {online}"
+    yield 'end_session', seed_sessions, lambda: redis_service.end_session('check-0', 'checker'), expect(True)
+    yield 'end_user_sessions', seed_sessions, lambda: redis_service.end_user_sessions('checker'), expect_seeded
+    yield 'purge_user', seed_sessions, lambda: redis_service.purge_user('checker'), expect_seeded
+    yield 'get_data_version', None, lambda: redis_service.get_data_version('check'), \
+        lambda result: None if result else "no version"
+    yield 'bump_data_version', None, lambda: redis_service.bump_data_version('check', max_key=5), expect(True)
+    yield 'check_rate_limits', None, lambda: redis_service.check_rate_limits(
+        ['check:rate:1', 'check:rate:0', 'check:duplicate'], [10, 1, 10, 10, '0.5']), expect([0])
+    yield 'record_message_fingerprints', None, lambda: redis_service.record_message_fingerprints(
+        [(f"user{i}", f"{i:016x}") for i in range(100)], 60, 60), \
+        lambda result: None if result and len(result) == 100 else "wrong result"
+    yield 'publish_new_message', None, lambda: redis_service.publish_new_message(1), expect(True)
+    yield 'increment_message_count', None, lambda: redis_service.increment_message_count('checker'), \
+        lambda result: None if result else "no count"
+    yield 'append_to_journal', lambda: client.delete('check:journal'), lambda: redis_service.append_to_journal(
+        'check:journal', {'username': 'checker', 'message': 'hi'}, 10), \
+        lambda result: None if result else "not appended"
+
+    message_ids = list(range(1, args.messages + 1))
+
+    def seed_reactions():
+        client.delete('unsaved_reactions', *[f"reactions:{message_id}{suffix}"
+                                             for message_id in message_ids for suffix in ('', ':users')])
+        for message_id in message_ids:
+            redis_service.react(message_id, 'checker', '+1')
+
+    def seed_read_markers():
+        client.delete('unsaved_read_markers')
+        for i in range(args.online_users):
+            redis_service.set_read_marker(f"user{i}", 1000 + i)
+
+    yield 'react', None, lambda: redis_service.react(1, 'other', '+1', saved={'+1': (2, ['a', 'b'])}), \
+        lambda result: None if result and result.get('+1') else f"returned {result!r}"
+    yield 'get_reactions', seed_reactions, lambda: redis_service.get_reactions(message_ids), \
+        lambda result: None if result and len(result) == len(message_ids) else "missing counts"
+    yield 'take_unsaved_reactions', seed_reactions, lambda: redis_service.take_unsaved_reactions(len(message_ids)), \
+        lambda result: None if result and len(result) == len(message_ids) else "missing counts"
+    yield 'set_read_marker', None, lambda: redis_service.set_read_marker('checker', 2 ** 62 + 1), expect(2 ** 62 + 1)
+    yield 'take_unsaved_read_markers', seed_read_markers, \
+        lambda: redis_service.take_unsaved_read_markers(args.online_users), \
+        lambda result: None if result and len(result) == args.online_users else "missing markers"
+
+    def seed_id_nodes():
+        # Most nodes are leased by other workers already
+        client.delete('id_node:next', *[f"lock:id_node:{node}" for node in range(1024)])
+        pipe = client.pipeline(transaction=False)
+        for node in range(1000):
+            pipe.set(f"lock:id_node:{node}", 'other', ex=60)
+        pipe.execute()
+
+    yield 'lease_id_node', seed_id_nodes, lambda: redis_service.lease_id_node('checker', 60, 1024), \
+        lambda result: None if result is not None and result >= 1000 else f"returned {result!r}"
+    yield 'renew_lock', lambda: client.set('lock:check', 'checker'), \
+        lambda: redis_service.renew_lock('check', 'checker', 60), expect(True)
+
+    def flush_scripts():
+        seed_online()
+        client.script_flush()
+
+    yield 'get_online_users after SCRIPT FLUSH', flush_scripts, redis_service.get_online_users, \
+        lambda result: None if len(result) == online else f"{len(result)} users, expected {online}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis round-trip budget check",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--real-redis', action='store_true', help="Use the Redis at REDIS_HOST")
+    parser.add_argument('--online-users', type=int, default=1000, help="Members of online_users")
+    parser.add_argument('--sessions', type=int, default=5, help="Sessions of the test user")
+    parser.add_argument('--messages', type=int, default=100, help="Messages with reactions")
+    args = parser.parse_args()
+
+    # Read by config.py, which is imported with the service below
+    os.environ['REDIS_BACKEND'] = 'redis' if args.real_redis else 'fake'
+
+    from app.services.redis_service import redis_service
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        available = redis_service.is_available()
+    if not available:
+        print("Redis not available", file=sys.stderr)
+        return 2
+
+    counter = RoundTripCounter()
+    failures = 0
+    print(f"{'operation':<40} {'round trips':>11} {'budget':>7}")
+    for name, setup, operation, check in operations(redis_service, args):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if setup:
+                setup()
+            counter.count = 0
+            with counter.counting():
+                result = operation()
+        error = check(result)
+        budget = BUDGETS[name]
+        status = 'ok'
+        if counter.count > budget:
+            status = 'OVER BUDGET'
+        if error:
+            status = f"WRONG RESULT: {error}"
+        if status != 'ok':
+            failures += 1
+        print(f"{name:<40} {counter.count:>11} {budget:>7}  {status}")
+
+    print(f"\n{failures} failure(s)" if failures else "\nAll operations within budget")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,437 @@
+"""
+Load test for the chat API.
+
+Seeds N users and M messages, then runs C virtual users for a fixed
+duration. Each virtual user logs in, polls GET /api/chat/messages every
+--poll-interval seconds (with If-None-Match, like the React client) and
+in between performs weighted actions with exponential think time:
+
+    send        POST /api/chat/send
+    typing      POST /api/chat/typing
+    typing_get  GET  /api/chat/typing
+    online      GET  /api/users/online
+    login       POST /api/auth/login (a fresh session)
+
+Reports RPS and p50/p95/p99 latency per endpoint and writes them as JSON,
+so a branch can be compared with a baseline run of main.
+
+Targets:
+    (default)   the app served in-process by a threaded WSGI server, on a
+                temporary SQLite database, fakeredis and the in-memory
+                queue broker (REDIS_BACKEND=fake, QUEUE_BACKEND=memory)
+    --url URL   an already running server, e.g. the docker-compose stack;
+                start it with RATE_LIMIT_ENABLED=false, as every virtual
+                user comes from the same IP
+
+Usage (from backend-service/):
+    python benchmarks/loadtest.py --users 200 --messages 5000 --concurrency 50 \\
+        --duration 60 --output results.json
+    python benchmarks/loadtest.py ... --baseline main.json --max-regression 10
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+PASSWORD = 'loadtest-password'
+
+DEFAULT_MIX = 'send=1,typing=2,typing_get=3,online=2,login=0.1'
+
+# Endpoint name -> (method, path)
+ENDPOINTS = {
+    'login': ('POST', '/api/auth/login'),
+    'poll': ('GET', '/api/chat/messages'),
+    'send': ('POST', '/api/chat/send'),
+    'typing': ('POST', '/api/chat/typing'),
+    'typing_get': ('GET', '/api/chat/typing'),
+    'online': ('GET', '/api/users/online'),
+}
+
+
+def username(index: int) -> str:
+    return f"load_user_{index}"
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of a sorted, non-empty list."""
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def parse_mix(value: str):
+    """'send=1,typing=2' -> (['send', 'typing'], [1.0, 2.0])"""
+    names, weights = [], []
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS or name == 'poll':
+            raise argparse.ArgumentTypeError(f"unknown action in mix: {name}")
+        if float(weight) > 0:
+            names.append(name)
+            weights.append(float(weight))
+    return names, weights
+
+
+# In-process target
+@contextlib.contextmanager
+def serve_in_process(args):
+    """Serve the app on 127.0.0.1 in a background thread; yields its base URL."""
+    tmpdir = tempfile.mkdtemp(prefix='loadtest-')
+    # A file rather than in-memory SQLite, so request threads get their own connections
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'chat.db')}"
+    os.environ.setdefault('REDIS_BACKEND', 'fake')
+    os.environ.setdefault('QUEUE_BACKEND', 'memory')
+    # All virtual users share one IP, so per-IP limits would reject most requests
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    if args.hash_method:
+        os.environ['PASSWORD_HASH_METHOD'] = args.hash_method
+    os.environ.setdefault('HASH_WORKERS', '0')
+    sys.path.insert(0, BACKEND_DIR)
+
+    import logging
+    from werkzeug.serving import make_server
+    from app import create_app, close_services
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        app = create_app('development')
+        app.debug = False
+        seed_database(args)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_port}"
+        finally:
+            server.shutdown()
+            close_services()
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def seed_database(args):
+    """Insert users (sharing one password hash) and messages directly."""
+    from sqlalchemy import insert
+    from app.models import ChatMessage, User, get_db_session
+    from app.services.hashing_service import hashing_service
+    from app.services.id_service import id_for_datetime
+
+    password_hash = hashing_service.hash_password(PASSWORD)
+    start = datetime.utcnow() - timedelta(seconds=args.messages)
+
+    def seed_message(i):
+        timestamp = start + timedelta(seconds=i)
+        message_id = id_for_datetime(timestamp)
+        return {'id': message_id, 'revision': message_id, 'username': username(i % args.users),
+                'message': f"seed message {i}", 'timestamp': timestamp}
+
+    db = get_db_session()
+    try:
+        db.execute(insert(User), [
+            {'id': f"{i:09d}", 'username': username(i), 'password': password_hash,
+             'classification': 'B', 'email': f"{username(i)}@example.com"}
+            for i in range(args.users)
+        ])
+        for offset in range(0, args.messages, 10000):
+            db.execute(insert(ChatMessage), [
+                seed_message(i) for i in range(offset, min(offset + 10000, args.messages))
+            ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def seed_over_http(base_url, args):
+    """Register users and send messages through the API (for --url targets)."""
+    def register(index):
+        requests.post(f"{base_url}/api/auth/register", json={
+            'username': username(index), 'password': PASSWORD,
+            'email': f"{username(index)}@example.com"
+        }, timeout=30)
+
+    run_parallel(register, range(args.users), args.concurrency)
+
+    senders = min(args.users, args.concurrency)
+    sessions = []
+    for index in range(senders):
+        session = requests.Session()
+        session.post(f"{base_url}/api/auth/login",
+                     json={'username': username(index), 'password': PASSWORD}, timeout=30)
+        sessions.append(session)
+
+    def send(index):
+        sessions[index % senders].post(f"{base_url}/api/chat/send",
+                                       json={'content': f"seed message {index}"}, timeout=30)
+
+    run_parallel(send, range(args.messages), senders)
+
+
+def run_parallel(func, items, concurrency):
+    items = list(items)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not items:
+                    return
+                item = items.pop()
+            func(item)
+
+    threads = [threading.Thread(target=worker) for _ in range(max(concurrency, 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+# Virtual users
+class VirtualUser(threading.Thread):
+    """One simulated client; records (endpoint, latency, status) samples."""
+
+    def __init__(self, index, base_url, args, actions, weights, start_at, record_from, stop_at):
+        super().__init__(daemon=True)
+        self.index = index
+        self.base_url = base_url
+        self.args = args
+        self.actions = actions
+        self.weights = weights
+        self.start_at = start_at
+        self.record_from = record_from
+        self.stop_at = stop_at
+        self.random = random.Random(args.seed * 100003 + index)
+        self.session = requests.Session()
+        self.etag = None
+        self.sent = 0
+        self.samples = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    def request(self, name, **kwargs):
+        method, path = ENDPOINTS[name]
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=30, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        elapsed = time.perf_counter() - start
+        if time.monotonic() >= self.record_from:
+            self.samples[name].append(elapsed * 1000)
+            if status == 0 or status >= 400:
+                self.failures[name] += 1
+        return response
+
+    def login(self):
+        self.session.cookies.clear()
+        self.etag = None
+        self.request('login', json={'username': username(self.index % self.args.users), 'password': PASSWORD})
+
+    def poll(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        response = self.request('poll', headers=headers)
+        if response is not None and response.status_code == 200:
+            self.etag = response.headers.get('ETag')
+
+    def act(self, name):
+        if name == 'login':
+            self.login()
+        elif name == 'send':
+            self.sent += 1
+            self.request('send', json={'content': f"load test message {self.sent} from {self.index}"})
+        else:
+            self.request(name)
+
+    def run(self):
+        time.sleep(max(self.start_at - time.monotonic(), 0))
+        self.login()
+        next_poll = time.monotonic() + self.random.uniform(0, self.args.poll_interval)
+        while time.monotonic() < self.stop_at:
+            now = time.monotonic()
+            if now >= next_poll:
+                self.poll()
+                next_poll = max(next_poll + self.args.poll_interval, now)
+                continue
+            if self.actions:
+                self.act(self.random.choices(self.actions, self.weights)[0])
+            think = self.random.expovariate(1 / self.args.think) if self.args.think > 0 else 0
+            pause = min(think, next_poll - time.monotonic(), self.stop_at - time.monotonic())
+            if pause > 0:
+                time.sleep(pause)
+
+
+def summarize(samples, failures, seconds):
+    """Per-endpoint and total statistics."""
+    def stats(values, errors):
+        ordered = sorted(values)
+        return {
+            'requests': len(ordered),
+            'errors': errors,
+            'rps': round(len(ordered) / seconds, 2),
+            'mean_ms': round(sum(ordered) / len(ordered), 3),
+            'p50_ms': round(percentile(ordered, 50), 3),
+            'p95_ms': round(percentile(ordered, 95), 3),
+            'p99_ms': round(percentile(ordered, 99), 3),
+            'max_ms': round(ordered[-1], 3),
+        }
+
+    endpoints = {name: stats(values, failures.get(name, 0))
+                 for name, values in sorted(samples.items()) if values}
+    everything = [value for values in samples.values() for value in values]
+    total = stats(everything, sum(failures.values())) if everything else {}
+    return endpoints, total
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(results, baseline=None):
+    rows = dict(results['endpoints'], total=results['total'])
+    base_rows = dict(baseline['endpoints'], total=baseline['total']) if baseline else {}
+    print(f"\n{'endpoint':<12} {'requests':>9} {'errors':>7} {'rps':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}" + ('   vs baseline (rps / p95)' if baseline else ''))
+    for name, row in rows.items():
+        line = (f"{name:<12} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} "
+                f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+        base = base_rows.get(name)
+        if base:
+            line += f"   {change(base['rps'], row['rps']):>+7.1f}% / {change(base['p95_ms'], row['p95_ms']):>+7.1f}%"
+        print(line)
+
+
+def change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def regressions(results, baseline, limit):
+    """Endpoints whose RPS fell or p95 rose by more than limit percent."""
+    found = []
+    for name, row in dict(results['endpoints'], total=results['total']).items():
+        base = dict(baseline['endpoints'], total=baseline['total']).get(name)
+        if not base:
+            continue
+        if change(base['rps'], row['rps']) < -limit:
+            found.append(f"{name}: rps {base['rps']} -> {row['rps']}")
+        if change(base['p95_ms'], row['p95_ms']) > limit:
+            found.append(f"{name}: p95 {base['p95_ms']}ms -> {row['p95_ms']}ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat API load test",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument('--url', help="Base URL of a running server (default: serve in-process)")
+    parser.add_argument('--users', type=int, default=100, help="Users to seed")
+    parser.add_argument('--messages', type=int, default=1000, help="Messages to seed")
+    parser.add_argument('--no-seed', action='store_true', help="Target is already seeded")
+    parser.add_argument('--concurrency', type=int, default=20, help="Virtual users")
+    parser.add_argument('--duration', type=float, default=30, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=3, help="Unmeasured seconds before that")
+    parser.add_argument('--ramp-up', type=float, default=1, help="Seconds over which users start")
+    parser.add_argument('--poll-interval', type=float, default=3.0)
+    parser.add_argument('--think', type=float, default=1.0, help="Mean think time between actions (0 = none)")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help=f"Action weights (default {DEFAULT_MIX})")
+    parser.add_argument('--hash-method', help="PASSWORD_HASH_METHOD for the in-process server")
+    parser.add_argument('--seed', type=int, default=1, help="Random seed")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--baseline', help="Results JSON of a previous run to compare with")
+    parser.add_argument('--max-regression', type=float,
+                        help="Exit 1 if any RPS drops or p95 grows by more than this percent vs --baseline")
+    args = parser.parse_args()
+    args.users = max(args.users, 1)
+    actions, weights = args.mix
+
+    with contextlib.ExitStack() as stack:
+        if args.url:
+            base_url = args.url.rstrip('/')
+            if not args.no_seed:
+                print(f"Seeding {args.users} users and {args.messages} messages over HTTP...")
+                seed_over_http(base_url, args)
+        else:
+            print(f"Starting in-process server, seeding {args.users} users and {args.messages} messages...")
+            base_url = stack.enter_context(serve_in_process(args))
+
+        print(f"Running {args.concurrency} users for {args.warmup:g}s warm-up + {args.duration:g}s against {base_url}")
+        now = time.monotonic()
+        record_from = now + args.ramp_up + args.warmup
+        stop_at = record_from + args.duration
+        users = [
+            VirtualUser(i, base_url, args, actions, weights,
+                        now + args.ramp_up * i / max(args.concurrency, 1), record_from, stop_at)
+            for i in range(args.concurrency)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+
+    samples, failures = defaultdict(list), defaultdict(int)
+    for user in users:
+        for name, values in user.samples.items():
+            samples[name].extend(values)
+        for name, count in user.failures.items():
+            failures[name] += count
+
+    endpoints, total = summarize(samples, failures, args.duration)
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': git_revision(),
+            'target': args.url or 'in-process',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'users': args.users,
+            'messages': args.messages,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'poll_interval': args.poll_interval,
+            'think': args.think,
+            'mix': dict(zip(actions, weights)),
+            'seed': args.seed,
+        },
+        'endpoints': endpoints,
+        'total': total,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if total:
+        print_report(results, baseline)
+    else:
+        print("No requests completed")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if baseline and args.max_regression is not None and total:
+        found = regressions(results, baseline, args.max_regression)
+        if found:
+            print(f"\nRegressions over {args.max_regression:g}%:")
+            for item in found:
+                print(f"  {item}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Latency report from exported trace spans.
+
+Reads the JSON-lines file written by the tracing service (TRACING_FILE)
+and prints, per span name, the count and p50/p95/p99 duration, followed
+by the enqueue-to-processed latency of every queue consumer:
+
+    queued     time the message waited in RabbitMQ (messaging.queue_time_ms)
+    processed  time from the start of the trace (usually the API request
+               that queued the message) to the end of its processing
+
+Usage (from backend-service/):
+    python benchmarks/trace_report.py [traces.jsonl]
+"""
+import argparse
+import json
+from collections import defaultdict
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"{'name':<48} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, values in sorted(rows.items()):
+        print(f"{name:<48} {len(values):>7} {percentile(values, 50):>9.2f} "
+              f"{percentile(values, 95):>9.2f} {percentile(values, 99):>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', nargs='?', default='traces.jsonl')
+    args = parser.parse_args()
+
+    spans = []
+    with open(args.path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+
+    durations = defaultdict(list)
+    trace_start = {}
+    for span in spans:
+        durations[span['name']].append(span['duration_ms'])
+        start = trace_start.get(span['trace_id'])
+        if start is None or span['start_ns'] < start:
+            trace_start[span['trace_id']] = span['start_ns']
+
+    queued = defaultdict(list)
+    processed = defaultdict(list)
+    for span in spans:
+        if span['kind'] != 'consumer':
+            continue
+        queue_time = span['attributes'].get('messaging.queue_time_ms')
+        if queue_time is not None:
+            queued[span['name']].append(queue_time)
+        processed[span['name']].append((span['end_ns'] - trace_start[span['trace_id']]) / 1e6)
+
+    print(f"{len(spans)} spans in {len(trace_start)} traces")
+    print_table('Span durations', durations)
+    if processed:
+        print_table('Enqueue -> dequeue (queued)', queued)
+        print_table('Trace start -> processed', processed)
+
+
+if __name__ == '__main__':
+    main()
@@ -27,12 +27,24 @@ class Config:
         'DATABASE_URL',
         f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     )
+    # Connection pool of the async (ASGI) service layer, per process
+    ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+    ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 10))
     
     # Redis Configuration
     REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
     REDIS_DB = int(os.environ.get('REDIS_DB', 0))
     REDIS_URL = os.environ.get('REDIS_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}')
+    REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 2))  # seconds
+    # 'redis' or 'fake' (in-process fakeredis, for tests and benchmarks)
+    REDIS_BACKEND = os.environ.get('REDIS_BACKEND', 'redis')
+    
+    # Session Configuration
+    # Sessions expire after SESSION_TTL seconds of inactivity; activity
+    # refreshes the TTL at most once per SESSION_TOUCH_INTERVAL seconds.
+    SESSION_TTL = int(os.environ.get('SESSION_TTL', 3600))
+    SESSION_TOUCH_INTERVAL = int(os.environ.get('SESSION_TOUCH_INTERVAL', 60))
     
     # RabbitMQ Configuration
     RABBITMQ_HOST = os.environ.get('RABBITMQ_HOST', 'localhost')
@@ -43,6 +55,141 @@ class Config:
         'RABBITMQ_URL',
         f'amqp://{RABBITMQ_USER}:{RABBITMQ_PASSWORD}@{RABBITMQ_HOST}:{RABBITMQ_PORT}/'
     )
+    RABBITMQ_CONNECT_TIMEOUT = float(os.environ.get('RABBITMQ_CONNECT_TIMEOUT', 2))  # seconds
+    # 'rabbitmq' or 'memory' (in-process broker, for tests and benchmarks)
+    QUEUE_BACKEND = os.environ.get('QUEUE_BACKEND', 'rabbitmq')
+    
+    # Long-Polling Configuration (/api/chat/poll)
+    POLL_TIMEOUT = float(os.environ.get('POLL_TIMEOUT', 25))  # default wait, seconds
+    POLL_MAX_TIMEOUT = float(os.environ.get('POLL_MAX_TIMEOUT', 30))  # keep below proxy/worker timeouts
+    POLL_MAX_MESSAGES = int(os.environ.get('POLL_MAX_MESSAGES', 500))  # per response
+    # Without Redis pub/sub, polls wait this long and then check the database once
+    POLL_FALLBACK_INTERVAL = float(os.environ.get('POLL_FALLBACK_INTERVAL', 3))
+    # Long-polls one worker process holds open at a time; a waiting poll
+    # holds a server thread, so by default half of the gthread threads may
+    # wait and the rest keep serving. Polls beyond it are answered at once
+    # (with Retry-After). Raise it for gevent workers.
+    POLL_MAX_WAITING = int(os.environ.get('POLL_MAX_WAITING', max(int(os.environ.get('GUNICORN_THREADS', 4)) // 2, 1)))
+    
+    # Message ID Configuration
+    # Every process leases its own node number (0-1023) in generated message
+    # IDs from Redis, for this many seconds at a time (renewed while it runs)
+    ID_NODE_LEASE_TTL = int(os.environ.get('ID_NODE_LEASE_TTL', 60))
+    # IDs sent back by clients may be at most this far (ms) ahead of our
+    # clock (other pods' clocks drift a little)
+    ID_CLOCK_SKEW_MS = int(os.environ.get('ID_CLOCK_SKEW_MS', 5000))
+    
+    # Rate Limiting Configuration
+    # Per route, ';'-separated: <endpoint>=<scope>:<limit>/<seconds>,...
+    # Scopes: user (session username) and ip. duplicate:<seconds> also rejects
+    # a user's repeated message content (JSON field 'content') for that long.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    RATE_LIMITS = os.environ.get(
+        'RATE_LIMITS',
+        'chat.send_message=user:20/10,ip:60/10,duplicate:10;auth.login=ip:10/60;auth.register=ip:5/60'
+    )
+    # Proxies in front of the app (nginx); the client IP is taken from
+    # X-Forwarded-For this many hops back. 0 = use the socket address.
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1))
+    
+    # Message Processing Pipeline Configuration (message_processing queue)
+    # Stages run in this order over each micro-batch
+    PIPELINE_STAGES = os.environ.get('PIPELINE_STAGES', 'blocklist,spam,duplicates').split(',')
+    PIPELINE_BATCH_SIZE = int(os.environ.get('PIPELINE_BATCH_SIZE', 100))  # messages per batch
+    PIPELINE_MAX_WAIT = float(os.environ.get('PIPELINE_MAX_WAIT', 0.05))  # seconds to fill a batch
+    # Blocked terms: comma-separated, plus one per line from BLOCKLIST_FILE
+    BLOCKLIST_TERMS = [t for t in os.environ.get('BLOCKLIST_TERMS', '').split(',') if t.strip()]
+    BLOCKLIST_FILE = os.environ.get('BLOCKLIST_FILE', '')
+    SPAM_THRESHOLD = float(os.environ.get('SPAM_THRESHOLD', 0.8))  # score at which a message is flagged
+    SPAM_MODEL_FILE = os.environ.get('SPAM_MODEL_FILE', '')  # .npz weights; built-in defaults if unset
+    DUPLICATE_WINDOW = int(os.environ.get('DUPLICATE_WINDOW', 300))  # seconds a repeat counts as duplicate
+    MESSAGE_RATE_LIMIT = int(os.environ.get('MESSAGE_RATE_LIMIT', 30))  # messages per user per window
+    MESSAGE_RATE_WINDOW = int(os.environ.get('MESSAGE_RATE_WINDOW', 60))  # seconds
+    
+    # Write-Behind Configuration
+    # With WRITE_BEHIND_ENABLED, /api/chat/send appends the message to a Redis
+    # Stream journal and answers 202 at once; persister threads save the
+    # journal to the database in batches. Sends are written directly while
+    # Redis is unavailable or the journal holds JOURNAL_MAX_LENGTH unsaved
+    # messages (0 = no limit).
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'False').lower() == 'true'
+    JOURNAL_STREAM = os.environ.get('JOURNAL_STREAM', 'chat:message_journal')
+    JOURNAL_GROUP = os.environ.get('JOURNAL_GROUP', 'persisters')
+    JOURNAL_BATCH_SIZE = int(os.environ.get('JOURNAL_BATCH_SIZE', 500))  # messages per INSERT
+    JOURNAL_BLOCK_MS = int(os.environ.get('JOURNAL_BLOCK_MS', 1000))  # longest wait for new messages
+    # Messages a persister has held this long unsaved are taken over by another (seconds)
+    JOURNAL_CLAIM_IDLE = int(os.environ.get('JOURNAL_CLAIM_IDLE', 30))
+    JOURNAL_MAX_LENGTH = int(os.environ.get('JOURNAL_MAX_LENGTH', 100000))
+    
+    # Deleted Message Compaction
+    # Deleted messages stay as tombstones (no content) for TOMBSTONE_RETENTION
+    # seconds, so polling clients learn about the delete; then a background
+    # job removes them, COMPACTION_BATCH_SIZE rows per transaction with
+    # COMPACTION_BATCH_PAUSE seconds in between, every COMPACTION_INTERVAL
+    # seconds (0 = never).
+    TOMBSTONE_RETENTION = int(os.environ.get('TOMBSTONE_RETENTION', 7 * 24 * 3600))
+    COMPACTION_INTERVAL = int(os.environ.get('COMPACTION_INTERVAL', 3600))
+    COMPACTION_BATCH_SIZE = int(os.environ.get('COMPACTION_BATCH_SIZE', 1000))
+    COMPACTION_BATCH_PAUSE = float(os.environ.get('COMPACTION_BATCH_PAUSE', 0.1))
+    
+    # Reactions and Read Receipts Configuration
+    # Read markers and reaction counts change in Redis; every worker saves the
+    # changed ones to the database every RECEIPT_FLUSH_INTERVAL seconds (0 =
+    # this process doesn't), RECEIPT_FLUSH_BATCH_SIZE per transaction.
+    RECEIPT_FLUSH_INTERVAL = float(os.environ.get('RECEIPT_FLUSH_INTERVAL', 5))
+    RECEIPT_FLUSH_BATCH_SIZE = int(os.environ.get('RECEIPT_FLUSH_BATCH_SIZE', 1000))
+    # Redis forgets a message's reactions this many seconds after they last
+    # changed or were saved (they are loaded from the database again on the
+    # next reaction); keep it well above RECEIPT_FLUSH_INTERVAL.
+    REACTION_TTL = int(os.environ.get('REACTION_TTL', 24 * 3600))
+    
+    # Metrics Configuration
+    # Only request paths starting with one of these prefixes are measured
+    METRICS_PATH_PREFIXES = os.environ.get('METRICS_PATH_PREFIXES', '/api/').split(',')
+    
+    # Request Profiling Configuration
+    # Profile 1 in PROFILING_SAMPLE_RATE requests (0 = off). Requests with the
+    # header `X-Profile: <PROFILING_TOKEN>` are always profiled, and the token
+    # is the only way into /admin (profiles, pipeline stats).
+    PROFILING_SAMPLE_RATE = int(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+    PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', 20))  # slowest profiles kept
+    PROFILING_WINDOW = int(os.environ.get('PROFILING_WINDOW', 3600))  # seconds
+    PROFILING_ENGINE = os.environ.get('PROFILING_ENGINE', 'auto')  # auto | pyinstrument | cprofile
+    
+    # Tracing Configuration
+    # Spans for requests, service calls and queue consumers, exported as JSON
+    # lines (TRACING_FILE) and/or OTLP/HTTP JSON (TRACING_OTLP_ENDPOINT)
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'False').lower() == 'true'
+    TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'file')  # file | otlp | both
+    TRACING_FILE = os.environ.get('TRACING_FILE', 'traces.jsonl')
+    TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+    TRACING_SAMPLE_RATIO = float(os.environ.get('TRACING_SAMPLE_RATIO', 1.0))  # share of new traces kept
+    TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'connecthub-backend')
+    
+    # JSON Serialization Configuration
+    # 'auto' uses orjson when installed, otherwise the stdlib encoder
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    # Lists with at least this many items are streamed in chunks
+    JSON_STREAM_THRESHOLD = int(os.environ.get('JSON_STREAM_THRESHOLD', 1000))
+    
+    # Response Compression Configuration
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+    COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))  # gzip 1-9
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))  # brotli 0-11
+    COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 64))  # cached bodies
+    
+    # Password Hashing Configuration
+    # Method string as understood by werkzeug, including the work factor
+    # (e.g. pbkdf2:sha256:600000), the same default as the auth service.
+    # Hashes made with other parameters are upgraded on the user's next
+    # successful login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 1))
+    HASH_QUEUE_SIZE = int(os.environ.get('HASH_QUEUE_SIZE', HASH_WORKERS * 4))
+    HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', 5))
 
 class DevelopmentConfig(Config):
     """Development environment configuration."""
@@ -55,9 +202,11 @@ class ProductionConfig(Config):
     TESTING = False
 
 class TestingConfig(Config):
-    """Testing environment configuration."""
+    """Testing environment configuration (no external services)."""
     TESTING = True
-    DATABASE_URL = 'sqlite:///test.db'
+    DATABASE_URL = os.environ.get('TEST_DATABASE_URL', 'sqlite://')  # in-memory
+    REDIS_BACKEND = os.environ.get('TEST_REDIS_BACKEND', 'fake')
+    QUEUE_BACKEND = os.environ.get('TEST_QUEUE_BACKEND', 'memory')
 
 # Configuration dictionary
 config = {
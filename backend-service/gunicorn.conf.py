@@ -0,0 +1,93 @@
+"""
+Gunicorn configuration for the Chat Application.
+
+Every setting can be overridden from the environment:
+    GUNICORN_BIND              address to listen on (default 0.0.0.0:5000)
+    WEB_CONCURRENCY            number of worker processes
+    GUNICORN_WORKER_CLASS      sync | gthread | gevent (default gthread)
+    GUNICORN_THREADS           threads per gthread worker (default 4)
+    GUNICORN_WORKER_CONNECTIONS  concurrent greenlets per gevent worker
+    GUNICORN_TIMEOUT           seconds before a silent worker is killed
+    GUNICORN_GRACEFUL_TIMEOUT  seconds a worker gets to finish on shutdown
+    GUNICORN_KEEPALIVE         seconds to hold idle keep-alive connections
+    GUNICORN_MAX_REQUESTS      recycle workers after this many requests (0 = never)
+    PROMETHEUS_MULTIPROC_DIR   where workers share Prometheus metrics
+                               (default /tmp/prometheus-multiproc; wiped at startup)
+
+The gevent worker class needs the gevent package, which is not part of
+requirements.txt.
+
+Long-polls (/api/chat/poll) hold a server thread while they wait, so each
+worker holds at most POLL_MAX_WAITING of them open (default: half of
+GUNICORN_THREADS) and answers the rest at once with Retry-After; the other
+threads keep serving every other endpoint. With gevent workers a waiting
+poll only holds a greenlet, so raise POLL_MAX_WAITING with
+GUNICORN_WORKER_CONNECTIONS.
+"""
+import os
+import shutil
+
+
+def _cpu_count():
+    """CPUs this container may actually use."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+# Sync workers block on I/O, so run more of them than there are CPUs;
+# threaded and gevent workers overlap I/O within one process.
+if worker_class == 'sync':
+    _default_workers = _cpu_count() * 2 + 1
+else:
+    _default_workers = _cpu_count() + 1
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', _default_workers))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Load the app once in the master so workers share its memory pages
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Workers write metrics to shared files so /metrics reports all of them.
+# Must be set before the app (and prometheus_client) is imported.
+_metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus-multiproc')
+shutil.rmtree(_metrics_dir, ignore_errors=True)
+os.makedirs(_metrics_dir, exist_ok=True)
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """
+    Give each worker its own connections.
+    With preload_app the DB engine, Redis pool and queue state were created
+    in the master; sockets inherited across fork must not be shared.
+    """
+    from app import init_worker
+    init_worker()
+    server.log.info(f"Worker {worker.pid} initialized")
+
+
+def worker_exit(server, worker):
+    """Close this worker's connections and stop its consumer threads."""
+    from app import close_services
+    close_services()
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared metrics."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,6 +1,7 @@
 """
 Main entry point for the Chat Application.
 Run this file to start the Flask development server.
+Production uses Gunicorn instead: gunicorn -c gunicorn.conf.py wsgi:app
 """
 from app import create_app
 
@@ -25,5 +26,5 @@ if __name__ == '__main__':
         port=5000, 
         debug=debug_mode,
         use_debugger=False,  # Disable interactive debugger
-        use_reloader=True    # Keep auto-reload for development
+        use_reloader=debug_mode  # Auto-reload only when debugging
     )
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+One-shot migration: add the message ID, revision and deleted_at columns to
+a chat_messages table created by an older release, and fill them in for
+existing rows. Also adds the users column to message_reactions (left NULL:
+who reacted before it was kept is unknown).
+
+Run it once, from one place, before deploying a release that needs the
+columns (the application refuses to start without them, so pods never race
+on ALTER TABLE / CREATE INDEX themselves). Existing messages get IDs from
+their timestamp, with the key in the low bits to keep them unique, and
+their ID as revision.
+
+Rows are read in primary-key order, --batch-size at a time, and each batch is
+updated in its own short transaction, so the application keeps serving
+while the migration runs. Each UPDATE only touches rows still missing the
+value, and the indexes are built after the backfill (concurrently on
+PostgreSQL). Re-running the script is safe: it picks up rows written by
+older pods in the meantime and skips everything already done.
+
+Usage (from backend-service/):
+    python scripts/migrate_messages.py [--batch-size 1000] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from app.models import ChatMessage, MessageReaction, get_engine
+from app.services.id_service import id_for_datetime
+
+# Timestamp for rows saved without one
+DEFAULT_TIMESTAMP = datetime(2020, 1, 1)
+
+# Indexes the model declares on the new columns: (name, column, unique)
+INDEXES = (
+    ('ix_chat_messages_id', 'id', True),
+    ('ix_chat_messages_revision', 'revision', False),
+    ('ix_chat_messages_deleted_at', 'deleted_at', False),
+)
+
+# Other columns added since: (table, column)
+COLUMNS = (
+    (MessageReaction.__table__, 'users'),
+)
+
+
+def add_columns(engine, dry_run=False):
+    """Add the missing columns (no backfill; each ALTER is instant). Returns their names."""
+    inspector = inspect(engine)
+    wanted = [(ChatMessage.__table__, column) for _, column, _ in INDEXES] + list(COLUMNS)
+    existing = {table.name: {column['name'] for column in inspector.get_columns(table.name)}
+                for table in {table for table, _ in wanted}}
+    missing = [(table, name) for table, name in wanted if name not in existing[table.name]]
+    if not dry_run:
+        for table, name in missing:
+            column_type = table.c[name].type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+    return [name if table is ChatMessage.__table__ else f"{table.name}.{name}" for table, name in missing]
+
+
+def iter_batches(engine, column, batch_size):
+    """Yield lists of (key, timestamp, id) for rows where column is still NULL."""
+    table = ChatMessage.__table__
+    last_key = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.key, table.c.timestamp, table.c.id)
+                .where(table.c.key > last_key, table.c[column].is_(None))
+                .order_by(table.c.key.asc())
+                .limit(batch_size)
+            ).all()
+        if not rows:
+            return
+        last_key = rows[-1].key
+        yield rows
+
+
+def backfill(engine, batch_size, dry_run=False):
+    """Fill in message IDs, then revisions. Returns (ids, revisions) counts."""
+    table = ChatMessage.__table__
+    set_id = (update(table)
+              .where(table.c.key == bindparam('message_key'), table.c.id.is_(None))
+              .values(id=bindparam('message_id')))
+    set_revision = (update(table)
+                    .where(table.c.key == bindparam('message_key'), table.c.revision.is_(None))
+                    .values(revision=table.c.id))
+
+    ids = 0
+    for rows in iter_batches(engine, 'id', batch_size):
+        ids += len(rows)
+        if not dry_run:
+            with engine.begin() as conn:
+                conn.execute(set_id, [
+                    {'message_key': key, 'message_id': id_for_datetime(timestamp or DEFAULT_TIMESTAMP, key)}
+                    for key, timestamp, _ in rows
+                ])
+            print(f"  ... {ids} message IDs so far (up to key {rows[-1].key})")
+
+    revisions = 0
+    for rows in iter_batches(engine, 'revision', batch_size):
+        revisions += len(rows)
+        if not dry_run:
+            with engine.begin() as conn:
+                conn.execute(set_revision, [{'message_key': key} for key, _, _ in rows])
+            print(f"  ... {revisions} revisions so far (up to key {rows[-1].key})")
+
+    return ids, revisions
+
+
+def create_indexes(engine, dry_run=False):
+    """Create the missing indexes. Returns their names."""
+    existing = {index['name'] for index in inspect(engine).get_indexes('chat_messages')}
+    missing = [index for index in INDEXES if index[0] not in existing]
+    if dry_run:
+        return [name for name, _, _ in missing]
+
+    # CONCURRENTLY doesn't block writes, but can't run in a transaction
+    concurrently = ' CONCURRENTLY' if engine.dialect.name == 'postgresql' else ''
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for name, column, unique in missing:
+            unique = 'UNIQUE ' if unique else ''
+            conn.execute(text(f"CREATE {unique}INDEX{concurrently} {name} ON chat_messages ({column})"))
+    return [name for name, _, _ in missing]
+
+
+def migrate(batch_size, dry_run=False):
+    """Run every step. Returns (columns, ids, revisions, indexes)."""
+    engine = get_engine()
+    columns = add_columns(engine, dry_run)
+    if dry_run and set(columns) & {column for _, column, _ in INDEXES}:
+        # Nothing can be counted against columns that don't exist yet
+        with engine.connect() as conn:
+            count = conn.execute(text("SELECT COUNT(*) FROM chat_messages")).scalar()
+        return columns, count, count, [name for name, _, _ in INDEXES]
+    ids, revisions = backfill(engine, batch_size, dry_run)
+    indexes = create_indexes(engine, dry_run)
+    return columns, ids, revisions, indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add and backfill message IDs and revisions in chat_messages.")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help="Count rows without writing")
+    args = parser.parse_args()
+
+    print(f"Migrating chat_messages (batch size {args.batch_size})")
+    started = time.time()
+    columns, ids, revisions, indexes = migrate(args.batch_size, args.dry_run)
+    verb = "would be" if args.dry_run else "were"
+    print(f"Done: columns {', '.join(columns) or 'none'} {verb} added, {ids} message IDs and "
+          f"{revisions} revisions {verb} filled in, indexes {', '.join(indexes) or 'none'} {verb} "
+          f"created in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+One-shot migration: replace plaintext passwords in the users table with
+salted hashes.
+
+Rows are streamed in primary-key order, BATCH_SIZE at a time, and each batch
+is updated in its own short transaction. Only the rows being changed are
+locked, so the application keeps serving logins and registrations while the
+migration runs. Each UPDATE is conditional on the old value, so a password
+changed (or already upgraded by a login) mid-migration is left alone.
+Re-running the script is safe; already hashed rows are skipped.
+
+Usage (from backend-service/):
+    python scripts/rehash_passwords.py [--batch-size 500] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import update
+from app.models import User, get_db_session
+from app.services.hashing_service import hashing_service, is_password_hash, _hash_password
+
+
+def iter_plaintext_batches(batch_size):
+    """Yield lists of (key, password) for rows still holding plaintext."""
+    last_key = 0
+    while True:
+        db = get_db_session()
+        try:
+            rows = (db.query(User.key, User.password)
+                    .filter(User.key > last_key)
+                    .order_by(User.key.asc())
+                    .limit(batch_size)
+                    .all())
+        finally:
+            db.close()
+
+        if not rows:
+            return
+        last_key = rows[-1].key
+        batch = [(row.key, row.password) for row in rows if not is_password_hash(row.password)]
+        if batch:
+            yield batch
+
+
+def migrate(batch_size, dry_run=False):
+    """Hash every plaintext password (a dry run only counts them). Returns (updated, skipped) counts."""
+    if dry_run:
+        return sum(len(batch) for batch in iter_plaintext_batches(batch_size)), 0
+
+    updated = skipped = 0
+    workers = max(hashing_service.workers, 1)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch in iter_plaintext_batches(batch_size):
+            hashes = executor.map(
+                _hash_password,
+                [password for _, password in batch],
+                [hashing_service.method] * len(batch),
+                [hashing_service.salt_length] * len(batch),
+            )
+
+            db = get_db_session()
+            try:
+                for (key, old_value), new_hash in zip(batch, hashes):
+                    result = db.execute(
+                        update(User)
+                        .where(User.key == key, User.password == old_value)
+                        .values(password=new_hash)
+                    )
+                    if result.rowcount:
+                        updated += 1
+                    else:
+                        skipped += 1
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+
+            print(f"  ... {updated} rows hashed so far (up to key {batch[-1][0]})")
+
+    return updated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hash plaintext passwords in the users table.")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help="Count rows without writing")
+    args = parser.parse_args()
+
+    print(f"Hashing plaintext passwords with {hashing_service.method} (batch size {args.batch_size})")
+    started = time.time()
+    updated, skipped = migrate(args.batch_size, args.dry_run)
+    verb = "would be hashed" if args.dry_run else "hashed"
+    print(f"Done: {updated} rows {verb}, {skipped} skipped (changed concurrently) in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
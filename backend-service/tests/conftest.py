@@ -0,0 +1,19 @@
+"""
+Shared fixtures. The app uses TestingConfig: in-memory SQLite, fakeredis
+and the in-memory queue, so the tests need no running services.
+"""
+import pytest
+
+from app import close_services, create_app
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app('testing', start_workers=False)
+    yield app
+    close_services()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
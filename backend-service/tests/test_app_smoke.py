@@ -0,0 +1,93 @@
+"""
+End-to-end smoke test of the Flask app: register, log in, send, poll and
+the conditional /messages fetch and read markers.
+"""
+import math
+import time
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def logged_in(app):
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={
+        'username': 'smoke', 'password': 'smoke-password', 'email': 'smoke@example.com'
+    })
+    assert response.status_code in (200, 201), response.get_json()
+    response = client.post('/api/auth/login', json={'username': 'smoke', 'password': 'smoke-password'})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def test_requires_login(client):
+    assert client.get('/api/chat/messages').status_code == 401
+    assert client.post('/api/chat/send', json={'content': 'hi'}).status_code == 401
+
+
+def test_login_rejects_wrong_password(client, logged_in):
+    response = client.post('/api/auth/login', json={'username': 'smoke', 'password': 'wrong'})
+    assert response.status_code == 401
+
+
+def test_send_and_poll(logged_in):
+    cursor = logged_in.get('/api/chat/poll?timeout=0').get_json()['after']
+
+    response = logged_in.post('/api/chat/send', json={'content': 'hello'})
+    assert response.status_code == 201
+    message_id = response.get_json()['data']['id']
+
+    body = logged_in.get(f'/api/chat/poll?after={cursor}&timeout=0').get_json()
+    assert [message['id'] for message in body['messages']] == [message_id]
+    assert body['messages'][0]['content'] == 'hello'
+    assert int(body['after']) > int(cursor)
+
+    body = logged_in.get(f"/api/chat/poll?after={body['after']}&timeout=0").get_json()
+    assert body['messages'] == []
+
+
+def test_messages_etag(logged_in):
+    response = logged_in.get('/api/chat/messages')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert any(message['content'] == 'hello' for message in response.get_json()['messages'])
+
+    response = logged_in.get('/api/chat/messages', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    logged_in.post('/api/chat/send', json={'content': 'changed'})
+    response = logged_in.get('/api/chat/messages', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_poll_answers_at_once_when_slots_are_taken(app, logged_in):
+    from app.services.notification_service import notification_service
+    limit = app.config['POLL_MAX_WAITING']
+    for _ in range(limit):
+        assert notification_service.reserve_waiter(limit)
+    try:
+        started = time.monotonic()
+        response = logged_in.get('/api/chat/poll?timeout=5')
+        assert time.monotonic() - started < 1
+        assert response.status_code == 200
+        assert response.headers['Retry-After'] == str(math.ceil(app.config['POLL_FALLBACK_INTERVAL']))
+    finally:
+        for _ in range(limit):
+            notification_service.release_waiter()
+
+    response = logged_in.get('/api/chat/poll?timeout=0')
+    assert 'Retry-After' not in response.headers
+
+
+def test_mark_read_checks_the_id_time(app, logged_in):
+    from app.services.id_service import id_for_millis, id_service
+    future = id_for_millis(int(time.time() * 1000) + app.config['ID_CLOCK_SKEW_MS'] + 60000)
+    for bad in (0, -1, 'x', future, 1 << 63):
+        assert logged_in.post('/api/chat/read', json={'id': bad}).status_code == 400
+
+    # An ID handed out for a message that isn't saved yet (journaled) is fine
+    message_id = id_service.next_id()
+    response = logged_in.post('/api/chat/read', json={'id': str(message_id)})
+    assert response.status_code == 200
+    assert response.get_json()['last_read'] == str(message_id)
@@ -0,0 +1,79 @@
+"""
+The backend and the auth service each ship their own copy of the password
+hashing pool (see app/services/hashing_service.py). These checks fail when
+the copies drift apart.
+"""
+import importlib.util
+import os
+
+import pytest
+
+from app.services.hashing_service import HashingService, is_password_hash
+from config import Config
+
+AUTH_HASHING = os.path.join(os.path.dirname(__file__), '..', '..', 'microservices', 'auth-service', 'hashing.py')
+REHASH_SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'rehash_passwords.py')
+
+# Cheap work factor, so the checks run fast
+TEST_METHOD = 'pbkdf2:sha256:1000'
+
+
+def load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def auth_hashing():
+    return load('auth_service_hashing', AUTH_HASHING)
+
+
+def test_defaults_match(auth_hashing):
+    assert auth_hashing.PASSWORD_HASH_METHOD == Config.PASSWORD_HASH_METHOD
+    assert auth_hashing.PASSWORD_SALT_LENGTH == Config.PASSWORD_SALT_LENGTH
+    assert auth_hashing.HASH_WORKERS == Config.HASH_WORKERS
+    assert auth_hashing.HASH_QUEUE_SIZE == Config.HASH_QUEUE_SIZE
+    assert auth_hashing.HASH_TIMEOUT == Config.HASH_TIMEOUT
+
+
+def test_hashes_are_interchangeable(auth_hashing):
+    backend = HashingService(method=TEST_METHOD, workers=0)
+    auth = auth_hashing.PasswordHasher(method=TEST_METHOD, workers=0)
+
+    assert auth.verify(backend.hash_password('secret'), 'secret')
+    assert backend.verify_password(auth.hash('secret'), 'secret')
+    assert not backend.verify_password(auth.hash('secret'), 'other')
+    assert not backend.needs_rehash(auth.hash('secret'))
+    assert not auth.needs_rehash(backend.hash_password('secret'))
+
+
+def test_scrypt_hashes_never_match():
+    # Werkzeug 2.0 can't verify scrypt hashes; they aren't plaintext either
+    stored = 'scrypt:32768:8:1$salt$' + 'ab' * 32
+    backend = HashingService(method=TEST_METHOD, workers=0)
+    assert is_password_hash(stored)
+    assert not backend.verify_password(stored, stored)
+    assert not backend.verify_password(stored, 'secret')
+    assert not is_password_hash('secret')
+
+
+def test_rehash_dry_run_only_counts(app, monkeypatch):
+    from app.models import User, get_db_session
+    rehash = load('rehash_passwords', REHASH_SCRIPT)
+
+    def no_hashing(*args, **kwargs):
+        raise AssertionError("dry run hashed passwords")
+
+    monkeypatch.setattr(rehash, 'ProcessPoolExecutor', no_hashing)
+    db = get_db_session()
+    try:
+        db.add(User(id='plain0001', username='plaintext', password='hunter2'))
+        db.commit()
+        assert rehash.migrate(10, dry_run=True) == (1, 0)
+        assert db.query(User.password).filter(User.username == 'plaintext').scalar() == 'hunter2'
+        db.query(User).filter(User.username == 'plaintext').delete()
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,55 @@
+"""
+Message ID generation and the per-process node lease (fakeredis).
+"""
+import pytest
+
+from app.services.id_service import ID_NODE_LOCK_PREFIX, IdService, default_node
+from app.services.redis_service import redis_service
+
+
+@pytest.fixture
+def service(app):
+    service = IdService()
+    yield service
+    service.stop()
+
+
+def lock_holder(node):
+    return redis_service.redis_client.get(f"lock:{ID_NODE_LOCK_PREFIX}{node}")
+
+
+def test_next_id_never_calls_redis(service, monkeypatch):
+    def fail(*args):
+        raise AssertionError("Redis called from next_id")
+
+    monkeypatch.setattr(redis_service, 'renew_lock', fail)
+    monkeypatch.setattr(redis_service, 'lease_id_node', fail)
+    ids = [service.next_id() for _ in range(10000)]
+    assert ids == sorted(set(ids))
+    assert service.node == default_node()
+
+
+def test_start_leases_distinct_nodes(app):
+    first, second = IdService(), IdService()
+    try:
+        first.start()
+        second.start()
+        assert first.node != second.node
+        assert lock_holder(first.node) == first._token
+        node = first.node
+        first.stop()
+        assert lock_holder(node) is None
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_lost_lease_is_replaced_and_ids_keep_increasing(service):
+    service.start()
+    node = service.node
+    before = service.next_id()
+    redis_service.redis_client.set(f"lock:{ID_NODE_LOCK_PREFIX}{node}", 'someone else')
+    service._renew()
+    assert service.node != node
+    assert lock_holder(service.node) == service._token
+    assert service.next_id() > before
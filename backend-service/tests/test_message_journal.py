@@ -0,0 +1,33 @@
+"""
+Write-behind journal persisting (MessageJournal.persist) against the
+testing app's database and fakeredis.
+"""
+from app.services.database import db_service
+from app.services.id_service import id_service
+from app.services.message_journal import journal_fields, message_journal
+from app.services.redis_service import redis_service
+
+
+def entry(entry_id, text):
+    return entry_id, journal_fields(id_service.next_id(), 'journal', text, None)
+
+
+def test_replay_after_failed_ack_announces(app, monkeypatch):
+    published = []
+    monkeypatch.setattr(redis_service, 'publish_new_message', published.append)
+    monkeypatch.setattr(redis_service, 'ack_journal_entries', lambda *args: False)
+    entries = [entry('1000-0', 'first'), entry('1000-1', 'second')]
+
+    # Saved, but the ack failed: nothing is announced yet
+    assert not message_journal.persist(entries)
+    assert published == []
+    saved = db_service.get_changes_after(0)
+    assert [msg.message for msg in saved][-2:] == ['first', 'second']
+
+    # The replay saves nothing twice, but announces what the failed round didn't
+    monkeypatch.setattr(redis_service, 'ack_journal_entries', lambda *args: True)
+    version = redis_service.get_data_version('messages')
+    assert message_journal.persist(entries)
+    assert published == [saved[-1].revision]
+    assert redis_service.get_data_version('messages') != version
+    assert len(db_service.get_changes_after(0)) == len(saved)
@@ -0,0 +1,63 @@
+"""
+Shared long-poll reads (NotificationService.messages_after).
+"""
+import threading
+import time
+
+from app.services.notification_service import NotificationService
+
+CHANGES = ([1], {}, [])
+
+
+def test_waiters_share_one_read():
+    service = NotificationService()
+    calls = []
+
+    def fetch(after_id):
+        calls.append(after_id)
+        time.sleep(0.1)
+        return CHANGES
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.messages_after(0, 5, fetch)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [CHANGES] * 4
+    assert len(calls) == 1
+
+
+def test_waiters_read_themselves_when_the_shared_read_fails():
+    service = NotificationService()
+    calls = []
+
+    def fetch(after_id):
+        calls.append(after_id)
+        if len(calls) == 1:
+            time.sleep(0.2)
+            raise RuntimeError("database down")
+        return CHANGES
+
+    results = {}
+
+    def poll(name):
+        try:
+            results[name] = service.messages_after(0, 5, fetch)
+        except RuntimeError as e:
+            results[name] = e
+
+    owner = threading.Thread(target=poll, args=('owner',))
+    owner.start()
+    time.sleep(0.05)
+    waiters = [threading.Thread(target=poll, args=(f"waiter{i}",)) for i in range(3)]
+    for thread in waiters:
+        thread.start()
+    for thread in [owner] + waiters:
+        thread.join()
+
+    assert isinstance(results.pop('owner'), RuntimeError)
+    assert list(results.values()) == [CHANGES] * 3
+    # The failed read is not handed to later requests
+    assert service.messages_after(0, 5, fetch) == CHANGES
@@ -0,0 +1,54 @@
+"""
+Content filter and spam scoring stages of the message pipeline.
+"""
+import numpy as np
+import pytest
+
+from app.services.pipeline_stages import (NGRAM_SIZE, AhoCorasick, BlocklistStage, SpamScoreStage,
+                                          build_matcher, ngram_buckets)
+
+OVERLAPPING = ['he', 'she', 'his', 'hers', 'a', 'aa', 'aaa', 'abc', 'bc', 'c']
+TEXTS = ['ushers', 'ahishers', 'aaaa', 'xabcx', 'sheshe', '', 'zzz']
+
+
+def occurrences(text, patterns):
+    """Every (end index, pattern), found the slow way."""
+    return sorted((start + len(pattern) - 1, pattern)
+                  for pattern in patterns for start in range(len(text)) if text.startswith(pattern, start))
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_fallback_finds_overlapping_patterns(text):
+    assert sorted(AhoCorasick(OVERLAPPING).iter(text)) == occurrences(text, OVERLAPPING)
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_fallback_matches_pyahocorasick(text):
+    ahocorasick = pytest.importorskip('ahocorasick')
+    assert sorted(AhoCorasick(OVERLAPPING).iter(text)) == sorted(build_matcher(OVERLAPPING).iter(text))
+
+
+def test_blocklist_matches_whole_words_only():
+    stage = BlocklistStage({'BLOCKLIST_TERMS': ['ass', 'Bad Word']})
+    assert stage.matches('a class act') == []
+    assert stage.matches('passive') == []
+    assert stage.matches('what an ASS!') == ['ass']
+    assert stage.matches('ass') == ['ass']
+    assert stage.matches('a bad word, twice: bad word') == ['bad word']
+    assert stage.matches('bad words') == []
+
+
+def test_ngram_buckets():
+    data = np.frombuffer(b'abcdef', dtype=np.uint8)
+    buckets = ngram_buckets(data)
+    assert len(buckets) == len(data) - NGRAM_SIZE + 1
+    assert buckets[0] == ngram_buckets(data[:NGRAM_SIZE])[0]
+    assert len(ngram_buckets(data[:NGRAM_SIZE - 1])) == 0
+
+
+def test_ngrams_stay_within_each_message():
+    stage = SpamScoreStage({'SPAM_THRESHOLD': 0.8})
+    # Together these would spell out spam phrases across the boundaries
+    texts = ['hello free mo', 'ney please click', ' here now', 'ok', '', 'buy now']
+    alone = np.array([stage.score([text])[0] for text in texts])
+    assert np.allclose(stage.score(texts), alone)
@@ -0,0 +1,88 @@
+"""
+Rate limits and duplicate suppression against the testing app's Redis
+(fakeredis), plus the pure helpers.
+"""
+import pytest
+
+from app.services import rate_limit_service as module
+from app.services.rate_limit_service import RateLimitService, client_ip, parse_rate_limits, retry_after
+
+# 15 seconds into a 60-second window
+NOW = 60 * 30000000 + 15
+
+
+@pytest.fixture
+def limiter(app, monkeypatch):
+    monkeypatch.setattr(module.time, 'time', lambda: NOW)
+    limiter = RateLimitService()
+    limiter.configure({'RATE_LIMITS': 'test.limited=user:2/60,ip:100/60,duplicate:30'})
+    return limiter
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits(' a.b = user:20/10, ip:60/10 ,duplicate:10 ; c.d=ip:5/60;') == {
+        'a.b': ([('user', 20, 10), ('ip', 60, 10)], 10),
+        'c.d': ([('ip', 5, 60)], 0),
+    }
+    assert parse_rate_limits('') == {}
+    with pytest.raises(ValueError):
+        parse_rate_limits('a.b=host:1/1')
+
+
+def test_retry_after():
+    # Nothing in the previous window: wait for this window to become the
+    # previous one and weigh little enough
+    assert retry_after(2, 60, 15, 2, 0) == 75
+    # Room in this window, but the previous window still weighs too much
+    assert retry_after(10, 60, 15, 5, 10) == 21
+    assert retry_after(1, 60, 59.5, 0, 0) == 1
+
+
+@pytest.mark.parametrize('remote, forwarded, proxies, expected', [
+    ('10.0.0.1', None, 1, '10.0.0.1'),
+    ('10.0.0.1', '1.1.1.1', 0, '10.0.0.1'),
+    ('10.0.0.1', '1.1.1.1', 1, '1.1.1.1'),
+    ('10.0.0.1', 'spoofed, 1.1.1.1', 1, '1.1.1.1'),
+    ('10.0.0.1', 'spoofed, 1.1.1.1, 10.0.0.2', 2, '1.1.1.1'),
+    ('10.0.0.1', '1.1.1.1', 3, '1.1.1.1'),
+    ('10.0.0.1', ' , ', 1, '10.0.0.1'),
+])
+def test_client_ip(remote, forwarded, proxies, expected):
+    assert client_ip(remote, forwarded, proxies) == expected
+
+
+def test_allows_then_limits_with_retry_after(limiter):
+    assert limiter.check('test.limited', 'limit-user', '1.2.3.4', 'one') is None
+    assert limiter.check('test.limited', 'limit-user', '1.2.3.4', 'two') is None
+    rejection = limiter.check('test.limited', 'limit-user', '1.2.3.4', 'three')
+    assert rejection['status'] == 429
+    assert rejection['scope'] == 'user'
+    assert rejection['retry_after'] == 75
+
+    # Other users and routes are counted separately
+    assert limiter.check('test.limited', 'other-user', '1.2.3.4', 'three') is None
+    assert limiter.check('test.unlimited', 'limit-user', '1.2.3.4') is None
+
+
+def test_rejects_duplicate_content(limiter):
+    assert limiter.check('test.limited', 'dup-user', '1.2.3.5', 'Hello there') is None
+    rejection = limiter.check('test.limited', 'dup-user', '1.2.3.5', 'hello,   THERE!')
+    assert rejection['status'] == 409
+    assert rejection['scope'] == 'duplicate'
+    assert 1 <= rejection['retry_after'] <= 30
+    assert limiter.check('test.limited', 'dup-user', '1.2.3.5', 'something else') is None
+
+
+def test_duplicate_send_gets_409_with_retry_after(app):
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': 'ratelimit', 'password': 'ratelimit-password', 'email': 'ratelimit@example.com'
+    })
+    assert client.post('/api/auth/login', json={
+        'username': 'ratelimit', 'password': 'ratelimit-password'
+    }).status_code == 200
+
+    assert client.post('/api/chat/send', json={'content': 'only once'}).status_code == 201
+    response = client.post('/api/chat/send', json={'content': 'Only once!'})
+    assert response.status_code == 409
+    assert int(response.headers['Retry-After']) == response.get_json()['retry_after'] >= 1
@@ -0,0 +1,53 @@
+"""
+Reactions in Redis (fakeredis) and their copy in the database: counts
+stay right after Redis forgets a message's reactions.
+"""
+import pytest
+
+from app.services.database import db_service
+from app.services.receipt_service import receipt_service
+from app.services.redis_service import REACTIONS_PREFIX, redis_service
+
+
+@pytest.fixture
+def message_id(app):
+    message_id = 4242
+    redis_service.redis_client.delete(f"{REACTIONS_PREFIX}{message_id}", f"{REACTIONS_PREFIX}{message_id}:users")
+    db_service.save_reactions({message_id: {}})
+    return message_id
+
+
+def forget(message_id):
+    """Drop the message's reactions from Redis, as if they expired."""
+    redis_service.redis_client.delete(f"{REACTIONS_PREFIX}{message_id}", f"{REACTIONS_PREFIX}{message_id}:users")
+
+
+def test_reacting_twice_counts_once(app, message_id):
+    assert receipt_service.react(message_id, 'alice', '+1') == {'+1': 1}
+    assert receipt_service.react(message_id, 'alice', '+1') == {'+1': 1}
+    assert receipt_service.react(message_id, 'bob', '+1') == {'+1': 2}
+
+    ttl = app.config['REACTION_TTL']
+    for key in (f"{REACTIONS_PREFIX}{message_id}", f"{REACTIONS_PREFIX}{message_id}:users"):
+        assert 0 < redis_service.redis_client.ttl(key) <= ttl
+
+
+def test_saved_reactions_are_loaded_back_whole(app, message_id):
+    receipt_service.react(message_id, 'alice', '+1')
+    receipt_service.react(message_id, 'bob', 'heart')
+    assert receipt_service.flush()
+    assert db_service.get_saved_reactions(message_id) == {'+1': (1, ['alice']), 'heart': (1, ['bob'])}
+
+    forget(message_id)
+    assert receipt_service.react(message_id, 'alice', '+1') == {'+1': 1, 'heart': 1}
+    assert receipt_service.react(message_id, 'bob', 'heart', add=False) == {'+1': 1}
+
+
+def test_counts_are_recounted_from_who_reacted(app, message_id):
+    receipt_service.react(message_id, 'alice', '+1')
+    receipt_service.react(message_id, 'bob', '+1')
+    redis_service.redis_client.delete(f"{REACTIONS_PREFIX}{message_id}")
+
+    # The saved counts (none yet) are ignored while Redis still knows who reacted
+    assert receipt_service.react(message_id, 'carol', '+1') == {'+1': 3}
+    assert receipt_service.react(message_id, 'alice', '+1') == {'+1': 3}
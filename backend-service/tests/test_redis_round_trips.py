@@ -0,0 +1,43 @@
+"""
+Round-trip budgets of RedisService against fakeredis (the checks of
+benchmarks/check_round_trips.py, at a smaller size).
+"""
+import argparse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from check_round_trips import BUDGETS, RoundTripCounter, operations  # noqa: E402
+
+ARGS = argparse.Namespace(online_users=200, sessions=5, messages=50)
+
+
+@pytest.fixture(scope='module')
+def redis(app):
+    from app.services.redis_service import redis_service
+    assert redis_service.is_available()
+    return redis_service
+
+
+def test_operations_have_budgets(redis):
+    names = [name for name, _, _, _ in operations(redis, ARGS)]
+    assert sorted(names) == sorted(BUDGETS)
+
+
+def test_round_trips_within_budget(redis):
+    counter = RoundTripCounter()
+    over_budget = []
+    for name, setup, operation, check in operations(redis, ARGS):
+        if setup:
+            setup()
+        counter.count = 0
+        with counter.counting():
+            result = operation()
+        error = check(result)
+        assert error is None, f"{name}: {error}"
+        if counter.count > BUDGETS[name]:
+            over_budget.append(f"{name}: {counter.count} round trips, budget {BUDGETS[name]}")
+    assert not over_budget, "\n".join(over_budget)
@@ -0,0 +1,45 @@
+"""
+The backend and the auth service each ship their own copy of the Redis
+session store (see app/services/session_store.py). These checks fail when
+the copies drift apart.
+"""
+import importlib.util
+import os
+
+import pytest
+
+from app.services import session_store
+from config import Config
+
+AUTH_SESSIONS = os.path.join(os.path.dirname(__file__), '..', '..', 'microservices', 'auth-service', 'sessions.py')
+
+
+@pytest.fixture(scope='module')
+def auth_sessions():
+    spec = importlib.util.spec_from_file_location('auth_service_sessions', AUTH_SESSIONS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_defaults_match(auth_sessions):
+    assert auth_sessions.SESSION_TTL == Config.SESSION_TTL
+    assert auth_sessions.SESSION_TOUCH_INTERVAL == Config.SESSION_TOUCH_INTERVAL
+    assert auth_sessions.SESSION_KEY == session_store.SESSION_KEY
+    assert auth_sessions.USER_SESSIONS_KEY == session_store.USER_SESSIONS_KEY
+
+
+def test_sessions_are_interchangeable(app, auth_sessions):
+    from app.services.redis_service import redis_service
+    client = redis_service.redis_client
+    backend = session_store.SessionStore(client, ttl=Config.SESSION_TTL)
+    auth = auth_sessions.SessionStore(client)
+
+    auth.create('from-auth', {'username': 'drift', 'user_id': 7})
+    assert backend.get('from-auth') == {'username': 'drift', 'user_id': 7}
+    backend.create('from-backend', {'username': 'drift'})
+    assert auth.get('from-backend') == {'username': 'drift'}
+    assert 0 < client.ttl('session:from-auth') <= Config.SESSION_TTL
+
+    assert auth.delete_user_sessions('drift') == 2
+    assert backend.get('from-backend') is None
@@ -0,0 +1,13 @@
+"""
+Production WSGI entry point for the Chat Application.
+Served by Gunicorn (see gunicorn.conf.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Background queue consumers are not started here; each Gunicorn worker
+starts its own in the post_fork hook, after its connections are reset.
+"""
+from app import create_app
+
+# Create Flask application
+app = create_app(start_workers=False)
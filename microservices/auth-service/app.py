@@ -7,15 +7,21 @@ Port: 3001
 
 from flask import Flask, request, jsonify, session
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import redis
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from contextlib import contextmanager
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 import uuid
 import logging
+from hashing import password_hasher, HashingUnavailableError
+from sessions import SessionStore
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +36,12 @@ DATABASE_URL = os.environ.get('AUTH_DB_URL', 'postgresql://auth_user:auth_pass@l
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/1')
 JWT_SECRET = os.environ.get('JWT_SECRET', 'jwt-secret-key')
 
+# Connection pool configuration
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTHCHECK_INTERVAL', 30))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+
 # Initialize Redis
 try:
     redis_client = redis.Redis.from_url(REDIS_URL)
@@ -39,20 +51,139 @@ except Exception as e:
     logger.error(f"❌ Redis connection failed: {e}")
     redis_client = None
 
+session_store = SessionStore(redis_client) if redis_client else None
+
+# Pool metrics
+db_pool_size = Gauge('auth_db_pool_size', 'Connections currently open in the pool')
+db_pool_in_use = Gauge('auth_db_pool_in_use', 'Connections currently checked out')
+db_pool_checkouts_total = Counter('auth_db_pool_checkouts_total', 'Connection checkouts', ['result'])
+db_pool_checkout_seconds = Histogram(
+    'auth_db_pool_checkout_seconds',
+    'Time spent waiting for a pooled connection',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+class DatabasePool:
+    """
+    Thread-safe PostgreSQL connection pool.
+    Connections are opened lazily (per process, so it is safe under Gunicorn
+    workers), health-checked on checkout when idle for a while, and discarded
+    instead of returned when they are broken.
+    """
+
+    def __init__(self, dsn, minconn, maxconn, healthcheck_interval, timeout):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.healthcheck_interval = healthcheck_interval
+        self.timeout = timeout
+        self._pool = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_used = {}
+
+    def _get_pool(self):
+        """Create the pool on first use in this process."""
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+                    # psycopg2 raises as soon as the pool is exhausted; the
+                    # semaphore makes callers wait (up to the timeout) instead
+                    self._slots = threading.BoundedSemaphore(self.maxconn)
+                    self._pid = os.getpid()
+                    self._last_used = {}
+        return self._pool
+
+    def _is_healthy(self, conn):
+        """Cheap liveness check, only run on connections idle past the interval."""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the block.
+        Commits are left to the caller; anything uncommitted is rolled back
+        before the connection goes back to the pool.
+        """
+        pool = self._get_pool()
+        slots = self._slots
+        start = time.perf_counter()
+        if not slots.acquire(timeout=self.timeout):
+            db_pool_checkouts_total.labels(result='timeout').inc()
+            raise psycopg2.pool.PoolError(f"No connection available within {self.timeout}s")
+        try:
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        except Exception:
+            slots.release()
+            db_pool_checkouts_total.labels(result='error').inc()
+            raise
+        db_pool_checkout_seconds.observe(time.perf_counter() - start)
+        db_pool_checkouts_total.labels(result='ok').inc()
+
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not conn.closed and not broken:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            if broken or conn.closed:
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+            slots.release()
+
+    def stats(self):
+        """Return a snapshot of pool usage."""
+        if self._pool is None:
+            return {'open': 0, 'in_use': 0, 'min': self.minconn, 'max': self.maxconn}
+        with self._pool._lock:
+            idle = len(self._pool._pool)
+            in_use = len(self._pool._used)
+        return {'open': idle + in_use, 'in_use': in_use, 'min': self.minconn, 'max': self.maxconn}
+
+    def close(self):
+        """Close every pooled connection."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+db_pool = DatabasePool(DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_HEALTHCHECK_INTERVAL, DB_POOL_TIMEOUT)
+db_pool_size.set_function(lambda: db_pool.stats()['open'])
+db_pool_in_use.set_function(lambda: db_pool.stats()['in_use'])
+
 def get_db_connection():
-    """Get database connection"""
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {e}")
-        return None
+    """Get a pooled database connection (use as a context manager)"""
+    return db_pool.connection()
 
 def create_tables():
     """Create auth tables if they don't exist"""
-    conn = get_db_connection()
-    if conn:
-        try:
+    try:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                 CREATE TABLE IF NOT EXISTS auth_users (
@@ -77,10 +208,8 @@ def create_tables():
                 """)
                 conn.commit()
                 logger.info("✅ Auth database tables created/verified")
-        except Exception as e:
-            logger.error(f"Table creation error: {e}")
-        finally:
-            conn.close()
+    except Exception as e:
+        logger.error(f"Table creation error: {e}")
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
@@ -90,9 +219,16 @@ def health_check():
         'service': 'auth-service',
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'database_pool': db_pool.stats()
     }), 200
 
+# Metrics endpoint
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics (includes connection pool usage)"""
+    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
 # Register endpoint
 @app.route('/auth/register', methods=['POST'])
 def register():
@@ -108,41 +244,43 @@ def register():
         if not username or not password:
             return jsonify({'error': 'Username and password required'}), 400
 
-        # Hash password
-        password_hash = generate_password_hash(password)
-
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        # Hash password (off the request thread)
+        password_hash = password_hasher.hash(password)
 
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                INSERT INTO auth_users (username, email, password_hash, first_name, last_name)
-                VALUES (%s, %s, %s, %s, %s) RETURNING id, username, email, first_name, last_name
-                """, (username, email, password_hash, first_name, last_name))
-                
-                user = cur.fetchone()
-                conn.commit()
+            with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                try:
+                    cur.execute("""
+                    INSERT INTO auth_users (username, email, password_hash, first_name, last_name)
+                    VALUES (%s, %s, %s, %s, %s) RETURNING id, username, email, first_name, last_name
+                    """, (username, email, password_hash, first_name, last_name))
 
-                logger.info(f"✅ User registered: {username}")
-                return jsonify({
-                    'success': True,
-                    'message': 'User registered successfully',
-                    'user': dict(user)
-                }), 201
+                    user = cur.fetchone()
+                    conn.commit()
 
-        except psycopg2.IntegrityError as e:
-            conn.rollback()
-            if 'username' in str(e):
-                return jsonify({'error': 'Username already exists'}), 409
-            elif 'email' in str(e):
-                return jsonify({'error': 'Email already exists'}), 409
-            else:
-                return jsonify({'error': 'Registration failed'}), 400
-        finally:
-            conn.close()
+                except psycopg2.IntegrityError as e:
+                    conn.rollback()
+                    if 'username' in str(e):
+                        return jsonify({'error': 'Username already exists'}), 409
+                    elif 'email' in str(e):
+                        return jsonify({'error': 'Email already exists'}), 409
+                    else:
+                        return jsonify({'error': 'Registration failed'}), 400
 
+            logger.info(f"✅ User registered: {username}")
+            return jsonify({
+                'success': True,
+                'message': 'User registered successfully',
+                'user': dict(user)
+            }), 201
+
+        except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+            logger.error(f"Database connection error: {e}")
+            return jsonify({'error': 'Database connection failed'}), 500
+
+    except HashingUnavailableError as e:
+        logger.warning(f"Registration rejected: {e}")
+        return jsonify({'error': 'Service busy, try again'}), 503, {'Retry-After': '1'}
     except Exception as e:
         logger.error(f"Registration error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -159,78 +297,86 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Username and password required'}), 400
 
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
                 SELECT id, username, email, password_hash, first_name, last_name, is_active
                 FROM auth_users WHERE username = %s
                 """, (username,))
-                
+
                 user = cur.fetchone()
 
-                if user and check_password_hash(user['password_hash'], password):
-                    if not user['is_active']:
-                        return jsonify({'error': 'Account is deactivated'}), 403
-
-                    # Create JWT token
-                    token_payload = {
-                        'user_id': user['id'],
-                        'username': user['username'],
-                        'exp': datetime.utcnow() + timedelta(hours=24)
-                    }
-                    token = jwt.encode(token_payload, JWT_SECRET, algorithm='HS256')
-
-                    # Create session in database
-                    session_token = str(uuid.uuid4())
-                    expires_at = datetime.utcnow() + timedelta(hours=24)
-                    
-                    cur.execute("""
+            # Verify outside the checkout so hashing never pins a pooled connection
+            if not user or not password_hasher.verify(user['password_hash'], password):
+                return jsonify({'error': 'Invalid credentials'}), 401
+
+            if not user['is_active']:
+                return jsonify({'error': 'Account is deactivated'}), 403
+
+            # Create JWT token
+            token_payload = {
+                'user_id': user['id'],
+                'username': user['username'],
+                'exp': datetime.utcnow() + timedelta(hours=24)
+            }
+            token = jwt.encode(token_payload, JWT_SECRET, algorithm='HS256')
+
+            # Upgrade the stored hash if the hashing parameters changed
+            new_hash = None
+            if password_hasher.needs_rehash(user['password_hash']):
+                new_hash = password_hasher.hash(password)
+
+            # Create session and update last login in a single round trip
+            session_token = str(uuid.uuid4())
+            expires_at = datetime.utcnow() + timedelta(hours=24)
+
+            with get_db_connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                WITH new_session AS (
                     INSERT INTO auth_sessions (user_id, session_token, expires_at)
                     VALUES (%s, %s, %s)
-                    """, (user['id'], session_token, expires_at))
-                    
-                    # Update last login
-                    cur.execute("""
-                    UPDATE auth_users SET last_login = CURRENT_TIMESTAMP 
-                    WHERE id = %s
-                    """, (user['id'],))
-                    
-                    conn.commit()
+                    RETURNING user_id
+                )
+                UPDATE auth_users
+                SET last_login = CURRENT_TIMESTAMP,
+                    password_hash = COALESCE(%s, auth_users.password_hash)
+                FROM new_session WHERE auth_users.id = new_session.user_id
+                """, (user['id'], session_token, expires_at, new_hash))
 
-                    # Store session in Redis for fast access
-                    if redis_client:
-                        session_data = {
-                            'user_id': user['id'],
-                            'username': user['username'],
-                            'session_token': session_token
-                        }
-                        redis_client.setex(f"session:{session_token}", 86400, str(session_data))
-                        redis_client.sadd("online_users", user['username'])
-
-                    logger.info(f"✅ User login: {username}")
-                    return jsonify({
-                        'success': True,
-                        'message': 'Login successful',
-                        'token': token,
-                        'session_token': session_token,
-                        'user': {
-                            'id': user['id'],
-                            'username': user['username'],
-                            'email': user['email'],
-                            'first_name': user['first_name'],
-                            'last_name': user['last_name']
-                        }
-                    }), 200
-                else:
-                    return jsonify({'error': 'Invalid credentials'}), 401
+                conn.commit()
 
-        finally:
-            conn.close()
+        except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+            logger.error(f"Database connection error: {e}")
+            return jsonify({'error': 'Database connection failed'}), 500
 
+        # Store session in Redis for fast access
+        if redis_client:
+            session_data = {
+                'user_id': user['id'],
+                'username': user['username'],
+                'session_token': session_token
+            }
+            session_store.create(session_token, session_data)
+            redis_client.sadd("online_users", user['username'])
+
+        logger.info(f"✅ User login: {username}")
+        return jsonify({
+            'success': True,
+            'message': 'Login successful',
+            'token': token,
+            'session_token': session_token,
+            'user': {
+                'id': user['id'],
+                'username': user['username'],
+                'email': user['email'],
+                'first_name': user['first_name'],
+                'last_name': user['last_name']
+            }
+        }), 200
+
+    except HashingUnavailableError as e:
+        logger.warning(f"Login rejected: {e}")
+        return jsonify({'error': 'Service busy, try again'}), 503, {'Retry-After': '1'}
     except Exception as e:
         logger.error(f"Login error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -256,7 +402,7 @@ def logout():
                 # Remove session if we have session_token
                 session_token = request.json.get('session_token') if request.json else None
                 if session_token:
-                    redis_client.delete(f"session:{session_token}")
+                    session_store.delete(session_token, username)
 
             logger.info(f"✅ User logout: {username}")
             return jsonify({
@@ -273,6 +419,46 @@ def logout():
         logger.error(f"Logout error: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+# Logout everywhere endpoint
+@app.route('/auth/logout-all', methods=['POST'])
+def logout_all():
+    """Invalidate every session of the authenticated user"""
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Missing or invalid token'}), 401
+
+        token = auth_header.split(' ')[1]
+
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Invalid token'}), 401
+
+        username = payload.get('username')
+
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM auth_sessions WHERE user_id = %s", (payload.get('user_id'),))
+            conn.commit()
+
+        revoked = 0
+        if redis_client:
+            revoked = session_store.delete_user_sessions(username)
+            redis_client.srem("online_users", username)
+
+        logger.info(f"✅ User logout everywhere: {username} ({revoked} sessions)")
+        return jsonify({
+            'success': True,
+            'message': 'Logged out of all sessions',
+            'sessions_revoked': revoked
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Logout-all error: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 # Verify token endpoint
 @app.route('/auth/verify', methods=['GET'])
 def verify_token():
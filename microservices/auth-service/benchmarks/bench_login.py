@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark for the Auth Service.
+
+Local mode (default) drives the hashing pool directly with the same
+verify call a login makes, so it needs no database:
+
+    python benchmarks/bench_login.py --concurrency 32 --requests 500
+
+HTTP mode logs a registered user in against a running service:
+
+    python benchmarks/bench_login.py --url http://localhost:3001 \\
+        --username bench --password bench-pass --concurrency 32
+
+Reports logins/sec plus p50/p99 latency, and the latency of /health (HTTP)
+or a small pure-Python loop (local) probed while the burst is running.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of floats."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def local_login(hasher, stored_hash, password):
+    """Return a callable performing one login's worth of hashing work."""
+    def run():
+        if not hasher.verify(stored_hash, password):
+            raise RuntimeError("verification failed")
+    return run
+
+
+def http_login(url, username, password):
+    """Return a callable posting one login to a running service."""
+    import requests
+    session = requests.Session()
+
+    def run():
+        response = session.post(f"{url}/auth/login",
+                                json={'username': username, 'password': password},
+                                timeout=30)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+    return run
+
+
+def probe_loop(probe, stop, samples):
+    """Measure a cheap request repeatedly until the burst is over."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            probe()
+            samples.append(time.perf_counter() - start)
+        except Exception:
+            pass
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running auth service (HTTP mode)')
+    parser.add_argument('--username', default='bench')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, help='Hash pool workers (local mode)')
+    parser.add_argument('--method', help='Hash method, e.g. pbkdf2:sha256:600000 (local mode)')
+    args = parser.parse_args()
+
+    if args.url:
+        import requests
+        login = http_login(args.url, args.username, args.password)
+        probe = lambda: requests.get(f"{args.url}/health", timeout=30)
+        mode = f"http {args.url}"
+    else:
+        from hashing import PasswordHasher, PASSWORD_HASH_METHOD, HASH_WORKERS
+        hasher = PasswordHasher(method=args.method or PASSWORD_HASH_METHOD,
+                                workers=args.workers if args.workers is not None else HASH_WORKERS,
+                                queue_size=args.concurrency)
+        stored_hash = hasher.hash(args.password)
+        login = local_login(hasher, stored_hash, args.password)
+        probe = lambda: sum(range(10000))  # GIL-bound work, as a request thread would do
+        mode = f"local method={hasher.method} workers={hasher.workers}"
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one_login(_):
+        start = time.perf_counter()
+        try:
+            login()
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    probe_samples, stop = [], threading.Event()
+    prober = threading.Thread(target=probe_loop, args=(probe, stop, probe_samples), daemon=True)
+    prober.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one_login, range(args.requests)))
+    wall = time.perf_counter() - started
+    stop.set()
+    prober.join()
+
+    print(f"mode:           {mode}")
+    print(f"concurrency:    {args.concurrency}")
+    print(f"logins:         {len(latencies)} ok, {len(errors)} failed")
+    print(f"logins/sec:     {len(latencies) / wall:.1f}")
+    print(f"latency p50:    {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"latency p99:    {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"probe p99:      {percentile(probe_samples, 99) * 1000:.1f} ms ({len(probe_samples)} samples)")
+    if errors:
+        print(f"first error:    {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
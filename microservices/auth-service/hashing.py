@@ -0,0 +1,117 @@
+"""
+Password hashing for the Auth Service.
+Runs the CPU-bound hash/verify calls in a bounded process pool so a burst
+of logins can't starve the request threads serving /auth/verify and /health.
+
+backend-service/app/services/hashing_service.py is the same pool for the
+backend. The two are separate copies because each service is built from
+its own directory as its own image. Keep the pool, admission limit and
+defaults in step; backend-service/tests/test_hashing.py checks that they match.
+"""
+
+import os
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+# Hashing configuration
+# PASSWORD_HASH_METHOD uses werkzeug's method string, e.g. "pbkdf2:sha256:600000"
+# (Werkzeug 2.0 has no scrypt). Always spell out the work factor: stored hashes whose
+# prefix differs from this value are re-hashed on the next successful login.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 1))
+HASH_QUEUE_SIZE = int(os.environ.get('HASH_QUEUE_SIZE', HASH_WORKERS * 4))
+HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', 5))
+
+
+class HashingUnavailableError(Exception):
+    """Raised when a hash job is rejected (queue full) or times out."""
+
+
+def _hash_password(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify_password(stored_hash, password):
+    return check_password_hash(stored_hash, password)
+
+
+class PasswordHasher:
+    """
+    Bounded password hashing pool.
+
+    At most ``workers`` jobs run at once and at most ``queue_size`` more wait
+    for a worker; anything beyond that is rejected immediately instead of
+    piling up behind the burst. With ``workers=0`` hashing runs inline.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH,
+                 workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE, timeout=HASH_TIMEOUT):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = None
+
+    def _get_executor(self):
+        """Create the process pool on first use in this process (fork-safe)."""
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        """Run fn in the pool, enforcing the admission limit and timeout."""
+        if self.workers <= 0:
+            return fn(*args)
+
+        executor = self._get_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HashingUnavailableError("Hashing queue is full")
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HashingUnavailableError(f"Hashing timed out after {self.timeout}s")
+
+    def hash(self, password):
+        """Hash a password with the configured method and work factor."""
+        return self._run(_hash_password, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        """Check a password against a stored hash."""
+        return self._run(_verify_password, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if the stored hash was made with different parameters."""
+        return stored_hash.split('$', 1)[0] != self.method
+
+    def close(self):
+        """Shut down the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,92 @@
+"""
+Redis session store for the Auth Service.
+Uses the same format as backend-service/app/services/session_store.py so
+either service can read sessions written by the other:
+
+    session:{session_token}      compact JSON object, sliding TTL
+    user_sessions:{username}     set of that user's session tokens
+"""
+
+import json
+import os
+
+# Same defaults as backend-service/config.py: sessions expire after
+# SESSION_TTL seconds of inactivity, whichever service touched them last
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 3600))
+SESSION_TOUCH_INTERVAL = int(os.environ.get('SESSION_TOUCH_INTERVAL', 60))
+
+SESSION_KEY = "session:{}"
+USER_SESSIONS_KEY = "user_sessions:{}"
+
+# Log out everywhere in one atomic step, so a session created meanwhile
+# can't be missed: KEYS[1] is user_sessions:{username}, ARGV[1] the session
+# key prefix. Returns the number of sessions deleted.
+DELETE_USER_SESSIONS_SCRIPT = """
+local tokens = redis.call('SMEMBERS', KEYS[1])
+for _, token in ipairs(tokens) do
+    redis.call('DEL', ARGV[1] .. token)
+end
+redis.call('DEL', KEYS[1])
+return #tokens
+"""
+
+
+def serialize_session(data):
+    """Encode session data as compact JSON"""
+    return json.dumps(data, separators=(',', ':'), default=str)
+
+
+def deserialize_session(raw):
+    """Decode session data stored by either service"""
+    if not raw:
+        return None
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return json.loads(raw)
+
+
+class SessionStore:
+    """Session storage with sliding expiry and a per-user session index"""
+
+    def __init__(self, redis_client, ttl=SESSION_TTL, touch_interval=SESSION_TOUCH_INTERVAL):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self._delete_user_sessions = redis_client.register_script(DELETE_USER_SESSIONS_SCRIPT)
+
+    def create(self, session_token, data):
+        """Store a session and index it under the username (one round trip)"""
+        username = data['username']
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.setex(SESSION_KEY.format(session_token), self.ttl, serialize_session(data))
+        pipe.sadd(USER_SESSIONS_KEY.format(username), session_token)
+        pipe.expire(USER_SESSIONS_KEY.format(username), self.ttl)
+        pipe.execute()
+
+    def get(self, session_token):
+        """Read a session; the TTL is only extended once per touch interval"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(SESSION_KEY.format(session_token))
+        pipe.ttl(SESSION_KEY.format(session_token))
+        raw, remaining = pipe.execute()
+
+        data = deserialize_session(raw)
+        if data is not None and 0 <= remaining < self.ttl - self.touch_interval:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.expire(SESSION_KEY.format(session_token), self.ttl)
+            pipe.expire(USER_SESSIONS_KEY.format(data['username']), self.ttl)
+            pipe.execute()
+        return data
+
+    def delete(self, session_token, username=None):
+        """Delete one session"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(SESSION_KEY.format(session_token))
+        if username:
+            pipe.srem(USER_SESSIONS_KEY.format(username), session_token)
+        pipe.execute()
+
+    def delete_user_sessions(self, username):
+        """Delete every session of a user; returns how many were removed"""
+        return self._delete_user_sessions(keys=[USER_SESSIONS_KEY.format(username)],
+                                          args=[SESSION_KEY.format('')])